@@ -2,8 +2,34 @@
 
 import logging
 
+import numpy as np
 import pandas as pd
 
+from dtypes import float_dtype
+from exceptions import MTPAnalyzerException
+from plate_layout import (
+    PlateLayout,
+    ReplicateStatistics,
+    as_plate_layout,
+    average_by_code,
+)
+
+INITIAL_GUESS_WINDOW = 9
+TOP_GROWTH_RATES = 10
+GROWTH_RATE_WINDOW = 5
+# First and last hour to look for the maximum growth rate in
+GROWTH_WINDOW = (20.0, 48.0)
+PLATEAU_GROWTH_FRACTION = 0.1
+# OD to report the time to reach in the derived metrics
+OD_THRESHOLD = 0.5
+# Slower specific growth rates (per hour) count as no growth at all
+MIN_SPECIFIC_GROWTH_RATE = 1e-6
+# Wells that rise less than this many times the noise of the blanks,
+# or less than the minimum rise or slope, count as not growing
+MIN_SNR = 5.0
+MIN_RISE = 0.0
+MIN_SLOPE = 0.0
+
 
 def calculate_growth_rates(mtp_data: pd.DataFrame) -> pd.DataFrame:
     """Calculate growth rate between each value of each column.
@@ -14,50 +40,121 @@ def calculate_growth_rates(mtp_data: pd.DataFrame) -> pd.DataFrame:
     Return:
         A new DataFrame with the growth rate values.
     """
-    growth_rate_data = mtp_data.copy()
-    time_delta = growth_rate_data.index.to_series()
-    time_delta = time_delta.diff()
-
-    def calculate_column_growth_rate(s: pd.Series) -> pd.Series:  # type: ignore
-        value_delta = s.diff()
-        growth_rate = value_delta / time_delta
-        growth_rate = growth_rate.fillna(0.0)
-        return growth_rate
-
-    growth_rate_data = growth_rate_data.apply(calculate_column_growth_rate)
+    values = mtp_data.to_numpy(dtype=float_dtype(mtp_data))
+    time_delta = np.diff(mtp_data.index.to_numpy(dtype="float64"))
+    growth_rates = np.zeros_like(values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        np.divide(
+            np.diff(values, axis=0),
+            time_delta.astype(values.dtype)[:, np.newaxis],
+            out=growth_rates[1:],
+        )
+    # Like the first timepoint, which has no previous value
+    growth_rates[np.isnan(growth_rates)] = 0.0
+    growth_rate_data = pd.DataFrame(
+        growth_rates, index=mtp_data.index, columns=mtp_data.columns
+    )
 
     logging.debug("Calculated growth rate data.")
 
     return growth_rate_data
 
 
-def extract_maximum_growth_rates(growth_rates: pd.DataFrame) -> dict[str, pd.DataFrame]:
-    """Extract the ten largest growth rate values of each column.
+def calculate_specific_growth_rates(
+    mtp_data: pd.DataFrame,
+    window: int = GROWTH_RATE_WINDOW,
+) -> pd.DataFrame:
+    """Calculate the specific growth rate around each value of each column.
 
-    Extract the ten largest growth rate values of each column of the provided
-    DataFrame and add timestamp as a separate column.
+    The rate at a timepoint is the slope of a least squares fit of the
+    log of the values against time, over window points centred on it.
+    That is far less sensitive to noise than the difference between
+    consecutive values. All windows of all columns are fitted at once
+    with cumulative sums, in float64 whatever the type of the data.
+
+    Args:
+        mtp_data: DataFrame with time series' of MTP data.
+        window: Number of points in each fitted window.
+
+    Return:
+        A new DataFrame with the specific growth rate values, NaN where
+        the window wouldn't fit in the data.
+    """
+    t = mtp_data.index.to_numpy(dtype="float64")
+    values = mtp_data.to_numpy(dtype="float64").T
+    n_wells, n_timepoints = values.shape
+    if not 2 <= window <= n_timepoints:
+        raise MTPAnalyzerException(
+            f"Growth rate window of {window} points must be at least 2 and at "
+            f"most the number of timepoints ({n_timepoints})"
+        )
+
+    slopes = _sliding_window_slopes(t, _log_values(values), window)
+    growth_rates = np.full((n_timepoints, n_wells), np.nan, dtype=float_dtype(mtp_data))
+    # Each window's slope is the rate at its middle point
+    first = (window - 1) // 2
+    last = first + slopes.shape[1]
+    growth_rates[first:last] = slopes.T
+
+    logging.debug(f"Calculated specific growth rates over {window} points.")
+    return pd.DataFrame(growth_rates, index=mtp_data.index, columns=mtp_data.columns)
+
+
+def extract_maximum_growth_rates(
+    growth_rates: pd.DataFrame,
+    k: int = TOP_GROWTH_RATES,
+) -> dict[str, pd.DataFrame]:
+    """Extract the k largest growth rate values of each column.
+
+    Extract the k largest growth rate values of each column of the provided
+    DataFrame and add timestamp as a separate column. All columns are
+    handled at once with a single partition of the wells x time matrix.
+    Like DataFrame.nlargest, equal values are ordered by time and NaN
+    values are never among the largest.
 
     Args:
         growth_rates: DataFrame with values for growth rate in each column.
+        k: Number of largest values to extract.
 
     Return:
-        A DataFrame with MultiIndex column, containing the ten largest
+        A DataFrame with MultiIndex column, containing the k largest
         growth rate values that was in each column in the original DataFrame
         as well as the associated timestamp.
     """
+    if k < 1:
+        raise MTPAnalyzerException(
+            f"Number of largest growth rates must be at least 1, not {k}"
+        )
+
+    values = growth_rates.to_numpy(dtype=float_dtype(growth_rates)).T
+    timestamps = growth_rates.index.to_numpy(dtype="float64")
+    n_wells, n_timepoints = values.shape
+    k = min(k, n_timepoints)
 
-    def top_timestamps(col: pd.Series) -> pd.Series:  # type: ignore
-        return (
-            col.nlargest(10).index.to_series().reset_index(drop=True).astype("float64")
+    ranked = np.where(np.isnan(values), -np.inf, values)
+    top_rates = np.empty((n_wells, k), dtype=values.dtype)
+    top_times = np.empty((n_wells, k))
+    if k > 0:
+        # Everything above the k-th largest value is taken, and the
+        # earliest of the values equal to it fill up the rest
+        kth = np.argpartition(-ranked, k - 1, axis=1)[:, k - 1]
+        threshold = ranked[np.arange(n_wells), kth][:, None]
+        n_missing = k - np.count_nonzero(ranked > threshold, axis=1, keepdims=True)
+        ties = ranked == threshold
+        selected = (ranked > threshold) | (
+            ties & (np.cumsum(ties, axis=1) <= n_missing)
         )
 
-    def top_growth_rates(col: pd.Series) -> pd.Series:  # type: ignore
-        return col.nlargest(10).reset_index(drop=True)
+        idx = np.nonzero(selected)[1].reshape(n_wells, k)
+        top = np.take_along_axis(ranked, idx, axis=1)
+        idx = np.take_along_axis(idx, np.lexsort((idx, -top), axis=1), axis=1)
+        top_rates = np.take_along_axis(values, idx, axis=1)
+        top_times = np.where(np.isnan(top_rates), np.nan, timestamps[idx])
 
-    logging.debug("Extracted the top ten growth rate values for each column.")
+    logging.debug(f"Extracted the top {k} growth rate values for each column.")
     results = {
-        "timestamps": growth_rates.apply(top_timestamps),
-        "growth_rates": growth_rates.apply(top_growth_rates),
+        "timestamps": pd.DataFrame(top_times.T, columns=growth_rates.columns),
+        "growth_rates": pd.DataFrame(top_rates.T, columns=growth_rates.columns),
     }
     return results
 
@@ -65,12 +162,22 @@ def extract_maximum_growth_rates(growth_rates: pd.DataFrame) -> dict[str, pd.Dat
 def extract_growth_parameters(
     growth_rates: dict[str, pd.DataFrame],
     blank_data: pd.DataFrame,
-    lag_time_threshold: int,
+    lag_time_threshold: float,
+    growth_window: tuple[float, float] = GROWTH_WINDOW,
 ) -> pd.DataFrame:
     """Extract growth parameters from data.
 
+    The time windows are resolved once to ranges of positions in the
+    sorted timestamps of the largest growth rates, and the parameters of
+    all columns are then gathered at once.
+
     Args:
-        data:
+        growth_rates: Output of extract_maximum_growth_rates.
+        blank_data: Blanked data the growth rates were calculated from.
+        lag_time_threshold: Lag time is the earliest timestamp of a
+                            largest growth rate after this.
+        growth_window: First and last timestamp (inclusive) that the
+                       maximum growth rate is looked for in.
 
     Return:
         DataFrame with growth parameter name as index and growth
@@ -83,28 +190,352 @@ def extract_growth_parameters(
             - t: Inflection point.
             - A: Asymptotic maximum population.
     """
-    ts = growth_rates["timestamps"]
-    gr = growth_rates["growth_rates"]
+    window_start, window_end = growth_window
+    if window_start > window_end:
+        raise MTPAnalyzerException(
+            f"Growth window starts after it ends: {window_start} > {window_end}"
+        )
+    ts = growth_rates["timestamps"].to_numpy(dtype="float64")
+    gr = growth_rates["growth_rates"].to_numpy(dtype="float64")
+
+    # NaN timestamps are sorted after all times, so they're in no window
+    times = np.unique(ts[~np.isnan(ts)])
+    positions = np.searchsorted(times, ts)
+    lag_start = np.searchsorted(times, lag_time_threshold, side="right")
+    first = np.searchsorted(times, window_start, side="left")
+    stop = np.searchsorted(times, window_end, side="right")
 
-    lag_time = ts.where(ts > lag_time_threshold).agg("min")
+    after_lag = (positions >= lag_start) & (positions < len(times))
+    lag_time = np.where(after_lag, ts, np.inf).min(axis=0, initial=np.inf)
+    lag_time[np.isinf(lag_time)] = np.nan
 
-    maxidx = gr.where((ts >= 20) & (ts <= 48)).idxmax()
-    max_growth_rate = pd.Series({col: gr.at[idx, col] for col, idx in maxidx.items()})
-    inflection_point = pd.Series({col: ts.at[idx, col] for col, idx in maxidx.items()})
+    in_window = (positions >= first) & (positions < stop) & ~np.isnan(gr)
+    steepest = np.argmax(np.where(in_window, gr, -np.inf), axis=0, keepdims=True)
+    has_window = in_window.any(axis=0)
+    max_growth_rate = np.where(
+        has_window, np.take_along_axis(gr, steepest, 0)[0], np.nan
+    )
+    inflection_point = np.where(
+        has_window, np.take_along_axis(ts, steepest, 0)[0], np.nan
+    )
 
-    as_max_pop = blank_data.agg("max")
+    columns = growth_rates["growth_rates"].columns
+    as_max_pop = blank_data.max().reindex(columns).to_numpy(dtype="float64")
 
-    growth_parameters = pd.concat(
-        [lag_time, max_growth_rate, inflection_point, as_max_pop],
-        axis=1,
+    growth_parameters = pd.DataFrame(
+        np.column_stack([lag_time, max_growth_rate, inflection_point, as_max_pop]),
+        index=columns,
+        columns=pd.Index(["L", "k", "t", "A"]),
     )
-    growth_parameters.columns = pd.Index(["L", "k", "t", "A"])
 
     return growth_parameters
 
 
-def get_replicates_average(data: pd.DataFrame, names: dict[str, str]) -> pd.DataFrame:
-    """Reduce df to average of wells with same sample."""
-    data = data.rename(columns=names)
-    data = data.T.groupby(by=data.columns).mean().T
-    return data
+def get_replicates_average(
+    data: pd.DataFrame,
+    names: PlateLayout | dict[str, str],
+) -> pd.DataFrame:
+    """Reduce df to average of wells with same sample.
+
+    Missing values are skipped, like in DataFrame.mean.
+
+    Args:
+        data: Data of the wells, one column per well.
+        names: Layout of the plate, or mapping of well to sample.
+
+    Return:
+        One column per sample, sorted by name, with the average of the
+        wells of that sample.
+    """
+    layout = as_plate_layout(names)
+    codes = layout.codes[layout.locate(data.columns)]
+    samples, averages = average_by_code(data.to_numpy(dtype=float_dtype(data)).T, codes)
+
+    return pd.DataFrame(
+        averages.T,
+        index=data.index,
+        columns=pd.Index(layout.samples[samples]),
+    )
+
+
+def get_replicate_statistics(
+    data: pd.DataFrame,
+    names: PlateLayout | dict[str, str],
+) -> ReplicateStatistics:
+    """Get the mean and spread of the wells of each sample.
+
+    The wells are grouped by the integer sample codes of the layout, so
+    there is no lookup of sample names per well.
+
+    Args:
+        data: Data of the wells, one column per well.
+        names: Layout of the plate, or mapping of well to sample.
+
+    Return:
+        Mean, standard deviation, number and coefficient of variation of
+        the wells of each sample, with the samples sorted by name.
+    """
+    layout = as_plate_layout(names)
+    codes = layout.codes[layout.locate(data.columns)]
+    return ReplicateStatistics.from_codes(
+        data.to_numpy(dtype=float_dtype(data)).T, codes, layout.samples, data.index
+    )
+
+
+def _log_values(values: np.ndarray) -> np.ndarray:  # type: ignore
+    """Log of values, with values <= 0 raised to the least positive in their row."""
+    positive = np.where(values > 0, values, np.inf)
+    floor = np.min(positive, axis=1, keepdims=True)
+    floor = np.where(np.isfinite(floor), floor, 1e-6)
+    return np.log(np.maximum(values, floor))  # type: ignore
+
+
+def _sliding_window_slopes(
+    t: np.ndarray,  # type: ignore
+    values: np.ndarray,  # type: ignore
+    window: int,
+) -> np.ndarray:  # type: ignore
+    """Least squares slope of values against t in every window.
+
+    Uses the centred form sum((t - mean t) * v) / sum((t - mean t)^2),
+    which stays accurate for long runs sampled at short intervals.
+    Windows are views, so nothing is copied besides the slopes.
+
+    Args:
+        t: Timepoints, shape (timepoints,).
+        values: Values, shape (rows, timepoints).
+        window: Number of points in each window.
+
+    Return:
+        Slopes, shape (rows, timepoints - window + 1). Column i is the
+        slope over the points i to i + window - 1.
+    """
+    t_windows = np.lib.stride_tricks.sliding_window_view(t, window)
+    # Offsets from the start of each window are small, so the centred t
+    # sum to zero up to a rounding error relative to the window length
+    centred_t = t_windows - t_windows[:, :1]
+    centred_t -= centred_t.mean(axis=1, keepdims=True)
+    value_windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=-1)
+    # The mean of the values drops out, as the centred t sum to zero
+    covariance = np.einsum("...nk,nk->...n", value_windows, centred_t)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slopes = covariance / np.sum(centred_t**2, axis=1)
+    return slopes  # type: ignore
+
+
+def estimate_initial_parameters(
+    mtp_data: pd.DataFrame,
+    window: int = INITIAL_GUESS_WINDOW,
+) -> pd.DataFrame:
+    """Estimate growth parameters of all wells as model fit starting point.
+
+    The maximum specific growth rate is the steepest slope of a
+    log-linear least squares fit over window consecutive points. The
+    plateau starts after the steepest (linear) slope, where it first
+    drops below PLATEAU_GROWTH_FRACTION of its maximum, and its height
+    is the median value from there on. All wells are handled at once.
+
+    Args:
+        mtp_data: DataFrame with time series' of MTP data.
+        window: Number of points in each fitted window.
+
+    Return:
+        DataFrame with a row per column of mtp_data and the columns:
+
+            - N_0: Initial population.
+            - A: Plateau (asymptotic maximum population).
+            - mu: Maximum specific growth rate.
+            - t_mu: Timestamp of the maximum specific growth rate.
+            - N_mu: Population at t_mu according to the log-linear
+                    fit.
+    """
+    t = mtp_data.index.to_numpy(dtype="float64")
+    values = mtp_data.to_numpy(dtype="float64").T
+    n_wells, n_timepoints = values.shape
+    window = max(2, min(window, n_timepoints))
+
+    log_values = _log_values(values)
+    log_slopes = _sliding_window_slopes(t, log_values, window)
+    steepest = np.argmax(log_slopes, axis=1)
+    mu = log_slopes[np.arange(n_wells), steepest]
+    window_centres = np.convolve(t, np.ones(window) / window, mode="valid")
+    steepest_windows = np.lib.stride_tricks.sliding_window_view(
+        log_values, window, axis=1
+    )[np.arange(n_wells), steepest]
+
+    slopes = _sliding_window_slopes(t, values, window)
+    max_slope_idx = np.argmax(slopes, axis=1)
+    max_slope = slopes[np.arange(n_wells), max_slope_idx]
+    levelled_off = (np.arange(slopes.shape[1]) > max_slope_idx[:, None]) & (
+        slopes < PLATEAU_GROWTH_FRACTION * max_slope[:, None]
+    )
+    has_plateau = np.any(levelled_off, axis=1)
+    plateau_start = np.where(has_plateau, np.argmax(levelled_off, axis=1), 0)
+    on_plateau = np.arange(n_timepoints) >= plateau_start[:, None]
+    plateau = np.nanmedian(np.where(on_plateau, values, np.nan), axis=1)
+    plateau = np.where(has_plateau, plateau, np.max(values, axis=1))
+
+    logging.debug("Estimated initial growth parameters.")
+
+    return pd.DataFrame(
+        {
+            "N_0": values[:, 0],
+            "A": plateau,
+            "mu": mu,
+            "t_mu": window_centres[steepest],
+            "N_mu": np.exp(steepest_windows.mean(axis=1)),
+        },
+        index=mtp_data.columns,
+    )
+
+
+def calculate_derived_metrics(
+    mtp_data: pd.DataFrame,
+    od_threshold: float = OD_THRESHOLD,
+    window: int = GROWTH_RATE_WINDOW,
+) -> pd.DataFrame:
+    """Calculate kinetic metrics of all wells at once.
+
+    The maximum specific growth rate mu is the steepest slope of a
+    log-linear least squares fit over window consecutive points. The
+    tangent at that slope crosses the log of the first value at the lag
+    time. Works on raw data as well as on fitted curves, see
+    growth_model.fitted_curves.
+
+    Args:
+        mtp_data: DataFrame with time series' of MTP data.
+        od_threshold: OD to get the time to reach.
+        window: Number of points in each fitted window.
+
+    Return:
+        DataFrame with a row per column of mtp_data and the columns:
+
+            - lag_time: Tangent-method lag time, NaN without growth.
+            - doubling_time: ln(2) / mu, NaN without growth.
+            - time_to_threshold: Time the OD first reaches od_threshold,
+                                 linearly interpolated. NaN if it never
+                                 does.
+            - AUC: Area under the curve, by the trapezoidal rule.
+    """
+    t = mtp_data.index.to_numpy(dtype="float64")
+    values = mtp_data.to_numpy(dtype="float64").T
+    n_wells, n_timepoints = values.shape
+    wells = np.arange(n_wells)
+    window = max(2, min(window, n_timepoints))
+
+    log_values = _log_values(values)
+    log_slopes = _sliding_window_slopes(t, log_values, window)
+    steepest = np.argmax(np.where(np.isnan(log_slopes), -np.inf, log_slopes), axis=1)
+    mu = log_slopes[wells, steepest]
+    growing = mu > MIN_SPECIFIC_GROWTH_RATE
+    # The fitted line goes through the mean of the window
+    tangent_t = np.convolve(t, np.ones(window) / window, mode="valid")[steepest]
+    tangent_log_value = np.lib.stride_tricks.sliding_window_view(
+        log_values, window, axis=1
+    )[wells, steepest].mean(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lag_time = tangent_t - (tangent_log_value - log_values[:, 0]) / mu
+        doubling_time = np.log(2) / mu
+    lag_time = np.where(growing, lag_time, np.nan)
+    doubling_time = np.where(growing, doubling_time, np.nan)
+
+    reached = values >= od_threshold
+    first = np.argmax(reached, axis=1)
+    previous = np.maximum(first - 1, 0)
+    before, after = values[wells, previous], values[wells, first]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(first > 0, (od_threshold - before) / (after - before), 0)
+    time_to_threshold = np.where(
+        reached.any(axis=1),
+        t[previous] + fraction * (t[first] - t[previous]),
+        np.nan,
+    )
+
+    logging.debug("Calculated derived metrics.")
+
+    return pd.DataFrame(
+        {
+            "lag_time": lag_time,
+            "doubling_time": doubling_time,
+            "time_to_threshold": time_to_threshold,
+            "AUC": np.trapezoid(values, t, axis=1),
+        },
+        index=mtp_data.columns,
+    )
+
+
+def screen_no_growth(
+    mtp_data: pd.DataFrame,
+    blank_data: pd.DataFrame,
+    n_replicates: pd.Series | None = None,
+    min_rise: float = MIN_RISE,
+    min_slope: float = MIN_SLOPE,
+    min_snr: float = MIN_SNR,
+    window: int = GROWTH_RATE_WINDOW,
+) -> pd.DataFrame:
+    """Find wells that didn't grow, so they don't need to be fitted.
+
+    Works on the raw data on purpose: preprocessing scales every well to
+    the same range, after which a flat well looks like it grew.
+
+    The data is blanked with the average of the blank wells first. The
+    rise is the highest average over window consecutive points, minus
+    the average over the first window points. The noise of a single
+    well is the standard deviation of the blanks from one timepoint to
+    the next, which isn't affected by slow drift. The noise of the
+    blanked data is that of the average of its replicates minus the
+    average of the blanks.
+
+    Args:
+        mtp_data: Raw data, one column per well or sample.
+        blank_data: Raw data of the blank wells.
+        n_replicates: Number of wells averaged in each column of
+                      mtp_data. Defaults to 1 for every column.
+        min_rise: Smallest rise of a growing well.
+        min_slope: Smallest maximum slope (per hour) of a growing well,
+                   of a linear fit over window points.
+        min_snr: Smallest ratio of rise to noise of a growing well.
+        window: Number of points to average and fit slopes over.
+
+    Return:
+        DataFrame with a row per column of mtp_data and the columns:
+
+            - rise: Rise of the blanked data.
+            - max_slope: Maximum slope of the blanked data.
+            - SNR: rise divided by the noise of the blanked data, NaN
+                   without blanks.
+            - no_growth: Whether any of them is below its minimum.
+    """
+    t = mtp_data.index.to_numpy(dtype="float64")
+    blank_values = blank_data.to_numpy(dtype="float64").T
+    values = mtp_data.to_numpy(dtype="float64").T
+    if n_replicates is None:
+        replicates = np.ones(len(values))
+    else:
+        replicates = n_replicates.reindex(mtp_data.columns).to_numpy(dtype="float64")
+    noise = np.full(len(values), np.nan)
+    if len(blank_values):
+        values = values - np.nanmean(blank_values, axis=0)
+        if blank_values.shape[1] > 1:
+            well_noise = np.nanstd(np.diff(blank_values, axis=1)) / np.sqrt(2)
+            noise = well_noise * np.sqrt(1 / replicates + 1 / len(blank_values))
+    window = max(2, min(window, values.shape[1]))
+
+    window_means = np.lib.stride_tricks.sliding_window_view(
+        values, window, axis=1
+    ).mean(axis=2)
+    rise = window_means.max(axis=1) - window_means[:, 0]
+    max_slope = _sliding_window_slopes(t, values, window).max(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        snr = rise / noise
+    no_growth = (rise < min_rise) | (max_slope < min_slope) | (snr < min_snr)
+
+    logging.debug(
+        f"Screened out {np.count_nonzero(no_growth)} of {len(no_growth)} "
+        f"wells without growth."
+    )
+
+    return pd.DataFrame(
+        {"rise": rise, "max_slope": max_slope, "SNR": snr, "no_growth": no_growth},
+        index=mtp_data.columns,
+    )
@@ -2,6 +2,19 @@
 
 import argparse
 
+from analysis import (
+    GROWTH_WINDOW,
+    MIN_RISE,
+    MIN_SLOPE,
+    MIN_SNR,
+    OD_THRESHOLD,
+    TOP_GROWTH_RATES,
+)
+from curve_fitting import MAX_RETRIES, MAXFEV, TIME_LIMIT
+from dtypes import DEFAULT_DTYPE, DTYPES
+from growth_model import FITTED_MODELS, MULTI_START_R2
+from preprocessing import SECONDS_PER_UNIT, TIME_OFFSET, TIME_UNIT
+from smoothing import DEFAULT_METHOD, DEGREE, EMA_ALPHA, SMOOTHING_METHODS, WINDOW
 from version import __version__
 
 
@@ -48,6 +61,332 @@ class CLI:
             required=False,
         )
 
+        parser.add_argument(
+            "--smoothing",
+            action="store",
+            help=(
+                "How to smooth the data before removing noise: lag averages each "
+                "value with the one before it, ema is an exponential moving "
+                "average, savgol a Savitzky-Golay filter and loess a locally "
+                "weighted regression (Default: %(default)s)."
+            ),
+            dest="smoothing",
+            choices=list(SMOOTHING_METHODS),
+            default=DEFAULT_METHOD,
+        )
+        parser.add_argument(
+            "--smoothing-window",
+            action="store",
+            help=(
+                "Number of timepoints in each savgol or loess window "
+                "(Default: %(default)s)."
+            ),
+            dest="smoothing_window",
+            type=int,
+            default=WINDOW,
+        )
+        parser.add_argument(
+            "--smoothing-degree",
+            action="store",
+            help=("Degree of the savgol or loess polynomials (Default: %(default)s)."),
+            dest="smoothing_degree",
+            type=int,
+            default=DEGREE,
+        )
+        parser.add_argument(
+            "--ema-alpha",
+            action="store",
+            help="Weight of the current value for ema (Default: %(default)s).",
+            dest="ema_alpha",
+            type=float,
+            default=EMA_ALPHA,
+        )
+
+        parser.add_argument(
+            "--nearest-blanks",
+            action="store",
+            help=(
+                "Remove noise from each well with the average of this many blank "
+                "wells nearest to it on the plate, to correct for edge effects and "
+                "gradients (Default: all blank wells)."
+            ),
+            dest="nearest_blanks",
+            type=int,
+            default=None,
+        )
+
+        parser.add_argument(
+            "--dtype",
+            action="store",
+            help=(
+                "Type to hold the data in. float32 halves the memory needed, only "
+                "fitting the models is done in float64 (Default: %(default)s)."
+            ),
+            dest="dtype",
+            choices=DTYPES,
+            default=DEFAULT_DTYPE,
+        )
+
+        parser.add_argument(
+            "--time-offset",
+            action="store",
+            help="Hours the first timepoint is shifted to (Default: %(default)s).",
+            dest="time_offset",
+            type=float,
+            default=TIME_OFFSET,
+            required=False,
+        )
+
+        parser.add_argument(
+            "--wells",
+            action="store",
+            nargs="+",
+            help=(
+                "Only analyze these wells, e.g. A1 B2 or ranges like A1:H6 "
+                "(Default: all). Blank wells are always kept."
+            ),
+            dest="wells",
+            default=None,
+        )
+        parser.add_argument(
+            "--samples",
+            action="store",
+            nargs="+",
+            help=(
+                "Only analyze the wells of these samples (Default: all). "
+                "Blank wells are always kept."
+            ),
+            dest="samples",
+            default=None,
+        )
+        parser.add_argument(
+            "--time-unit",
+            action="store",
+            help=(
+                "Unit of the Time column if it holds plain numbers "
+                "(Default: %(default)s)."
+            ),
+            dest="time_unit",
+            choices=list(SECONDS_PER_UNIT),
+            default=TIME_UNIT,
+            required=False,
+        )
+
+        parser.add_argument(
+            "--growth-window",
+            action="store",
+            nargs=2,
+            metavar=("START", "END"),
+            help=(
+                "First and last hour to look for the maximum growth rate in "
+                "(Default: %(default)s)."
+            ),
+            dest="growth_window",
+            type=float,
+            default=list(GROWTH_WINDOW),
+            required=False,
+        )
+
+        parser.add_argument(
+            "--growth-rate-window",
+            action="store",
+            help=(
+                "Use specific growth rates, from fitting log(OD) against time over "
+                "this many points around each timepoint, instead of the difference "
+                "between consecutive values (Default: differences)."
+            ),
+            dest="growth_rate_window",
+            type=int,
+            default=None,
+            required=False,
+        )
+
+        parser.add_argument(
+            "--derived-metrics",
+            action="store",
+            help=(
+                "Curves to calculate lag time, doubling time, time to threshold "
+                "and area under the curve from: the preprocessed (blanked and "
+                "normalized) replicate averages or a model fitted to them "
+                "(Default: %(default)s)."
+            ),
+            dest="derived_metrics",
+            choices=["preprocessed", *FITTED_MODELS],
+            default="preprocessed",
+        )
+
+        parser.add_argument(
+            "--od-threshold",
+            action="store",
+            help=(
+                "Preprocessed OD to report the time to reach " "(Default: %(default)s)."
+            ),
+            dest="od_threshold",
+            type=float,
+            default=OD_THRESHOLD,
+            required=False,
+        )
+
+        parser.add_argument(
+            "--min-snr",
+            action="store",
+            help=(
+                "Don't fit samples whose rise above the blanks in the raw data is "
+                "less than this many times its noise, as estimated from the "
+                "blanks (Default: %(default)s)."
+            ),
+            dest="min_snr",
+            type=float,
+            default=MIN_SNR,
+            required=False,
+        )
+
+        parser.add_argument(
+            "--min-rise",
+            action="store",
+            help=(
+                "Don't fit samples whose rise above the blanks is less than this "
+                "(Default: %(default)s)."
+            ),
+            dest="min_rise",
+            type=float,
+            default=MIN_RISE,
+            required=False,
+        )
+
+        parser.add_argument(
+            "--min-slope",
+            action="store",
+            help=(
+                "Don't fit samples whose maximum slope per hour is less than this "
+                "(Default: %(default)s)."
+            ),
+            dest="min_slope",
+            type=float,
+            default=MIN_SLOPE,
+            required=False,
+        )
+
+        parser.add_argument(
+            "--top-growth-rates",
+            action="store",
+            help=(
+                "Number of largest growth rates per well to look for the lag "
+                "time and maximum growth rate in (Default: %(default)s)."
+            ),
+            dest="top_growth_rates",
+            type=int,
+            default=TOP_GROWTH_RATES,
+            required=False,
+        )
+
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            action="store",
+            help="Number of processes to fit wells in (Default: %(default)s).",
+            dest="jobs",
+            type=int,
+            default=1,
+            required=False,
+        )
+
+        parser.add_argument(
+            "--max-nfev",
+            action="store",
+            help="Model evaluations allowed per well fit (Default: %(default)s).",
+            dest="max_nfev",
+            type=int,
+            default=MAXFEV,
+            required=False,
+        )
+
+        parser.add_argument(
+            "--fit-retries",
+            action="store",
+            help=(
+                "Times a well fit is retried with a larger evaluation budget "
+                "(Default: %(default)s)."
+            ),
+            dest="max_retries",
+            type=int,
+            default=MAX_RETRIES,
+            required=False,
+        )
+
+        parser.add_argument(
+            "--fit-time-limit",
+            action="store",
+            help="Seconds allowed per well fit (Default: %(default)s).",
+            dest="time_limit",
+            type=float,
+            default=TIME_LIMIT,
+            required=False,
+        )
+
+        parser.add_argument(
+            "--compare-initial-guesses",
+            action="store_true",
+            help=(
+                "Also fit from the growth parameters as initial guesses and report "
+                "the model evaluations saved by the estimated initial guesses"
+            ),
+            dest="compare_initial_guesses",
+            default=False,
+            required=False,
+        )
+
+        parser.add_argument(
+            "--bootstrap",
+            action="store",
+            help=(
+                "Resamples per well for bootstrap confidence intervals of the "
+                "fitted parameters, 0 to skip (Default: %(default)s)."
+            ),
+            dest="n_bootstrap",
+            type=int,
+            default=0,
+            required=False,
+        )
+
+        parser.add_argument(
+            "--multi-start",
+            action="store",
+            help=(
+                "Perturbed starts to refit wells with an R-squared below "
+                "--multi-start-r2 from, 0 to skip (Default: %(default)s)."
+            ),
+            dest="n_starts",
+            type=int,
+            default=0,
+            required=False,
+        )
+
+        parser.add_argument(
+            "--multi-start-r2",
+            action="store",
+            help=(
+                "R-squared below which wells are refitted from multiple starts "
+                "(Default: %(default)s)."
+            ),
+            dest="r2_threshold",
+            type=float,
+            default=MULTI_START_R2,
+            required=False,
+        )
+
+        parser.add_argument(
+            "--no-cache",
+            action="store_false",
+            help=(
+                "Read the raw data and fit all wells again instead of reusing "
+                "cached data and fit results"
+            ),
+            dest="use_cache",
+            default=True,
+            required=False,
+        )
+
         parser.add_argument(
             "-v",
             "--verbose",
@@ -0,0 +1,710 @@
+"""Batched least squares fitting of a model to many wells at once.
+
+Every well is an independent least squares problem with a handful of
+parameters. Instead of setting up one optimizer per well, all wells
+are stacked into a wells x timepoints matrix and a Levenberg-Marquardt
+iteration is run on all of them simultaneously, so that each model
+evaluation is a single NumPy expression over the whole plate.
+"""
+
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Any, Callable
+
+import numpy as np
+
+from exceptions import MTPAnalyzerException
+
+MAXFEV = 2000
+MAX_RETRIES = 2
+BUDGET_ESCALATION = 2
+TIME_LIMIT = 30.0
+FTOL = 1.49012e-08
+XTOL = 1.49012e-08
+GTOL = 1e-6
+
+INITIAL_DAMPING = 1e-3
+MAX_DAMPING = 1e16
+MIN_CURVATURE = 1e-12
+
+CHUNKS_PER_JOB = 4
+# Bootstrap resamples are fitted in blocks of at most this many rows
+MAX_BOOTSTRAP_ROWS = 20000
+CONFIDENCE_LEVEL = 0.95
+NULL_SPACE_TOLERANCE = 1e-6
+# Multi-start fits launch this many perturbed starts per well at a time
+STARTS_PER_ROUND = 4
+# Standard deviation of the log of the factor each parameter is perturbed by
+START_SPREAD = 0.5
+
+# Status codes of a well fit
+FIT_CONVERGED = 0
+FIT_MAX_NFEV = 1
+FIT_TIME_LIMIT = 2
+FIT_FAILED = 3
+FIT_STATUS_LABELS = {
+    FIT_CONVERGED: "Converged",
+    FIT_MAX_NFEV: "Max evaluations reached",
+    FIT_TIME_LIMIT: "Time limit reached",
+    FIT_FAILED: "Failed",
+}
+
+Model = Callable[..., Any]
+
+# Views on the shared memory blocks, set up once in each worker process
+_worker_arrays: dict[str, np.ndarray] = {}  # type: ignore
+_worker_blocks: list[shared_memory.SharedMemory] = []
+
+
+@dataclass
+class BatchFitResult:
+    """Outcome of fitting a model to a batch of wells.
+
+    Attributes:
+        params: Optimal parameters, one row per well.
+        sse: Sum of squared residuals at the optimum for each well.
+        nfev: Number of model evaluations spent on each well,
+              including those used for finite differences.
+        status: Status code (FIT_CONVERGED etc.) of each well.
+    """
+
+    params: np.ndarray  # type: ignore
+    sse: np.ndarray  # type: ignore
+    nfev: np.ndarray  # type: ignore
+    status: np.ndarray  # type: ignore
+
+    @property
+    def converged(self) -> np.ndarray:  # type: ignore
+        """Whether the fit of each well met the tolerances."""
+        return self.status == FIT_CONVERGED  # type: ignore
+
+
+@dataclass
+class FitBudget:
+    """Limits on the effort spent fitting a single well.
+
+    Attributes:
+        max_nfev: Maximum number of model evaluations for the first
+                  attempt.
+        max_retries: Number of retries, each with a budget that is
+                     BUDGET_ESCALATION times larger than the last.
+        time_limit: Maximum wall-clock seconds, or None for no limit.
+    """
+
+    max_nfev: int = MAXFEV
+    max_retries: int = MAX_RETRIES
+    time_limit: float | None = TIME_LIMIT
+
+
+def evaluate_model(
+    model: Model,
+    t: np.ndarray,  # type: ignore
+    params: np.ndarray,  # type: ignore
+) -> np.ndarray:  # type: ignore
+    """Evaluate model for every row of params over all timepoints.
+
+    Args:
+        model: Model function taking t and one argument per parameter.
+        t: Timepoints, shape (timepoints,).
+        params: Parameters, shape (wells, parameters).
+
+    Return:
+        Predicted values, shape (wells, timepoints).
+    """
+    columns = [params[:, [i]] for i in range(params.shape[1])]
+    with np.errstate(all="ignore"):
+        return np.asarray(model(t, *columns), dtype="float64")
+
+
+def evaluate_jacobian(
+    jac: Model,
+    t: np.ndarray,  # type: ignore
+    params: np.ndarray,  # type: ignore
+) -> np.ndarray:  # type: ignore
+    """Evaluate analytic Jacobian for every row of params.
+
+    Args:
+        jac: Function taking t and one argument per parameter and
+             returning the partial derivatives stacked along the last
+             axis.
+        t: Timepoints, shape (timepoints,).
+        params: Parameters, shape (wells, parameters).
+
+    Return:
+        Jacobian, shape (wells, timepoints, parameters).
+    """
+    columns = [params[:, [i]] for i in range(params.shape[1])]
+    with np.errstate(all="ignore"):
+        jacobian = np.asarray(jac(t, *columns), dtype="float64")
+    return np.broadcast_to(jacobian, (params.shape[0], t.size, params.shape[1]))
+
+
+def select_initial_guess(
+    model: Model,
+    t: np.ndarray,  # type: ignore
+    observed: np.ndarray,  # type: ignore
+    candidates: list[np.ndarray],  # type: ignore
+) -> np.ndarray:  # type: ignore
+    """Pick the candidate initial guess closest to the data per well.
+
+    Args:
+        model: Model function taking t and one argument per parameter.
+        t: Timepoints, shape (timepoints,).
+        observed: Observed values, shape (wells, timepoints).
+        candidates: Initial guesses, each of shape (wells, parameters).
+                    Rows with NaN mean there is no such candidate for
+                    that well.
+
+    Return:
+        For every well, the candidate with the lowest sum of squared
+        residuals. Ties go to the earlier candidate.
+    """
+    stacked = np.stack([np.asarray(c, dtype="float64") for c in candidates])
+    sse = np.stack(
+        [np.sum((evaluate_model(model, t, c) - observed) ** 2, axis=1) for c in stacked]
+    )
+    sse = np.where(np.isfinite(sse), sse, np.inf)
+    best = np.argmin(sse, axis=0)
+    return stacked[best, np.arange(stacked.shape[1])]  # type: ignore
+
+
+def finite_difference_jacobian(
+    model: Model,
+    t: np.ndarray,  # type: ignore
+    params: np.ndarray,  # type: ignore
+    prediction: np.ndarray,  # type: ignore
+) -> np.ndarray:  # type: ignore
+    """Estimate Jacobian of model w.r.t. its parameters for all wells.
+
+    Uses forward differences, perturbing one parameter of every well
+    at a time, so the cost is one batched model evaluation per
+    parameter.
+
+    Return:
+        Jacobian, shape (wells, timepoints, parameters).
+    """
+    n_wells, n_params = params.shape
+    jacobian = np.empty((n_wells, t.size, n_params))
+    for i in range(n_params):
+        step = np.sqrt(np.finfo("float64").eps) * np.maximum(np.abs(params[:, i]), 1.0)
+        shifted = params.copy()
+        shifted[:, i] += step
+        jacobian[:, :, i] = (evaluate_model(model, t, shifted) - prediction) / step[
+            :, None
+        ]
+    return jacobian
+
+
+def fit_batch(
+    model: Model,
+    t: np.ndarray,  # type: ignore
+    observed: np.ndarray,  # type: ignore
+    p0: np.ndarray,  # type: ignore
+    bounds: tuple[list[float], list[float]] | None = None,
+    jac: Model | None = None,
+    max_nfev: int = MAXFEV,
+    max_retries: int = MAX_RETRIES,
+    time_limit: float | None = TIME_LIMIT,
+    ftol: float = FTOL,
+    xtol: float = XTOL,
+) -> BatchFitResult:
+    """Fit model independently to every well with Levenberg-Marquardt.
+
+    All wells are iterated together. Each well keeps its own damping
+    factor and leaves the iteration as soon as its own fit has
+    converged or exhausted its budget.
+
+    A well that runs out of evaluations is retried from its best
+    parameters so far, with reset damping and an evaluation budget
+    that is BUDGET_ESCALATION times larger, at most max_retries times.
+    Every well taking part in an iteration is charged its full
+    wall-clock time, as the well can't finish any sooner, and wells
+    whose time exceeds time_limit are given up.
+
+    Args:
+        model: Model function taking t and one argument per parameter.
+        t: Timepoints, shape (timepoints,).
+        observed: Observed values, shape (wells, timepoints).
+        p0: Initial guesses, shape (wells, parameters).
+        bounds: Lower and upper bound of each parameter. Steps are
+                projected onto the bounds.
+        jac: Analytic Jacobian of model, see evaluate_jacobian. If
+             not provided, it is estimated with finite differences.
+        max_nfev: Maximum number of model evaluations per well for the
+                  first attempt.
+        max_retries: Number of times a well may be retried with an
+                     escalated budget.
+        time_limit: Maximum wall-clock seconds spent on a well. None
+                    means no limit.
+        ftol: Relative reduction of the sum of squares at which a fit
+              counts as converged.
+        xtol: Relative step size at which a fit counts as converged.
+
+    Return:
+        Optimal parameters and status for each well. The parameters of
+        wells that didn't converge are the best ones found.
+    """
+    t = np.asarray(t, dtype="float64")
+    observed = np.asarray(observed, dtype="float64")
+    params = np.array(p0, dtype="float64", ndmin=2)
+    n_wells, n_params = params.shape
+    if observed.shape != (n_wells, t.size):
+        raise MTPAnalyzerException(
+            f"Observed data of shape {observed.shape} doesn't match {n_wells} wells "
+            f"with {t.size} timepoints"
+        )
+
+    if bounds is None:
+        lower = np.full(n_params, -np.inf)
+        upper = np.full(n_params, np.inf)
+    else:
+        lower = np.asarray(bounds[0], dtype="float64")
+        upper = np.asarray(bounds[1], dtype="float64")
+    params = np.clip(params, lower, upper)
+
+    residuals = evaluate_model(model, t, params) - observed
+    sse = np.sum(residuals**2, axis=1)
+    nfev = np.ones(n_wells, dtype="int64")
+    budget = np.full(n_wells, max_nfev, dtype="int64")
+    retries = np.zeros(n_wells, dtype="int64")
+    elapsed = np.zeros(n_wells)
+    damping = np.full(n_wells, INITIAL_DAMPING)
+    status = np.full(n_wells, FIT_MAX_NFEV)
+    active = np.isfinite(sse)
+    status[~active] = FIT_FAILED
+
+    while np.any(active):
+        iteration_start = time.perf_counter()
+        idx = np.flatnonzero(active)
+        p = params[idx]
+        prediction = residuals[idx] + observed[idx]
+
+        if jac is None:
+            jacobian = finite_difference_jacobian(model, t, p, prediction)
+            nfev[idx] += n_params
+        else:
+            jacobian = evaluate_jacobian(jac, t, p)
+
+        jacobian_t = jacobian.transpose(0, 2, 1)
+        curvature = jacobian_t @ jacobian
+        gradient = (jacobian_t @ residuals[idx][:, :, None])[:, :, 0]
+        scaling = np.diagonal(curvature, axis1=1, axis2=2).copy()
+        # Parameters the model is (numerically) insensitive to are
+        # damped as hard as the stiffest one, so they stay put
+        stiffest = np.max(scaling, axis=1, keepdims=True)
+        scaling = np.where(
+            scaling > MIN_CURVATURE * stiffest, scaling, np.maximum(stiffest, 1.0)
+        )
+        damped = curvature.copy()
+        damped[:, np.arange(n_params), np.arange(n_params)] += (
+            damping[idx, None] * scaling
+        )
+
+        solvable = np.all(np.isfinite(damped), axis=(1, 2)) & np.all(
+            np.isfinite(gradient), axis=1
+        )
+        step = np.zeros_like(p)
+        if np.any(solvable):
+            try:
+                step[solvable] = np.linalg.solve(
+                    damped[solvable], -gradient[solvable][:, :, None]
+                )[:, :, 0]
+            except np.linalg.LinAlgError:
+                step[solvable] = (
+                    np.linalg.pinv(damped[solvable]) @ -gradient[solvable][:, :, None]
+                )[:, :, 0]
+
+        candidate = np.clip(p + step, lower, upper)
+        candidate_residuals = evaluate_model(model, t, candidate) - observed[idx]
+        candidate_sse = np.sum(candidate_residuals**2, axis=1)
+        nfev[idx] += 1
+
+        improved = solvable & np.isfinite(candidate_sse) & (candidate_sse <= sse[idx])
+        sse_reduction = sse[idx] - candidate_sse
+        step_norm = np.linalg.norm(candidate - p, axis=1)
+
+        accepted = idx[improved]
+        params[accepted] = candidate[improved]
+        residuals[accepted] = candidate_residuals[improved]
+        sse[accepted] = candidate_sse[improved]
+        # Adapt damping to how well the quadratic model predicted the
+        # reduction (Nielsen's update)
+        predicted_reduction = -np.sum(
+            step * (2 * gradient + (curvature @ step[:, :, None])[:, :, 0]), axis=1
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gain = sse_reduction / predicted_reduction
+        gain = np.where(np.isfinite(gain), gain, 0.0)
+        damping[accepted] = np.maximum(
+            damping[accepted] * np.maximum(1 / 3, 1 - (2 * gain[improved] - 1) ** 3),
+            1e-12,
+        )
+        damping[idx[~improved]] *= 10.0
+
+        # The reduction is only a meaningful convergence criterion if the
+        # step wasn't held back by damping, i.e. the scaled gradient is
+        # (close to) orthogonal to the residuals as well
+        gradient_cosine = np.max(
+            np.abs(gradient) / np.sqrt(scaling * sse[idx, None] + MIN_CURVATURE),
+            axis=1,
+        )
+        done = improved & (
+            ((sse_reduction <= ftol * candidate_sse) & (gradient_cosine <= GTOL))
+            | (step_norm <= xtol * (xtol + np.linalg.norm(candidate, axis=1)))
+        )
+        # A well whose damping grows without bounds can't be improved
+        # any further, its current parameters are a (local) optimum
+        stuck = ~improved & (damping[idx] > MAX_DAMPING)
+        status[idx[done | stuck]] = FIT_CONVERGED
+        status[idx[~solvable]] = FIT_FAILED
+        active[idx[done | stuck | ~solvable]] = False
+
+        exhausted = active & (nfev > budget)
+        retry = exhausted & (retries < max_retries)
+        budget[retry] = nfev[retry] + budget[retry] * BUDGET_ESCALATION
+        retries[retry] += 1
+        damping[retry] = INITIAL_DAMPING
+        active[exhausted & ~retry] = False
+
+        elapsed[idx] += time.perf_counter() - iteration_start
+        if time_limit is not None:
+            timed_out = active & (elapsed > time_limit)
+            status[timed_out] = FIT_TIME_LIMIT
+            active[timed_out] = False
+
+    return BatchFitResult(params=params, sse=sse, nfev=nfev, status=status)
+
+
+def _share_array(
+    array: np.ndarray,  # type: ignore
+) -> tuple[shared_memory.SharedMemory, tuple[str, tuple[int, ...]]]:
+    """Copy array into a new shared memory block.
+
+    Return:
+        The block, which the caller must unlink, and the name and shape
+        workers need to attach to it.
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view: np.ndarray[Any, Any] = np.ndarray(
+        array.shape, dtype="float64", buffer=block.buf
+    )
+    view[...] = array
+    return block, (block.name, array.shape)
+
+
+def _attach_shared_arrays(specs: dict[str, tuple[str, tuple[int, ...]]]) -> None:
+    """Attach worker process to the shared time and plate arrays."""
+    for key, (name, shape) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        _worker_blocks.append(block)
+        _worker_arrays[key] = np.ndarray(shape, dtype="float64", buffer=block.buf)
+
+
+def _fit_shared_chunk(
+    model: Model,
+    start: int,
+    stop: int,
+    p0: np.ndarray,  # type: ignore
+    fit_options: dict[str, Any],
+) -> BatchFitResult:
+    """Fit the wells start:stop of the shared plate matrix."""
+    return fit_batch(
+        model,
+        _worker_arrays["t"],
+        _worker_arrays["observed"][start:stop],
+        p0,
+        **fit_options,
+    )
+
+
+def fit_batch_parallel(
+    model: Model,
+    t: np.ndarray,  # type: ignore
+    observed: np.ndarray,  # type: ignore
+    p0: np.ndarray,  # type: ignore
+    jobs: int,
+    seeds: list[np.ndarray] | None = None,  # type: ignore
+    **fit_options: Any,
+) -> BatchFitResult:
+    """Fit model to every well, spreading the wells over processes.
+
+    The time vector and plate matrix are placed in shared memory once,
+    and each task only names the range of wells to fit, so the data
+    isn't pickled per task. Wells are split into contiguous chunks and
+    each chunk is fitted with fit_batch.
+
+    Args:
+        model: Model function taking t and one argument per parameter.
+        t: Timepoints, shape (timepoints,).
+        observed: Observed values, shape (wells, timepoints).
+        p0: Initial guesses, shape (wells, parameters).
+        jobs: Number of worker processes. With 1, everything runs in
+              the current process.
+        seeds: Alternative initial guesses, like p0. The one closest to
+               the data of each well (see select_initial_guess) is
+               used.
+        fit_options: Passed on to fit_batch.
+
+    Return:
+        Results for all wells, in the order of the rows of observed.
+    """
+    t = np.asarray(t, dtype="float64")
+    observed = np.asarray(observed, dtype="float64")
+    p0 = np.array(p0, dtype="float64", ndmin=2)
+    if seeds:
+        p0 = select_initial_guess(model, t, observed, [p0, *seeds])
+    n_wells = observed.shape[0]
+    if jobs <= 1 or n_wells <= 1:
+        return fit_batch(model, t, observed, p0, **fit_options)
+
+    n_chunks = min(n_wells, jobs * CHUNKS_PER_JOB)
+    bounds = np.linspace(0, n_wells, n_chunks + 1).astype(int)
+
+    blocks: list[shared_memory.SharedMemory] = []
+    try:
+        specs: dict[str, tuple[str, tuple[int, ...]]] = {}
+        for key, array in (("t", t), ("observed", observed)):
+            block, spec = _share_array(array)
+            blocks.append(block)
+            specs[key] = spec
+
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_attach_shared_arrays,
+            initargs=(specs,),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _fit_shared_chunk,
+                    model,
+                    start,
+                    stop,
+                    p0[start:stop],
+                    fit_options,
+                )
+                for start, stop in zip(bounds[:-1], bounds[1:])
+            ]
+            results = [future.result() for future in futures]
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return BatchFitResult(
+        params=np.concatenate([r.params for r in results]),
+        sse=np.concatenate([r.sse for r in results]),
+        nfev=np.concatenate([r.nfev for r in results]),
+        status=np.concatenate([r.status for r in results]),
+    )
+
+
+def multi_start_fit(
+    model: Model,
+    t: np.ndarray,  # type: ignore
+    observed: np.ndarray,  # type: ignore
+    p0: np.ndarray,  # type: ignore
+    first: BatchFitResult,
+    n_starts: int,
+    sse_tolerance: np.ndarray,  # type: ignore
+    jobs: int = 1,
+    spread: float = START_SPREAD,
+    seed: int | None = 0,
+    **fit_options: Any,
+) -> BatchFitResult:
+    """Refit wells from perturbed starts and keep the best solution.
+
+    Starts are made by multiplying each parameter of the first fit (or
+    of p0, where the first fit didn't converge), and every other start
+    of p0, by a log-normal factor, so parameters keep their sign. They
+    are fitted in rounds of STARTS_PER_ROUND starts per well, with all
+    starts of all wells in a round stacked into one fit_batch_parallel
+    call. A well stops getting new starts once its best converged SSE
+    is at most its tolerance.
+
+    Args:
+        model: Model function taking t and one argument per parameter.
+        t: Timepoints, shape (timepoints,).
+        observed: Observed values, shape (wells, timepoints).
+        p0: Initial guesses the first fit started from, i.e. after
+            seed selection.
+        first: Result of the first fit of the wells.
+        n_starts: Maximum number of perturbed starts per well.
+        sse_tolerance: SSE below which a well is fitted well enough.
+        jobs: Number of processes to spread the fits over.
+        spread: Standard deviation of the log of the perturbation
+                factors.
+        seed: Seed of the random perturbations.
+        fit_options: Passed on to fit_batch.
+
+    Return:
+        Per well, the converged result with the lowest SSE, or first if
+        no start converged. nfev includes the evaluations of all starts.
+    """
+    t = np.asarray(t, dtype="float64")
+    observed = np.asarray(observed, dtype="float64")
+    p0 = np.array(p0, dtype="float64", ndmin=2)
+    # A converged first fit may sit in a local minimum or far out on a
+    # flat ridge, so starts alternate between perturbing it and p0
+    bases = np.stack([np.where(first.converged[:, None], first.params, p0), p0])
+    rng = np.random.default_rng(seed)
+
+    best = BatchFitResult(
+        params=first.params.copy(),
+        sse=np.where(first.converged, first.sse, np.inf),
+        nfev=first.nfev.copy(),
+        status=first.status.copy(),
+    )
+    n_started = 0
+    active = np.flatnonzero(~(first.converged & (first.sse <= sse_tolerance)))
+    while active.size and n_started < n_starts:
+        n_round = min(STARTS_PER_ROUND, n_starts - n_started)
+        base = bases[np.arange(n_started, n_started + n_round) % 2][:, active]
+        factors = np.exp(spread * rng.standard_normal(base.shape))
+        result = fit_batch_parallel(
+            model,
+            t,
+            np.tile(observed[active], (n_round, 1)),
+            (base * factors).reshape(-1, p0.shape[1]),
+            jobs,
+            **fit_options,
+        )
+        n_started += n_round
+
+        for start in range(n_round):
+            rows = slice(start * active.size, (start + 1) * active.size)
+            sse = np.where(result.converged[rows], result.sse[rows], np.inf)
+            better = sse < best.sse[active]
+            wells = active[better]
+            best.params[wells] = result.params[rows][better]
+            best.sse[wells] = sse[better]
+            best.status[wells] = FIT_CONVERGED
+            best.nfev[active] += result.nfev[rows]
+
+        done = best.sse[active] <= sse_tolerance[active]
+        active = active[~done]
+
+    best.sse = np.where(np.isfinite(best.sse), best.sse, first.sse)
+    return best
+
+
+def parameter_standard_errors(
+    jac: Model,
+    t: np.ndarray,  # type: ignore
+    params: np.ndarray,  # type: ignore
+    sse: np.ndarray,  # type: ignore
+) -> np.ndarray:  # type: ignore
+    """Compute standard errors of the optimal parameters.
+
+    The covariance is estimated as pinv(J^T J) * sse / (n - p), like
+    scipy's curve_fit does.
+
+    Args:
+        jac: Analytic Jacobian of the model, see evaluate_jacobian.
+        t: Timepoints, shape (timepoints,).
+        params: Optimal parameters, shape (wells, parameters).
+        sse: Sum of squared residuals of each well at the optimum.
+
+    Return:
+        Standard errors, shape (wells, parameters). NaN for parameters
+        that aren't identifiable at the optimum, wells with too few
+        timepoints and wells without finite parameters.
+    """
+    params = np.array(params, dtype="float64", ndmin=2)
+    n_params = params.shape[1]
+    jacobian = evaluate_jacobian(jac, t, params)
+    valid = np.all(np.isfinite(jacobian), axis=(1, 2))
+    jacobian = np.where(valid[:, None, None], jacobian, 0.0)
+
+    # Pseudo-inverse of J^T J from the singular values of J, which is
+    # better conditioned than inverting J^T J itself
+    _, singular_values, vt = np.linalg.svd(jacobian, full_matrices=False)
+    cutoff = np.finfo("float64").eps * max(jacobian.shape[1:]) * singular_values[:, :1]
+    kept = singular_values > cutoff
+    with np.errstate(divide="ignore"):
+        inverse_squares = np.where(kept, singular_values**-2.0, 0.0)
+    covariance = (vt.transpose(0, 2, 1) * inverse_squares[:, None, :]) @ vt
+
+    # Parameters that can change without changing the model, e.g. N_0 in
+    # Gompertz, or together with others, e.g. t0 and A0 in Richards
+    null_space_weight = np.sum(np.where(kept[:, :, None], 0.0, vt**2), axis=1)
+    identifiable = valid[:, None] & (null_space_weight < NULL_SPACE_TOLERANCE)
+
+    dof = t.size - n_params
+    variance = np.diagonal(covariance, axis1=1, axis2=2) * (
+        sse[:, None] / dof if dof > 0 else np.nan
+    )
+    with np.errstate(invalid="ignore"):
+        return np.where(identifiable, np.sqrt(variance), np.nan)
+
+
+def bootstrap_confidence_intervals(
+    model: Model,
+    t: np.ndarray,  # type: ignore
+    observed: np.ndarray,  # type: ignore
+    params: np.ndarray,  # type: ignore
+    n_resamples: int,
+    jobs: int = 1,
+    confidence_level: float = CONFIDENCE_LEVEL,
+    seed: int | None = 0,
+    **fit_options: Any,
+) -> tuple[np.ndarray, np.ndarray]:  # type: ignore
+    """Confidence intervals of the optimal parameters by bootstrapping.
+
+    For every well, n_resamples new data sets are made by adding
+    residuals, drawn with replacement from the residuals of the well,
+    to its fitted curve. All resamples of all wells are stacked and
+    refitted with fit_batch_parallel, starting from the optimal
+    parameters.
+
+    Args:
+        model: Model function taking t and one argument per parameter.
+        t: Timepoints, shape (timepoints,).
+        observed: Observed values, shape (wells, timepoints).
+        params: Optimal parameters, shape (wells, parameters).
+        n_resamples: Number of resamples per well.
+        jobs: Number of processes to spread the fits over.
+        confidence_level: Fraction of resampled parameters between the
+                          lower and upper bound.
+        seed: Seed of the random resampling.
+        fit_options: Passed on to fit_batch.
+
+    Return:
+        Lower and upper bounds, each of shape (wells, parameters). NaN
+        for wells without finite parameters.
+    """
+    t = np.asarray(t, dtype="float64")
+    observed = np.asarray(observed, dtype="float64")
+    params = np.array(params, dtype="float64", ndmin=2)
+    n_wells, n_params = params.shape
+    rng = np.random.default_rng(seed)
+
+    fitted = evaluate_model(model, t, params)
+    residuals = observed - fitted
+
+    resampled_params = np.full((n_resamples, n_wells, n_params), np.nan)
+    block_size = max(1, MAX_BOOTSTRAP_ROWS // max(n_wells, 1))
+    for start in range(0, n_resamples, block_size):
+        n_block = min(block_size, n_resamples - start)
+        draws = rng.integers(0, t.size, size=(n_block, n_wells, t.size))
+        resampled = fitted + np.take_along_axis(residuals[None], draws, axis=2)
+        result = fit_batch_parallel(
+            model,
+            t,
+            resampled.reshape(-1, t.size),
+            np.tile(params, (n_block, 1)),
+            jobs,
+            **fit_options,
+        )
+        block_params = np.where(result.converged[:, None], result.params, np.nan)
+        stop = start + n_block
+        resampled_params[start:stop] = block_params.reshape(n_block, n_wells, n_params)
+
+    tail = (1 - confidence_level) / 2 * 100
+    with warnings.catch_warnings():
+        # Wells without any converged resample get NaN bounds
+        warnings.simplefilter("ignore", RuntimeWarning)
+        lower, upper = np.nanpercentile(resampled_params, [tail, 100 - tail], axis=0)
+    return lower, upper
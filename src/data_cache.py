@@ -0,0 +1,161 @@
+"""On-disk cache for parsed plate reader data.
+
+Parsing a raw data file takes far longer than reading back the float
+matrix it results in, so the parsed matrix, time index and column names
+are stored as .npy files. They are keyed by a hash of the content and
+modification time of the raw data file, and the options it was parsed
+with. The matrix is memory-mapped when it's read back.
+
+Hashing a large file takes a while too, so a small pointer file maps
+the path and stat times of a file to its content hash.
+"""
+
+import hashlib
+import logging
+import os
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "mtp-analyzer", "data")
+MAX_CACHE_SIZE = 1024 * 1024 * 1024
+# Bump when parsing changes in a way that invalidates old entries
+CACHE_VERSION = 2
+HASH_CHUNK_SIZE = 1024 * 1024
+ENTRY_PARTS = ("values.npy", "index.npy", "labels.npy")
+
+
+class DataCache:
+    """Content-addressed store of parsed plate reader data."""
+
+    def __init__(self, directory: str = CACHE_DIR, max_size: int = MAX_CACHE_SIZE):
+        """Use (and create if needed) directory for cache entries.
+
+        Args:
+            directory: Where to store the entries.
+            max_size: Maximum total size of the entries in bytes.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        """Hash the content of the file at path."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def make_key(self, path: str, options: dict[str, Any]) -> str:
+        """Hash everything that determines the parsed data of a file.
+
+        Args:
+            path: Path to the raw data file.
+            options: Options the file is parsed with.
+
+        Return:
+            Hex digest identifying the parsed data.
+        """
+        stat = os.stat(path)
+        # Writing to a file always updates its ctime, unlike its mtime
+        identity = (
+            f"{os.path.abspath(path)}:{stat.st_ino}:{stat.st_size}:"
+            f"{stat.st_mtime_ns}:{stat.st_ctime_ns}"
+        )
+        pointer = self._path(hashlib.sha256(identity.encode()).hexdigest(), "ref")
+        try:
+            with open(pointer) as file:
+                content_hash = file.read().strip()
+        except OSError:
+            content_hash = self.hash_file(path)
+            with open(pointer, "w") as file:
+                file.write(content_hash)
+
+        key = f"{CACHE_VERSION}:{content_hash}:{stat.st_mtime_ns}"
+        key += f":{sorted(options.items())}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _path(self, key: str, part: str) -> str:
+        return os.path.join(self.directory, f"{key}.{part}")
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        """Return the cached data for key, or None on a miss."""
+        paths = [self._path(key, part) for part in ENTRY_PARTS]
+        try:
+            # Copy-on-write, so callers can modify the data in place
+            values = np.load(paths[0], mmap_mode="c")
+            index = np.load(paths[1])
+            labels = np.load(paths[2])
+        except (OSError, ValueError):
+            return None
+        for path in paths:
+            os.utime(path)
+
+        return pd.DataFrame(
+            values,
+            index=pd.Index(index, name=str(labels[0])),
+            columns=pd.Index(labels[1:].tolist()),
+        )
+
+    def put(self, key: str, data: pd.DataFrame) -> None:
+        """Store the data for key without evicting anything."""
+        values_path, index_path, labels_path = (
+            self._path(key, part) for part in ENTRY_PARTS
+        )
+        # The index name followed by the column names
+        labels = np.array([str(data.index.name), *data.columns.astype(str)])
+        np.save(labels_path, labels)
+        np.save(index_path, data.index.to_numpy(dtype="float64"))
+        # The values keep their type, e.g. float32
+        np.save(values_path, data.to_numpy())
+
+    def evict(self) -> None:
+        """Remove least recently used files until below the size cap."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        n_evicted = 0
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            os.remove(path)
+            total_size -= size
+            n_evicted += 1
+
+        if n_evicted:
+            logging.debug(f"Evicted {n_evicted} files from data cache.")
+
+    def load(
+        self,
+        path: str,
+        parse: Callable[..., pd.DataFrame],
+        **options: Any,
+    ) -> pd.DataFrame:
+        """Get the parsed data of a file, parsing it only on a miss.
+
+        Args:
+            path: Path to the raw data file.
+            parse: Function parsing the file, called as
+                   parse(path, **options).
+            options: Passed on to parse.
+
+        Return:
+            The parsed data, with a float64 index.
+        """
+        key = self.make_key(path, options)
+        data = self.get(key)
+        if data is not None:
+            logging.debug(f"Loaded '{path}' from data cache.")
+            return data
+
+        data = parse(path, **options)
+        self.put(key, data)
+        self.evict()
+        return data
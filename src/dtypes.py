@@ -0,0 +1,12 @@
+"""Float types that the well values are processed in."""
+
+import numpy as np
+import pandas as pd
+
+DTYPES = ("float64", "float32")
+DEFAULT_DTYPE = "float64"
+
+
+def float_dtype(data: pd.DataFrame) -> np.dtype:  # type: ignore
+    """Get the float type to process data in, keeping float32 data as is."""
+    return np.result_type(*data.dtypes, np.float32)
@@ -0,0 +1,243 @@
+"""On-disk cache for the results of fitting a model to a well.
+
+A fit result only depends on the data of the well, the initial guess
+it's fitted from, the bounds, the fit budget and the model, so a hash of
+those is used as the key. Each
+entry is a small .npy file. The modification time of an entry is
+bumped whenever it's read, and the least recently used entries are
+evicted when the cache grows beyond its size cap.
+"""
+
+import hashlib
+import logging
+import os
+from typing import Any
+
+import numpy as np
+
+from curve_fitting import (
+    BatchFitResult,
+    Model,
+    fit_batch_parallel,
+    select_initial_guess,
+)
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "mtp-analyzer", "fits")
+MAX_CACHE_SIZE = 64 * 1024 * 1024
+# Bump when the fitting changes in a way that invalidates old results
+CACHE_VERSION = 3
+
+
+class FitCache:
+    """Content-addressed store of per-well fit results."""
+
+    def __init__(self, directory: str = CACHE_DIR, max_size: int = MAX_CACHE_SIZE):
+        """Use (and create if needed) directory for cache entries.
+
+        Args:
+            directory: Where to store the entries.
+            max_size: Maximum total size of the entries in bytes.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(
+        model: Model,
+        t: np.ndarray,  # type: ignore
+        observed: np.ndarray,  # type: ignore
+        p0: np.ndarray,  # type: ignore
+        bounds: tuple[list[float], list[float]] | None,
+        options: dict[str, Any] | None = None,
+    ) -> str:
+        """Hash everything that determines the fit result of a well.
+
+        Args:
+            model: Model function that is fitted.
+            t: Timepoints.
+            observed: Observed values of the well.
+            p0: Initial guess the well is fitted from.
+            bounds: Lower and upper bound of each parameter.
+            options: Options of the fit, e.g. its budget. Functions,
+                     like jac, are identified by their name.
+
+        Return:
+            Hex digest identifying the fit.
+        """
+        model_identity = f"{CACHE_VERSION}:{model.__module__}.{model.__qualname__}"
+        digest = hashlib.sha256(model_identity.encode())
+        for array in (t, observed, p0):
+            digest.update(np.ascontiguousarray(array, dtype="float64").tobytes())
+            digest.update(b"|")
+        if bounds is not None:
+            digest.update(np.asarray(bounds, dtype="float64").tobytes())
+        # The repr of a function holds its address, which changes per run
+        options = {
+            name: (
+                f"{value.__module__}.{value.__qualname__}" if callable(value) else value
+            )
+            for name, value in (options or {}).items()
+        }
+        digest.update(f"|{sorted(options.items())}".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_seed_key(model: Model, name: str) -> str:
+        """Key of the last optimal parameters of model for a well name."""
+        seed_identity = f"seed:{CACHE_VERSION}:{model.__module__}.{model.__qualname__}"
+        return hashlib.sha256(f"{seed_identity}:{name}".encode()).hexdigest()
+
+    def get_seeds(
+        self,
+        model: Model,
+        names: list[str],
+        n_params: int,
+    ) -> np.ndarray:  # type: ignore
+        """Get parameters from earlier runs to start fits from.
+
+        Args:
+            model: Model function that is fitted.
+            names: Names of the wells.
+            n_params: Number of parameters of model.
+
+        Return:
+            One row per name with the last optimal parameters found for
+            it, NaN where there are none.
+        """
+        seeds = np.full((len(names), n_params), np.nan)
+        for i, name in enumerate(names):
+            values = self.get(self.make_seed_key(model, name))
+            if values is not None and values.shape == (n_params,):
+                seeds[i] = values
+        return seeds
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def get(self, key: str) -> np.ndarray | None:  # type: ignore
+        """Return the cached result for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            values: np.ndarray = np.load(path)  # type: ignore
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return values
+
+    def put(self, key: str, values: np.ndarray) -> None:  # type: ignore
+        """Store the result for key without evicting anything."""
+        np.save(self._path(key), np.asarray(values, dtype="float64"))
+
+    def evict(self) -> None:
+        """Remove least recently used entries until below the size cap."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".npy"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        n_evicted = 0
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            os.remove(path)
+            total_size -= size
+            n_evicted += 1
+
+        if n_evicted:
+            logging.debug(f"Evicted {n_evicted} entries from fit cache.")
+
+    def fit_batch(
+        self,
+        model: Model,
+        t: np.ndarray,  # type: ignore
+        observed: np.ndarray,  # type: ignore
+        p0: np.ndarray,  # type: ignore
+        jobs: int = 1,
+        bounds: tuple[list[float], list[float]] | None = None,
+        seeds: list[np.ndarray] | None = None,  # type: ignore
+        names: list[str] | None = None,
+        **fit_options: Any,
+    ) -> BatchFitResult:
+        """Fit model to every well, reusing cached results.
+
+        Only the wells without a cached result are fitted (see
+        fit_batch_parallel). Results of wells that converged are added
+        to the cache, others are retried on the next call.
+
+        If names are given, the optimal parameters found for a name in
+        earlier runs are an additional seed for fitting it. A seed is
+        kept once stored, so repeated runs start from, and hit, the same
+        cached fits. The initial
+        guess of each well is picked from p0 and the seeds first (see
+        select_initial_guess), and is part of the cache key along with
+        fit_options.
+
+        Args:
+            model: Model function taking t and one argument per
+                   parameter.
+            t: Timepoints, shape (timepoints,).
+            observed: Observed values, shape (wells, timepoints).
+            p0: Initial guesses, shape (wells, parameters).
+            jobs: Number of processes to spread the fitted wells over.
+            bounds: Lower and upper bound of each parameter.
+            seeds: Alternative initial guesses, like p0.
+            names: Name of each well, e.g. its sample name.
+            fit_options: Passed on to fit_batch.
+
+        Return:
+            Results for all wells, in the order of the rows of observed.
+        """
+        p0 = np.array(p0, dtype="float64", ndmin=2)
+        n_wells, n_params = p0.shape
+        candidates = list(seeds or [])
+        if names is not None:
+            stored = self.get_seeds(model, names, n_params)
+            candidates.append(stored)
+        if candidates:
+            p0 = select_initial_guess(model, t, observed, [p0, *candidates])
+        keys = [
+            self.make_key(model, t, observed[i], p0[i], bounds, fit_options)
+            for i in range(n_wells)
+        ]
+
+        # One row per well: parameters, sse, nfev and status
+        rows = np.empty((n_wells, n_params + 3))
+        missing = []
+        for i, key in enumerate(keys):
+            values = self.get(key)
+            if values is not None and values.shape == (n_params + 3,):
+                rows[i] = values
+            else:
+                missing.append(i)
+        logging.debug(
+            f"Fit cache: {n_wells - len(missing)} hits, {len(missing)} misses."
+        )
+
+        if missing:
+            result = fit_batch_parallel(
+                model,
+                t,
+                observed[missing],
+                p0[missing],
+                jobs,
+                bounds=bounds,
+                **fit_options,
+            )
+            rows[missing] = np.column_stack(
+                [result.params, result.sse, result.nfev, result.status]
+            )
+            for i in np.asarray(missing)[result.converged]:
+                self.put(keys[i], rows[i])
+                if names is not None and np.isnan(stored[i]).all():
+                    self.put(self.make_seed_key(model, names[i]), rows[i, :n_params])
+            self.evict()
+
+        return BatchFitResult(
+            params=rows[:, :n_params],
+            sse=rows[:, n_params],
+            nfev=rows[:, n_params + 1].astype("int64"),
+            status=rows[:, n_params + 2].astype("int64"),
+        )
@@ -4,13 +4,34 @@ Fit curve and determine goodness of fit using Richards and Gompertz
 models for timeseries of well data.
 """
 
-from typing import Any
+import logging
+from dataclasses import asdict
+from typing import Callable
 
 import numpy as np
 import pandas as pd
-from scipy.optimize import curve_fit  # type: ignore
 
-MAXFEV = 2000
+from curve_fitting import (
+    FIT_STATUS_LABELS,
+    BatchFitResult,
+    FitBudget,
+    Model,
+    bootstrap_confidence_intervals,
+    evaluate_model,
+    fit_batch_parallel,
+    multi_start_fit,
+    parameter_standard_errors,
+    select_initial_guess,
+)
+from exceptions import MTPAnalyzerException
+from fit_cache import FitCache
+
+# Shape parameter of the Richards model
+NU = 1.5
+# Wells fitted worse than this get multi-start fits, if enabled
+MULTI_START_R2 = 0.99
+# Fit status of wells that aren't fitted because they didn't grow
+NO_GROWTH_STATUS = "No growth"
 
 
 def gompertz_model(
@@ -43,7 +64,7 @@ def richards_model(
     k: pd.Series,  # type: ignore
     t0: pd.Series,  # type: ignore
     A0: pd.Series,  # type: ignore
-    nu: float = 1.5,
+    nu: float = NU,
 ) -> pd.Series:  # type: ignore
     """Get population given time and parameters using Richards model.
 
@@ -65,6 +86,68 @@ def richards_model(
     return A * (1 + Q * np.exp(-k * (t - t0))) ** (-1 / nu)  # type: ignore
 
 
+def gompertz_jacobian(
+    t: np.ndarray,  # type: ignore
+    N_0: np.ndarray,  # type: ignore
+    A: np.ndarray,  # type: ignore
+    k: np.ndarray,  # type: ignore
+) -> np.ndarray:  # type: ignore
+    """Partial derivatives of gompertz_model w.r.t. its parameters.
+
+    Args:
+        t: Time points.
+        N_0: Initial population.
+        A: Asymptotic maximum population.
+        k: Maximum growth rate.
+
+    Return:
+        Array with the derivatives w.r.t. N_0, A and k stacked along
+        the last axis.
+    """
+    decay = np.exp(-k * t)
+    population_size = N_0 * np.exp(np.log(A / N_0) - decay)
+    d_N_0 = np.zeros_like(population_size)
+    d_A = population_size / A
+    d_k = population_size * t * decay
+    return np.stack(np.broadcast_arrays(d_N_0, d_A, d_k), axis=-1)
+
+
+def richards_jacobian(
+    t: np.ndarray,  # type: ignore
+    A: np.ndarray,  # type: ignore
+    k: np.ndarray,  # type: ignore
+    t0: np.ndarray,  # type: ignore
+    A0: np.ndarray,  # type: ignore
+    nu: float = NU,
+) -> np.ndarray:  # type: ignore
+    """Partial derivatives of richards_model w.r.t. its parameters.
+
+    Args:
+        t: Time points.
+        A: Asymptotic max population.
+        k: Maximum growth rate.
+        t0: Inflection point.
+        A0: Initial population size.
+        nu: Shape parameter. Defaults to 1.5.
+
+    Return:
+        Array with the derivatives w.r.t. A, k, t0 and A0 stacked
+        along the last axis.
+    """
+    ratio = (A / A0) ** nu
+    Q = ratio - 1
+    decay = np.exp(-k * (t - t0))
+    base = 1 + Q * decay
+    outer = base ** (-1 / nu)
+    inner = base ** (-1 / nu - 1)
+
+    d_A = outer - inner * decay * ratio
+    d_k = A / nu * inner * Q * decay * (t - t0)
+    d_t0 = -A / nu * inner * Q * decay * k
+    d_A0 = A * inner * decay * ratio / A0
+    return np.stack(np.broadcast_arrays(d_A, d_k, d_t0, d_A0), axis=-1)
+
+
 def calculate_BIC(n: float, k: float, sse: float) -> float:
     """Calculate Bayesian Information Criterion."""
     log_likelihood = -n / 2 * (np.log(2 * np.pi * (sse / n)) + 1)
@@ -72,35 +155,243 @@ def calculate_BIC(n: float, k: float, sse: float) -> float:
     return bic  # type: ignore
 
 
+def get_batch_performance_metrics(
+    N_pred: np.ndarray,  # type: ignore
+    N_data: np.ndarray,  # type: ignore
+    n_parameters: int,
+) -> dict[str, np.ndarray]:  # type: ignore
+    """Calculate R-squared, RMSE, AIC and BIC for many model fits.
+
+    Args:
+        N_pred: Population values predicted by the model, shape
+                (wells, timepoints).
+        N_data: Observed population values, same shape as N_pred.
+        n_parameters: Number of parameters of used model.
+
+    Return:
+        Each metric for every well, in the order of the rows.
+    """
+    N_pred = np.atleast_2d(np.asarray(N_pred, dtype="float64"))
+    N_data = np.atleast_2d(np.asarray(N_data, dtype="float64"))
+    n = N_data.shape[1]
+
+    residuals = N_pred - N_data
+    SS_res = np.sum(residuals**2, axis=1)
+    SS_tot = np.sum((N_data - np.mean(N_data, axis=1, keepdims=True)) ** 2, axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        R_2 = 1 - SS_res / SS_tot
+        RMSE = np.sqrt(SS_res / n)
+        AIC = n * np.log(SS_res) + 2 * n_parameters
+        BIC = calculate_BIC(n=n, k=n_parameters, sse=SS_res)
+
+    return {"R_2": R_2, "RMSE": RMSE, "AIC": AIC, "BIC": BIC}
+
+
 def get_performance_metrics(
     N_pred: pd.Series,  # type: ignore
     N_data: np.ndarray,  # type: ignore
     n_parameters: int,
-    n: int,
 ) -> dict[str, float]:
     """Calcluate R-squared, RMSE, AIC and BIC for model fit.
 
+    Single well version of get_batch_performance_metrics.
+
     Args:
         N_pred: Population values predicted by the model.
         N_data: Observed population values.
         n_parameters: Number of parameters of used model.
-        n: Number of data records.
     """
-    residuals = N_pred - N_data
-    SS_res = np.sum(residuals**2)
-    SS_tot = np.sum(N_data - np.mean(N_data) ** 2)
+    metrics = get_batch_performance_metrics(
+        np.asarray(N_pred), np.asarray(N_data), n_parameters
+    )
+    return {name: float(values[0]) for name, values in metrics.items()}
 
-    R_2 = 1 - SS_res / SS_tot
-    RMSE = np.sqrt(np.mean(residuals**2))
-    AIC = n * np.log(np.mean(SS_res)) + 2 * n_parameters
-    BIC = calculate_BIC(n=n, k=n_parameters, sse=SS_res)
 
-    return {"R_2": R_2, "RMSE": RMSE, "AIC": AIC, "BIC": BIC}
+def fit_model_to_wells(
+    model: Model,
+    jacobian: Model,
+    mtp_data: pd.DataFrame,
+    p0: np.ndarray,  # type: ignore
+    parameter_names: list[str],
+    bounds: tuple[list[float], list[float]] | None = None,
+    jobs: int = 1,
+    cache: FitCache | None = None,
+    budget: FitBudget | None = None,
+    seeds: list[np.ndarray] | None = None,  # type: ignore
+    n_bootstrap: int = 0,
+    n_starts: int = 0,
+    r2_threshold: float = MULTI_START_R2,
+    no_growth: np.ndarray | None = None,  # type: ignore
+) -> pd.DataFrame:
+    """Fit model to all wells in one batch and collect the metrics.
+
+    Wells that can't be fitted within the budget get NaN parameters
+    and metrics instead of stopping the analysis, and the column
+    "Fit status" tells why. So do wells that didn't grow, which aren't
+    fitted at all.
+
+    Args:
+        model: Model function, e.g. gompertz_model.
+        jacobian: Partial derivatives of model, e.g. gompertz_jacobian.
+        mtp_data: Cleaned up data, one column per well.
+        p0: Initial guess for each well, one row per column of
+            mtp_data.
+        parameter_names: Column names for the optimal parameters.
+        bounds: Lower and upper bound of each parameter.
+        jobs: Number of processes to spread the wells over.
+        cache: Cache to reuse earlier fit results from. If None, every
+               well is fitted.
+        budget: Limits on the effort spent per well. Defaults to
+                FitBudget().
+        seeds: Alternative initial guesses, like p0. Each well is
+               fitted from the guess closest to its data.
+        n_bootstrap: Number of bootstrap resamples per well for
+                     confidence intervals of the parameters. 0 skips
+                     the bootstrap.
+        n_starts: Maximum number of perturbed starts for wells whose
+                  first fit has an R-squared below r2_threshold, see
+                  multi_start_fit. 0 skips multi-start fitting.
+        r2_threshold: R-squared at which a well is fitted well enough.
+        no_growth: Whether each well didn't grow, see
+                   analysis.screen_no_growth. These wells get status
+                   NO_GROWTH_STATUS and no model evaluations.
+
+    Return:
+        Dataframe with optimal parameters, performance metrics, fit
+        status, number of model evaluations (nfev) and standard errors
+        (and bootstrap confidence intervals) of the parameters, indexed
+        by well.
+    """
+    if no_growth is not None and np.any(no_growth):
+        growing = ~np.asarray(no_growth, dtype=bool)
+        model_metrics_df = fit_model_to_wells(
+            model,
+            jacobian,
+            mtp_data.loc[:, growing],
+            p0[growing],
+            parameter_names,
+            bounds=bounds,
+            jobs=jobs,
+            cache=cache,
+            budget=budget,
+            seeds=None if seeds is None else [seed[growing] for seed in seeds],
+            n_bootstrap=n_bootstrap,
+            n_starts=n_starts,
+            r2_threshold=r2_threshold,
+        ).reindex(mtp_data.columns)
+        model_metrics_df["Fit status"] = model_metrics_df["Fit status"].where(
+            growing, NO_GROWTH_STATUS
+        )
+        model_metrics_df["nfev"] = model_metrics_df["nfev"].fillna(0).astype(int)
+        logging.debug(
+            f"Skipped {np.count_nonzero(~growing)} {model.__name__} fits of wells "
+            f"without growth."
+        )
+        return model_metrics_df
+
+    t_data = mtp_data.index.to_numpy(dtype="float64")
+    observed = mtp_data.to_numpy(dtype="float64").T
+
+    budget_options = asdict(budget or FitBudget())
+    fit_options = dict(budget_options)
+    candidates = list(seeds or [])
+    fit: Callable[..., BatchFitResult]
+    if cache is None:
+        fit = fit_batch_parallel
+    else:
+        fit = cache.fit_batch
+        fit_options["names"] = [str(c) for c in mtp_data.columns]
+        candidates.append(cache.get_seeds(model, fit_options["names"], p0.shape[1]))
+    # The start is selected here, so multi-start fits perturb the start
+    # the first fit actually came from
+    start = p0
+    if candidates:
+        start = select_initial_guess(model, t_data, observed, [p0, *candidates])
+    result = fit(
+        model,
+        t_data,
+        observed,
+        start,
+        jobs,
+        bounds=bounds,
+        jac=jacobian,
+        **fit_options,
+    )
+    if n_starts > 0:
+        SS_tot = np.sum(
+            (observed - np.mean(observed, axis=1, keepdims=True)) ** 2, axis=1
+        )
+        first = result
+        result = multi_start_fit(
+            model,
+            t_data,
+            observed,
+            start,
+            result,
+            n_starts,
+            (1 - r2_threshold) * SS_tot,
+            jobs,
+            bounds=bounds,
+            jac=jacobian,
+            **budget_options,
+        )
+        improved = result.converged & ~(first.converged & (result.sse >= first.sse))
+        logging.debug(
+            f"Multi-start fitting improved {np.count_nonzero(improved)} "
+            f"{model.__name__} fits."
+        )
+    if not np.all(result.converged):
+        failed = ", ".join(str(c) for c in mtp_data.columns[~result.converged])
+        logging.warning(f"Optimal {model.__name__} parameters not found for: {failed}")
+
+    params = np.where(result.converged[:, None], result.params, np.nan)
+    predictions = evaluate_model(model, t_data, params)
+
+    model_metrics_df = pd.DataFrame(
+        params, columns=parameter_names, index=mtp_data.columns
+    )
+    for name, values in get_batch_performance_metrics(
+        predictions, observed, n_parameters=len(parameter_names)
+    ).items():
+        model_metrics_df[name] = values
+    model_metrics_df["Fit status"] = [FIT_STATUS_LABELS[s] for s in result.status]
+    model_metrics_df["nfev"] = result.nfev
+
+    standard_errors = parameter_standard_errors(jacobian, t_data, params, result.sse)
+    for i, name in enumerate(parameter_names):
+        model_metrics_df[f"{name}_se"] = standard_errors[:, i]
+
+    if n_bootstrap > 0:
+        logging.debug(f"Bootstrapping {model.__name__} with {n_bootstrap} resamples.")
+        lower, upper = bootstrap_confidence_intervals(
+            model,
+            t_data,
+            observed,
+            params,
+            n_bootstrap,
+            jobs,
+            bounds=bounds,
+            jac=jacobian,
+            **budget_options,
+        )
+        for i, name in enumerate(parameter_names):
+            model_metrics_df[f"{name}_ci_low"] = lower[:, i]
+            model_metrics_df[f"{name}_ci_high"] = upper[:, i]
+    return model_metrics_df
 
 
 def gompertz_model_metrics(
     mtp_data: pd.DataFrame,
     growth_parameters: pd.DataFrame,
+    jobs: int = 1,
+    cache: FitCache | None = None,
+    budget: FitBudget | None = None,
+    initial_estimates: pd.DataFrame | None = None,
+    n_bootstrap: int = 0,
+    n_starts: int = 0,
+    r2_threshold: float = MULTI_START_R2,
+    no_growth: pd.Series | None = None,
 ) -> pd.DataFrame:
     """Get optimal parameters and performance metrics for Gompertz.
 
@@ -108,58 +399,63 @@ def gompertz_model_metrics(
         mtp_data: Cleaned up data.
         growth_parameters: L, k, t, and A values for each mtp data
                            column.
+        jobs: Number of processes to spread the wells over.
+        cache: Cache to reuse earlier fit results from.
+        budget: Limits on the effort spent per well.
+        initial_estimates: Output of estimate_initial_parameters. If
+                           given, fits start from these instead of
+                           growth_parameters.
+        n_bootstrap: Number of bootstrap resamples per well.
+        n_starts: Maximum number of multi-start fits for poorly fitted
+                  wells.
+        r2_threshold: R-squared below which a well is poorly fitted.
+        no_growth: Whether each mtp data column didn't grow. If given,
+                   those aren't fitted.
 
     Return:
         Dataframe with optimal parameters for Gompertz model and
         performance metrics.
     """
-    t_data = mtp_data.index.to_numpy()
-
-    all_model_metrics: list[dict[str, Any]] = []
-
-    for well_index in mtp_data.columns:
-        N_data = mtp_data[well_index].to_numpy()
-
-        p_opt, p_cov = curve_fit(
-            gompertz_model,
-            t_data,
-            N_data,
-            p0=[
-                mtp_data.loc[mtp_data.index[0], well_index],
-                growth_parameters.loc[well_index, "A"],
-                growth_parameters.loc[well_index, "k"],
-            ],
-            bounds=([0.0, 0.0, 0.0], [np.inf, np.inf, np.inf]),
-            maxfev=MAXFEV,
+    if initial_estimates is None:
+        p0 = np.column_stack(
+            [
+                mtp_data.iloc[0].to_numpy(),
+                growth_parameters.loc[mtp_data.columns, "A"].to_numpy(),
+                growth_parameters.loc[mtp_data.columns, "k"].to_numpy(),
+            ]
         )
-
-        N_pred = gompertz_model(t_data, *p_opt)
-
-        N_0_opt, N_inf_opt, alpha_opt = p_opt
-        well_model_metrics = {
-            "N_0_opt": N_0_opt,
-            "N_inf_opt": N_inf_opt,
-            "alpha_opt": alpha_opt,
-        }
-
-        well_model_metrics.update(
-            get_performance_metrics(
-                N_pred=N_pred,
-                N_data=N_data,
-                n_parameters=3,
-                n=len(t_data),
-            )
-        )
-        all_model_metrics.append(well_model_metrics)
-
-    model_metrics_df = pd.DataFrame(all_model_metrics)
-    model_metrics_df.index = mtp_data.columns
-    return model_metrics_df
+    else:
+        estimates = initial_estimates.loc[mtp_data.columns]
+        p0 = estimates[["N_0", "A", "mu"]].to_numpy()
+    return fit_model_to_wells(
+        gompertz_model,
+        gompertz_jacobian,
+        mtp_data,
+        p0,
+        ["N_0_opt", "N_inf_opt", "alpha_opt"],
+        bounds=([0.0, 0.0, 0.0], [np.inf, np.inf, np.inf]),
+        jobs=jobs,
+        cache=cache,
+        budget=budget,
+        n_bootstrap=n_bootstrap,
+        n_starts=n_starts,
+        r2_threshold=r2_threshold,
+        no_growth=None if no_growth is None else no_growth[mtp_data.columns].to_numpy(),
+    )
 
 
 def richards_model_metrics(
     mtp_data: pd.DataFrame,
     growth_parameters: pd.DataFrame,
+    jobs: int = 1,
+    cache: FitCache | None = None,
+    budget: FitBudget | None = None,
+    initial_estimates: pd.DataFrame | None = None,
+    gompertz_metrics: pd.DataFrame | None = None,
+    n_bootstrap: int = 0,
+    n_starts: int = 0,
+    r2_threshold: float = MULTI_START_R2,
+    no_growth: pd.Series | None = None,
 ) -> pd.DataFrame:
     """Get optimal parameters and performance metrics for Richards.
 
@@ -167,66 +463,153 @@ def richards_model_metrics(
         mtp_data: Cleaned up data.
         growth_parameters: L, k, t, and A values for each mtp data
                            column.
+        jobs: Number of processes to spread the wells over.
+        cache: Cache to reuse earlier fit results from.
+        budget: Limits on the effort spent per well.
+        initial_estimates: Output of estimate_initial_parameters. If
+                           given, fits start from these instead of
+                           growth_parameters.
+        gompertz_metrics: Output of gompertz_model_metrics. If given,
+                          the converged Gompertz fit is an alternative
+                          starting point for each well.
+        n_bootstrap: Number of bootstrap resamples per well.
+        n_starts: Maximum number of multi-start fits for poorly fitted
+                  wells.
+        r2_threshold: R-squared below which a well is poorly fitted.
+        no_growth: Whether each mtp data column didn't grow. If given,
+                   those aren't fitted.
 
     Return:
         Dataframe with optimal parameters for Richards model and
         performance metrics.
     """
-    t_data = mtp_data.index.to_numpy()
-
-    all_model_metrics: list[dict[str, Any]] = []
-
-    for well_index in mtp_data.columns:
-        N_data = mtp_data[well_index].to_numpy()
-
-        p_opt, p_cov = curve_fit(
-            richards_model,
-            t_data,
-            N_data,
-            p0=[
-                growth_parameters.loc[well_index, "A"],
-                growth_parameters.loc[well_index, "k"],
-                growth_parameters.loc[well_index, "t"],
-                mtp_data.loc[mtp_data.index[0], well_index],
-            ],
-            maxfev=MAXFEV,
+    if initial_estimates is None:
+        p0 = np.column_stack(
+            [
+                growth_parameters.loc[mtp_data.columns, "A"].to_numpy(),
+                growth_parameters.loc[mtp_data.columns, "k"].to_numpy(),
+                growth_parameters.loc[mtp_data.columns, "t"].to_numpy(),
+                mtp_data.iloc[0].to_numpy(),
+            ]
+        )
+    else:
+        # Early on, the Richards curve grows exponentially at rate k / nu,
+        # and at t0 it passes through A0
+        estimates = initial_estimates.loc[mtp_data.columns]
+        p0 = np.column_stack(
+            [
+                estimates["A"].to_numpy(),
+                NU * estimates["mu"].to_numpy(),
+                estimates["t_mu"].to_numpy(),
+                estimates["N_mu"].to_numpy(),
+            ]
         )
-        N_pred = richards_model(t_data, *p_opt)
-
-        A_opt, k_opt, t0_opt, A0_opt = p_opt
-        well_model_metrics = {
-            "A_opt": A_opt,
-            "k_opt": k_opt,
-            "t0_opt": t0_opt,
-            "A0_opt": A0_opt,
-        }
-
-        well_model_metrics.update(
-            get_performance_metrics(
-                N_pred=N_pred,
-                N_data=N_data,
-                n_parameters=4,
-                n=len(t_data),
+
+    seeds: list[np.ndarray] = []  # type: ignore
+    if gompertz_metrics is not None:
+        # The Richards curve approaches the Gompertz curve for small nu.
+        # Matching them at the first timepoint gives A0.
+        gompertz = gompertz_metrics.loc[mtp_data.columns]
+        t_start = np.full(len(gompertz), mtp_data.index[0], dtype="float64")
+        seeds.append(
+            np.column_stack(
+                [
+                    gompertz["N_inf_opt"].to_numpy(),
+                    gompertz["alpha_opt"].to_numpy(),
+                    t_start,
+                    gompertz_model(
+                        t_start,
+                        gompertz["N_0_opt"],
+                        gompertz["N_inf_opt"],
+                        gompertz["alpha_opt"],
+                    ).to_numpy(),
+                ]
             )
         )
-        all_model_metrics.append(well_model_metrics)
+    return fit_model_to_wells(
+        richards_model,
+        richards_jacobian,
+        mtp_data,
+        p0,
+        ["A_opt", "k_opt", "t0_opt", "A0_opt"],
+        jobs=jobs,
+        cache=cache,
+        budget=budget,
+        seeds=seeds,
+        n_bootstrap=n_bootstrap,
+        n_starts=n_starts,
+        r2_threshold=r2_threshold,
+        no_growth=None if no_growth is None else no_growth[mtp_data.columns].to_numpy(),
+    )
+
+
+def add_nfev_reduction_column(
+    df: pd.DataFrame,
+    baseline_nfev: pd.Series,
+) -> pd.DataFrame:
+    """Add column with the model evaluations saved compared to baseline.
 
-    model_metrics_df = pd.DataFrame(all_model_metrics)
-    model_metrics_df.index = mtp_data.columns
-    return model_metrics_df
+    Args:
+        df: Model metrics with an "nfev" column.
+        baseline_nfev: Model evaluations spent per well when fitting
+                       from other initial guesses, NaN for wells without
+                       a baseline, which get a NaN reduction.
+    """
+    df["nfev reduction"] = baseline_nfev - df["nfev"]
+    return df
 
 
 def add_better_fit_column(
     df: pd.DataFrame,
-    other_bic: pd.Series,  # type: ignore
+    other_bic: pd.Series,
 ) -> pd.DataFrame:
     """Add column to this_model_data saying if it fits best.
 
     A lower BIC value means a better fit. So we compare the BIC value
     of df and if it is lower than the one in 'other bic' we say that
     it is a better fit, indicated with "Yes". Draws result in "Equal".
+    Wells where either model couldn't be fitted result in "Unknown".
     """
     df["Goodness of fit"] = "Yes"
     df.loc[other_bic < df["BIC"], "Goodness of fit"] = "No"
     df.loc[other_bic == df["BIC"], "Goodness of fit"] = "Equal"
+    df.loc[other_bic.isna() | df["BIC"].isna(), "Goodness of fit"] = "Unknown"
     return df
+
+
+# Model function and the metrics columns of its parameters, in order
+FITTED_MODELS: dict[str, tuple[Model, list[str]]] = {
+    "gompertz": (gompertz_model, ["N_0_opt", "N_inf_opt", "alpha_opt"]),
+    "richards": (richards_model, ["A_opt", "k_opt", "t0_opt", "A0_opt"]),
+}
+
+
+def fitted_curves(
+    metrics: pd.DataFrame,
+    t: pd.Index,
+    model: str,
+) -> pd.DataFrame:
+    """Evaluate the fitted model of every well at the timepoints t.
+
+    The parameters of all wells are broadcast against t, so the model is
+    evaluated once for the whole plate.
+
+    Args:
+        metrics: Model metrics, e.g. from gompertz_model_metrics.
+        t: Timepoints, e.g. the index of the fitted data.
+        model: One of FITTED_MODELS.
+
+    Return:
+        DataFrame with t as index and a column per row of metrics. Wells
+        that couldn't be fitted are NaN.
+    """
+    try:
+        model_function, parameter_names = FITTED_MODELS[model]
+    except KeyError:
+        raise MTPAnalyzerException(f"Unknown fitted model '{model}'")
+    parameters = metrics[parameter_names].to_numpy(dtype="float64").T
+    with np.errstate(all="ignore"):
+        curves = model_function(
+            t.to_numpy(dtype="float64"), *parameters[:, :, np.newaxis]
+        )
+    return pd.DataFrame(curves.T, index=t, columns=metrics.index)
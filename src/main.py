@@ -5,26 +5,35 @@ import logging
 import pandas as pd
 
 from analysis import (
+    GROWTH_RATE_WINDOW,
+    calculate_derived_metrics,
     calculate_growth_rates,
+    calculate_specific_growth_rates,
+    estimate_initial_parameters,
     extract_growth_parameters,
     extract_maximum_growth_rates,
-    get_replicates_average,
+    get_replicate_statistics,
+    screen_no_growth,
 )
 from cli import CLI
+from curve_fitting import FitBudget
+from data_cache import DataCache
 from exceptions import MTPAnalyzerException
+from fit_cache import FitCache
 from growth_model import (
     add_better_fit_column,
+    add_nfev_reduction_column,
+    fitted_curves,
     gompertz_model_metrics,
     richards_model_metrics,
 )
-from noise_removal import (
-    apply_loess_smoothing,
-    normalize,
-    normalize_blanked_data,
-    remove_noise,
-    separate_blanks,
+from noise_removal import preprocess_replicates, separate_blanks
+from preprocessing import (
+    load_mtp_data,
+    load_plate_layout,
+    select_wells,
+    validate_mtp_columns,
 )
-from preprocessing import load_mtp_data, load_sample_table, validate_mtp_columns
 from report import generate_report
 
 
@@ -41,41 +50,141 @@ def main() -> int:
     args = CLI.parse_args()
     setup_logging(args.verbose)
     try:
-        data = load_mtp_data(args.raw_data_path)
-        well_mapping = load_sample_table(args.sample_table_path)
-        validate_mtp_columns(mtp_data=data, well_mapping=well_mapping)
+        plate_layout = load_plate_layout(args.sample_table_path)
+        selected_wells = select_wells(plate_layout, args.wells, args.samples)
+        if selected_wells is not None:
+            plate_layout = plate_layout.select(selected_wells)
+        data = load_mtp_data(
+            args.raw_data_path,
+            cache=DataCache() if args.use_cache else None,
+            time_offset=args.time_offset,
+            time_unit=args.time_unit,
+            wells=selected_wells,
+            dtype=args.dtype,
+        )
+        validate_mtp_columns(mtp_data=data, well_mapping=plate_layout)
         logging.debug("Preprocessing completed successfully.")
 
-        data = normalize(data)
-        data = apply_loess_smoothing(data)
-        filled_wells, empty_wells = separate_blanks(data, well_mapping)
-        blanked_data = remove_noise(filled_wells, empty_wells)
-        normalized_blanked_data = normalize_blanked_data(blanked_data)
-        average_of_replicates = get_replicates_average(
-            normalized_blanked_data,
-            well_mapping,
+        replicates = preprocess_replicates(
+            data,
+            plate_layout,
+            smoothing=args.smoothing,
+            smoothing_options={
+                "window": args.smoothing_window,
+                "degree": args.smoothing_degree,
+                "alpha": args.ema_alpha,
+            },
+            nearest_blanks=args.nearest_blanks,
         )
+        average_of_replicates = replicates.mean
         logging.debug("Noise removal and normalization completed successfully.")
 
-        growth_rates = calculate_growth_rates(average_of_replicates)
-        max_growth_rates = extract_maximum_growth_rates(growth_rates)
+        if args.growth_rate_window is None:
+            growth_rates = calculate_growth_rates(average_of_replicates)
+        else:
+            growth_rates = calculate_specific_growth_rates(
+                average_of_replicates, args.growth_rate_window
+            )
+        max_growth_rates = extract_maximum_growth_rates(
+            growth_rates, k=args.top_growth_rates
+        )
         growth_parameters = extract_growth_parameters(
             max_growth_rates,
             average_of_replicates,
             lag_time_threshold=args.lag_time_threshold,
+            growth_window=tuple(args.growth_window),
         )
-        richards_metrics = richards_model_metrics(
+        fit_cache = FitCache() if args.use_cache else None
+        fit_budget = FitBudget(
+            max_nfev=args.max_nfev,
+            max_retries=args.max_retries,
+            time_limit=args.time_limit,
+        )
+        filled_wells, blank_wells = separate_blanks(data, plate_layout)
+        raw_replicates = get_replicate_statistics(filled_wells, plate_layout)
+        growth_screen = screen_no_growth(
+            raw_replicates.mean,
+            blank_wells,
+            n_replicates=raw_replicates.n.max(),
+            min_rise=args.min_rise,
+            min_slope=args.min_slope,
+            min_snr=args.min_snr,
+        )
+        no_growth = growth_screen["no_growth"]
+        initial_estimates = estimate_initial_parameters(average_of_replicates)
+        gompertz_metrics = gompertz_model_metrics(
             average_of_replicates,
             growth_parameters,
+            jobs=args.jobs,
+            cache=fit_cache,
+            budget=fit_budget,
+            initial_estimates=initial_estimates,
+            n_bootstrap=args.n_bootstrap,
+            n_starts=args.n_starts,
+            r2_threshold=args.r2_threshold,
+            no_growth=no_growth,
         )
-        gompertz_metrics = gompertz_model_metrics(
+        richards_metrics = richards_model_metrics(
             average_of_replicates,
             growth_parameters,
+            jobs=args.jobs,
+            cache=fit_cache,
+            budget=fit_budget,
+            initial_estimates=initial_estimates,
+            gompertz_metrics=gompertz_metrics,
+            n_bootstrap=args.n_bootstrap,
+            n_starts=args.n_starts,
+            r2_threshold=args.r2_threshold,
+            no_growth=no_growth,
+        )
+        if args.compare_initial_guesses:
+            # Without a maximum growth rate in the growth window, the growth
+            # parameters are no starting point, so there's nothing to compare
+            no_baseline = growth_parameters[["A", "k", "t"]].isna().any(axis=1)
+            baseline_gompertz_metrics = gompertz_model_metrics(
+                average_of_replicates,
+                growth_parameters,
+                jobs=args.jobs,
+                budget=fit_budget,
+                no_growth=no_growth | no_baseline,
+            )
+            baseline_richards_metrics = richards_model_metrics(
+                average_of_replicates,
+                growth_parameters,
+                jobs=args.jobs,
+                budget=fit_budget,
+                no_growth=no_growth | no_baseline,
+            )
+            add_nfev_reduction_column(
+                gompertz_metrics,
+                baseline_gompertz_metrics["nfev"].mask(no_baseline),
+            )
+            add_nfev_reduction_column(
+                richards_metrics,
+                baseline_richards_metrics["nfev"].mask(no_baseline),
+            )
+        if args.derived_metrics == "preprocessed":
+            curves = average_of_replicates
+        else:
+            curves = fitted_curves(
+                {"gompertz": gompertz_metrics, "richards": richards_metrics}[
+                    args.derived_metrics
+                ],
+                average_of_replicates.index,
+                args.derived_metrics,
+            )
+        growth_parameters = growth_parameters.join(growth_screen).join(
+            calculate_derived_metrics(
+                curves,
+                od_threshold=args.od_threshold,
+                window=args.growth_rate_window or GROWTH_RATE_WINDOW,
+            )
         )
         generate_report(
             average_of_replicates,
             gompertz_metrics,
             richards_metrics,
+            replicates.summary(),
         )
     except MTPAnalyzerException as e:
         logging.error(
@@ -105,6 +214,18 @@ def main() -> int:
                 writer,
                 sheet_name="Optimal Richards",
             )
+            replicates.summary().to_excel(
+                writer,
+                sheet_name="Replicate Statistics",
+            )
+            replicates.std.to_excel(
+                writer,
+                sheet_name="Replicate SD",
+            )
+            replicates.cv.to_excel(
+                writer,
+                sheet_name="Replicate CV",
+            )
     else:
         print(growth_parameters)
 
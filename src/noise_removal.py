@@ -1,22 +1,30 @@
 """Functions related to noise removal based on blank wells."""
 
 import logging
+from typing import Any
 
+import numpy as np
 import pandas as pd
 
-BLANK_LABEL = "BLK"
+from dtypes import float_dtype
+from plate_layout import PlateLayout, ReplicateStatistics, as_plate_layout
+from smoothing import CUR_WEIGHT, DEFAULT_METHOD, PREV_WEIGHT, smooth
+
+# Number of wells that preprocess_plate processes at a time
+PREPROCESS_BLOCK_SIZE = 256
 
 
 def separate_blanks(
     original_data: pd.DataFrame,
-    well_mapping: dict[str, str],
+    well_mapping: PlateLayout | dict[str, str],
 ) -> tuple[pd.DataFrame, pd.DataFrame]:
     """Split a dataframe into two, based on if well is a blank."""
-    is_filled = [well_mapping[x] != BLANK_LABEL for x in original_data.columns]
-    filled_wells = original_data.copy().loc[:, is_filled]
+    layout = as_plate_layout(well_mapping)
+    is_blank = layout.is_blank[layout.locate(original_data.columns)]
 
-    is_blank = [well_mapping[x] == BLANK_LABEL for x in original_data.columns]
-    empty_wells = original_data.copy().loc[:, is_blank]
+    # Each selection copies its columns once
+    filled_wells = original_data.iloc[:, np.flatnonzero(~is_blank)]
+    empty_wells = original_data.iloc[:, np.flatnonzero(is_blank)]
 
     return filled_wells, empty_wells
 
@@ -36,16 +44,32 @@ def normalize(data: pd.DataFrame) -> pd.DataFrame:
 
 def apply_loess_smoothing(
     data: pd.DataFrame,
-    prev_weight: float = 0.8,
-    cur_weight: float = 0.2,
+    prev_weight: float = PREV_WEIGHT,
+    cur_weight: float = CUR_WEIGHT,
 ) -> pd.DataFrame:
-    """Apply smoothing to all but first column of a dataframe."""
-    prev_data = data.shift(1)
-    data.iloc[1:, :] = (
-        cur_weight * data.iloc[1:, :] + prev_weight * prev_data.iloc[1:, :]
-    )
+    """Apply lag smoothing to all columns of a copy of a dataframe."""
+    return apply_smoothing(data, "lag", prev_weight=prev_weight, cur_weight=cur_weight)
+
+
+def apply_smoothing(
+    data: pd.DataFrame,
+    method: str = DEFAULT_METHOD,
+    **options: Any,
+) -> pd.DataFrame:
+    """Apply smoothing to all columns of a copy of a dataframe.
+
+    Args:
+        data: Data of the wells, one column per well, indexed by time.
+        method: Smoothing method, see smoothing.SMOOTHING_METHODS.
+        options: Passed on to the method, e.g. window.
+
+    Return:
+        The smoothed data.
+    """
+    t = data.index.to_numpy(dtype="float64")
+    smoothed = smooth(data.to_numpy(dtype=float_dtype(data)).T, t, method, **options)
     logging.debug("Data has been smoothed")
-    return data
+    return pd.DataFrame(smoothed.T, index=data.index, columns=data.columns)
 
 
 def remove_noise(filled_wells: pd.DataFrame, blank_wells: pd.DataFrame) -> pd.DataFrame:
@@ -83,3 +107,110 @@ def normalize_blanked_data(blanked_data: pd.DataFrame) -> pd.DataFrame:
         return (s - s.min()).replace(0.0, 0.00001)  # type: ignore
 
     return blanked_data.apply(shift_column_values_down_to_zero)
+
+
+def preprocess_plate(
+    data: pd.DataFrame,
+    well_mapping: PlateLayout | dict[str, str],
+    smoothing: str = DEFAULT_METHOD,
+    smoothing_options: dict[str, Any] | None = None,
+    nearest_blanks: int | None = None,
+    block_size: int = PREPROCESS_BLOCK_SIZE,
+) -> pd.DataFrame:
+    """Normalize, smooth and blank the data, and average replicates.
+
+    Does the same as normalize, apply_smoothing, separate_blanks,
+    remove_noise, normalize_blanked_data and get_replicates_average in
+    turn, see preprocess_replicates.
+
+    Return:
+        One column per sample, sorted by name, with the average of the
+        blanked wells of that sample.
+    """
+    return preprocess_replicates(
+        data, well_mapping, smoothing, smoothing_options, nearest_blanks, block_size
+    ).mean
+
+
+def preprocess_replicates(
+    data: pd.DataFrame,
+    well_mapping: PlateLayout | dict[str, str],
+    smoothing: str = DEFAULT_METHOD,
+    smoothing_options: dict[str, Any] | None = None,
+    nearest_blanks: int | None = None,
+    block_size: int = PREPROCESS_BLOCK_SIZE,
+) -> ReplicateStatistics:
+    """Normalize, smooth and blank the data, and aggregate replicates.
+
+    Works on a single wells x timepoints array that is modified in
+    place, a block of wells at a time.
+
+    Args:
+        data: Data of the wells, one column per well.
+        well_mapping: Layout of the plate, or mapping of well to sample.
+        smoothing: Smoothing method, see smoothing.SMOOTHING_METHODS.
+        smoothing_options: Passed on to the smoothing method.
+        nearest_blanks: Remove the noise of each well with the average
+                        of this many blank wells nearest to it, rather
+                        than of all blank wells.
+        block_size: Number of wells to process at a time.
+
+    Return:
+        Mean, spread and number of the blanked wells of each sample,
+        with the samples sorted by name.
+    """
+    layout = as_plate_layout(well_mapping)
+    positions = layout.locate(data.columns)
+    if nearest_blanks is not None and not np.array_equal(
+        positions, np.arange(len(layout.wells))
+    ):
+        # The rows of the blank weights need to match the wells in data
+        layout = layout.select(data.columns.tolist())
+        positions = np.arange(len(layout.wells))
+    is_blank = layout.is_blank[positions]
+    # A single copy of the data to work on in place, each row a well
+    values = np.array(data.to_numpy(dtype=float_dtype(data)).T, order="C")
+    t = data.index.to_numpy(dtype="float64")
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for start in range(0, len(values), block_size):
+            stop = start + block_size
+            block = values[start:stop]
+            # normalize
+            minimum = np.fmin.reduce(block, axis=1, keepdims=True)
+            value_range = np.fmax.reduce(block, axis=1, keepdims=True) - minimum
+            block -= minimum
+            block /= value_range
+            block[...] = smooth(block, t, smoothing, **(smoothing_options or {}))
+
+        # remove_noise
+        blank_values = values[is_blank]
+        if nearest_blanks is None:
+            average_noise = np.nanmean(blank_values, axis=0)
+        else:
+            blank_weights = layout.nearest_blank_weights(nearest_blanks).astype(
+                values.dtype
+            )
+
+        for start in range(0, len(values), block_size):
+            stop = start + block_size
+            block = values[start:stop]
+            if nearest_blanks is None:
+                block -= average_noise
+            else:
+                block -= blank_weights[start:stop] @ blank_values
+            # normalize_blanked_data
+            block -= np.fmin.reduce(block, axis=1, keepdims=True)
+            block[block == 0.0] = 0.00001
+
+    # Blanks are left out of the averages, like separate_blanks does
+    codes = np.where(is_blank, -1, layout.codes[positions])
+    statistics = ReplicateStatistics.from_codes(
+        values, codes, layout.samples, data.index
+    )
+    logging.debug(
+        f"Data has been normalized, smoothed ({smoothing}) and blanked "
+        f"in blocks of {block_size} wells"
+    )
+
+    return statistics
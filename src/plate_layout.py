@@ -0,0 +1,398 @@
+"""Array-backed layout of the samples on a plate.
+
+The Sample Table maps every well to a sample. Rather than looking up
+each well in a dict, the layout keeps the wells of the plate in arrays,
+along with an integer code per well for its sample, so that blanks and
+replicates can be found for all wells at once.
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+from scipy import sparse  # type: ignore
+
+from exceptions import MTPAnalyzerException
+
+BLANK_LABEL = "BLK"
+# Number of wells of a plate, and its number of rows and columns
+PLATE_FORMATS = {96: (8, 12), 384: (16, 24), 1536: (32, 48)}
+WELL_PATTERN = r"^([A-Z]+)([0-9]+)$"
+
+
+def parse_well(well: str) -> tuple[int, int]:
+    """Get the row and column number of a well like A1 or AF48."""
+    match = re.fullmatch(WELL_PATTERN, well.strip().upper())
+    if match is None:
+        raise MTPAnalyzerException(f"'{well}' is not a well, like A1 or H12")
+    row = 0
+    # Rows beyond Z are AA, AB etc., like the columns of a spreadsheet
+    for letter in match.group(1):
+        row = 26 * row + ord(letter) - ord("A") + 1
+    return row, int(match.group(2))
+
+
+@dataclass
+class PlateLayout:
+    """Samples in the wells of a 96, 384 or 1536-well plate.
+
+    Attributes:
+        wells: Name of each well, like A1, in the order of the Sample
+               Table.
+        rows: Row number of each well, starting from 1 for row A.
+        columns: Column number of each well, starting from 1.
+        samples: Sorted names of the samples on the plate.
+        codes: Index into samples of the sample in each well, -1 for
+               wells without a sample.
+        n_wells: Number of wells of the plate format.
+        is_blank: Whether each well is a blank.
+    """
+
+    wells: np.ndarray  # type: ignore
+    rows: np.ndarray  # type: ignore
+    columns: np.ndarray  # type: ignore
+    samples: np.ndarray  # type: ignore
+    codes: np.ndarray  # type: ignore
+    n_wells: int
+    is_blank: np.ndarray = field(init=False, repr=False)  # type: ignore
+    _well_index: pd.Index = field(init=False, repr=False)
+    _blank_weights: dict[int, sparse.csr_array] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        """Precompute the blank mask and lookup of wells."""
+        blank_codes = np.flatnonzero(self.samples == BLANK_LABEL)
+        self.is_blank = np.isin(self.codes, blank_codes)
+        self._well_index = pd.Index(self.wells)
+        self._blank_weights = {}
+
+    @classmethod
+    def from_labels(
+        cls,
+        wells: np.ndarray,  # type: ignore
+        labels: np.ndarray,  # type: ignore
+    ) -> "PlateLayout":
+        """Build the layout from the sample label of each well.
+
+        Args:
+            wells: Name of each well, like A1 or AF48. Like in
+                   parse_well, surrounding whitespace and lower case
+                   letters are accepted.
+            labels: Sample in each well, NaN or None if there is none.
+
+        Return:
+            The layout, in the plate format that fits all wells.
+        """
+        wells = np.char.upper(np.char.strip(np.asarray(wells, dtype="U")))
+        # Names that aren't wells get row and column 0, so they're never
+        # on the plate, and are reported when validating MTP data instead
+        coordinates = (
+            pd.Series(wells, dtype="object").str.extract(WELL_PATTERN).fillna("0")
+        )
+        # Plates have few distinct rows, so only convert those to numbers
+        letters, inverse = np.unique(
+            coordinates[0].to_numpy(dtype="U"), return_inverse=True
+        )
+        rows = np.array(
+            [0 if row == "0" else parse_well(f"{row}1")[0] for row in letters],
+            dtype="int64",
+        )[inverse]
+        columns = coordinates[1].to_numpy(dtype="int64")
+
+        n_wells = next(
+            (
+                n_wells
+                for n_wells, (n_rows, n_columns) in PLATE_FORMATS.items()
+                if rows.max(initial=0) <= n_rows and columns.max(initial=0) <= n_columns
+            ),
+            None,
+        )
+        if n_wells is None:
+            raise MTPAnalyzerException(
+                f"Sample Table doesn't fit on a plate with at most "
+                f"{max(PLATE_FORMATS)} wells"
+            )
+
+        codes, samples = pd.factorize(pd.Series(labels, dtype="object"), sort=True)
+        logging.debug(
+            f"Plate layout has {len(wells)} wells of a {n_wells}-well plate "
+            f"with {len(samples)} samples."
+        )
+        return cls(
+            wells=wells,
+            rows=rows,
+            columns=columns,
+            samples=np.asarray(samples, dtype="object"),
+            codes=codes.astype("int64"),
+            n_wells=n_wells,
+        )
+
+    @classmethod
+    def from_table(cls, table: pd.DataFrame) -> "PlateLayout":
+        """Build the layout from a Sample Table.
+
+        Args:
+            table: Sample in each well, with the row letters as index and
+                   column numbers as columns.
+
+        Return:
+            The layout, with the wells in row-major order.
+        """
+        row_letters = table.index.astype(str).to_numpy(dtype="U")
+        column_numbers = table.columns.astype(str).to_numpy(dtype="U")
+        wells = np.char.add(
+            np.repeat(row_letters, len(column_numbers)),
+            np.tile(column_numbers, len(row_letters)),
+        )
+        return cls.from_labels(wells, table.to_numpy(dtype="object").ravel())
+
+    @classmethod
+    def from_mapping(cls, well_mapping: dict[str, str]) -> "PlateLayout":
+        """Build the layout from a mapping of well to sample."""
+        return cls.from_labels(
+            np.array(list(well_mapping), dtype="U"),
+            np.array(list(well_mapping.values()), dtype="object"),
+        )
+
+    def to_mapping(self) -> dict[str, str]:
+        """Get the mapping of well to sample, like load_sample_table."""
+        # Code -1 picks the NaN at the end
+        labels = np.append(self.samples, np.nan)[self.codes]
+        return dict(zip(self.wells.tolist(), labels.tolist()))
+
+    def positions(self, wells: pd.Index | list[str]) -> np.ndarray:  # type: ignore
+        """Get the position of each of wells in the layout.
+
+        Args:
+            wells: Well names, e.g. the columns of MTP data.
+
+        Return:
+            Index into the arrays of the layout of each well, -1 for
+            wells that aren't in the layout.
+        """
+        return self._well_index.get_indexer(wells)  # type: ignore
+
+    def locate(self, wells: pd.Index | list[str]) -> np.ndarray:  # type: ignore
+        """Like positions, but raise an exception for unknown wells."""
+        positions = self.positions(wells)
+        if (positions < 0).any():
+            unknown = np.asarray(wells)[positions < 0]
+            raise MTPAnalyzerException(
+                f"Well {unknown[0]} in MTP data doesn't seem to exist in Sample Table"
+            )
+        return positions
+
+    def nearest_blank_weights(self, n_blanks: int) -> sparse.csr_array:
+        """Weights that average the blank wells nearest to each well.
+
+        Distance is measured in rows and columns on the plate. Ties are
+        broken by the order of the blanks. The weights are computed once
+        per layout and number of blanks.
+
+        Args:
+            n_blanks: Number of nearest blanks to average, at most the
+                      number of blanks on the plate.
+
+        Return:
+            Sparse matrix of shape (wells, blanks), with the blanks in
+            the order of the layout. Each row has a weight of 1 / n_blanks
+            for each of the nearest blanks of its well.
+        """
+        if n_blanks in self._blank_weights:
+            return self._blank_weights[n_blanks]
+
+        blanks = np.flatnonzero(self.is_blank)
+        if not 0 < n_blanks <= len(blanks):
+            raise MTPAnalyzerException(
+                f"Can't average the {n_blanks} nearest blanks of a well with "
+                f"{len(blanks)} blank wells in Sample Table"
+            )
+        distance = np.hypot(
+            self.rows[:, np.newaxis] - self.rows[blanks],
+            self.columns[:, np.newaxis] - self.columns[blanks],
+        )
+        nearest = np.argsort(distance, axis=1, kind="stable")[:, :n_blanks]
+        weights = sparse.csr_array(
+            (
+                np.full(nearest.size, 1 / n_blanks),
+                nearest.ravel(),
+                np.arange(0, nearest.size + 1, n_blanks),
+            ),
+            shape=(len(self.wells), len(blanks)),
+        )
+        self._blank_weights[n_blanks] = weights
+        return weights
+
+    def select(self, wells: list[str]) -> "PlateLayout":
+        """Get the layout of only some of the wells, in the given order."""
+        positions = self.locate(wells)
+        return PlateLayout(
+            wells=self.wells[positions],
+            rows=self.rows[positions],
+            columns=self.columns[positions],
+            samples=self.samples,
+            codes=self.codes[positions],
+            n_wells=self.n_wells,
+        )
+
+
+@dataclass
+class ReplicateStatistics:
+    """Spread of the replicate wells of each sample over time.
+
+    Attributes:
+        mean: Average of the wells of each sample.
+        std: Sample standard deviation of the wells of each sample.
+        n: Number of wells of each sample with a value.
+        cv: Coefficient of variation, std / mean.
+
+    Each has the timepoints as index and a column per sample.
+    """
+
+    mean: pd.DataFrame
+    std: pd.DataFrame
+    n: pd.DataFrame
+    cv: pd.DataFrame
+
+    @classmethod
+    def from_codes(
+        cls,
+        values: np.ndarray,  # type: ignore
+        codes: np.ndarray,  # type: ignore
+        samples: np.ndarray,  # type: ignore
+        index: pd.Index,
+    ) -> "ReplicateStatistics":
+        """Aggregate the wells with the same code, see aggregate_by_code.
+
+        Args:
+            values: Values, shape (wells, timepoints).
+            codes: Sample code of each well, -1 for wells to leave out.
+            samples: Sample name of each code.
+            index: Timepoints.
+
+        Return:
+            The statistics, with the samples sorted by name.
+        """
+        unique_codes, means, stds, counts = aggregate_by_code(values, codes)
+        columns = pd.Index(samples[unique_codes])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cvs = stds / means
+        return cls(
+            *(
+                pd.DataFrame(statistic.T, index=index, columns=columns)
+                for statistic in (means, stds, counts, cvs)
+            )
+        )
+
+    def summary(self) -> pd.DataFrame:
+        """Get the spread of each sample as a single row.
+
+        Return:
+            DataFrame with a row per sample and the columns:
+
+                - Replicates: Largest number of wells with a value.
+                - Median SD: Median standard deviation over time.
+                - Median CV: Median coefficient of variation over time.
+        """
+        return pd.DataFrame(
+            {
+                "Replicates": self.n.max(),
+                "Median SD": self.std.median(),
+                "Median CV": self.cv.median(),
+            }
+        )
+
+
+def as_plate_layout(layout: PlateLayout | dict[str, str]) -> PlateLayout:
+    """Get a layout from either a layout or a mapping of well to sample."""
+    if isinstance(layout, PlateLayout):
+        return layout
+    return PlateLayout.from_mapping(layout)
+
+
+def _group_sums(
+    values: np.ndarray,  # type: ignore
+    codes: np.ndarray,  # type: ignore
+) -> tuple[np.ndarray, ...]:  # type: ignore
+    """Sum the rows of values with the same code, skipping missing values.
+
+    The rows are put in order of their code, so the wells of each code
+    are consecutive and np.add.reduceat sums them in a single pass.
+
+    Return:
+        The sorted codes that occur, the included rows in order of their
+        code, the index of the first of those rows with each code, and
+        the sums and counts of the present values per code, shape
+        (codes, timepoints).
+    """
+    order = np.flatnonzero(codes >= 0)
+    order = order[np.argsort(codes[order], kind="stable")]
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.diff(sorted_codes, prepend=-1))
+    grouped = values[order]
+    present = ~np.isnan(grouped)
+    if not len(order):
+        sums = grouped
+        counts = np.zeros(grouped.shape, dtype="int64")
+    elif present.all():
+        sums = np.add.reduceat(grouped, starts, axis=0)
+        counts = np.diff(starts, append=len(order))[:, np.newaxis]
+        counts = np.broadcast_to(counts, sums.shape)
+    else:
+        sums = np.add.reduceat(np.where(present, grouped, 0), starts, axis=0)
+        counts = np.add.reduceat(present, starts, axis=0, dtype="int64")
+    return sorted_codes[starts], grouped, starts, sums, counts
+
+
+def average_by_code(
+    values: np.ndarray,  # type: ignore
+    codes: np.ndarray,  # type: ignore
+) -> tuple[np.ndarray, np.ndarray]:  # type: ignore
+    """Average the rows of values with the same code.
+
+    Missing values are skipped, like in DataFrame.mean.
+
+    Args:
+        values: Values, shape (wells, timepoints).
+        codes: Sample code of each well, -1 for wells to leave out.
+
+    Return:
+        The sorted codes that occur, and the average of the wells with
+        each of them, shape (codes, timepoints).
+    """
+    unique_codes, _, _, sums, counts = _group_sums(values, codes)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return unique_codes, sums / counts.astype(values.dtype)
+
+
+def aggregate_by_code(
+    values: np.ndarray,  # type: ignore
+    codes: np.ndarray,  # type: ignore
+) -> tuple[np.ndarray, ...]:  # type: ignore
+    """Mean, standard deviation and number of the rows with the same code.
+
+    Missing values are skipped, like in DataFrame.mean and
+    DataFrame.std. The standard deviation is the sample standard
+    deviation, NaN for fewer than two replicates.
+
+    Args:
+        values: Values, shape (wells, timepoints).
+        codes: Sample code of each well, -1 for wells to leave out.
+
+    Return:
+        The sorted codes that occur, and the mean, standard deviation
+        and number of the wells with each of them, each of shape
+        (codes, timepoints).
+    """
+    unique_codes, grouped, starts, sums, counts = _group_sums(values, codes)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts.astype(values.dtype)
+        # Deviation of each well from the mean of its code
+        grouped -= np.repeat(means, np.diff(starts, append=len(grouped)), axis=0)
+        np.square(grouped, out=grouped)
+        grouped[np.isnan(grouped)] = 0.0
+        squares = np.add.reduceat(grouped, starts, axis=0) if len(grouped) else grouped
+        stds = np.sqrt(squares / (counts - 1).astype(values.dtype))
+    stds[counts < 2] = np.nan
+    return unique_codes, means, stds, counts
@@ -1,33 +1,133 @@
 """Functions for preprocessing Excel sheets."""
 
+import codecs
+import csv
+import datetime
 import logging
+import operator
+from importlib.util import find_spec
+from typing import Any, Collection, Literal
 
+import numpy as np
 import pandas as pd
 
+from data_cache import DataCache
+from dtypes import DEFAULT_DTYPE, DTYPES
 from exceptions import MTPAnalyzerException
+from plate_layout import PlateLayout, as_plate_layout, parse_well
 
 COLUMNS_TO_REMOVE = ["T° Fluo50_k:450,530"]
+# Readers log the temperature per filter as e.g. "T° Fluo50_k:450,530"
+TEMPERATURE_PREFIX = "T°"
 TIME_COLUMN = "Time"
+TIME_OFFSET = 0.5
+TIME_UNIT = "s"
+SECONDS_PER_UNIT = {"s": 1, "min": 60, "h": 3600, "d": 86400}
+EXCEL_DAY_ZERO = pd.Timestamp(1899, 12, 31)
+DATETIME_TYPES = [datetime.datetime, pd.Timestamp]
+DELIMITERS = ",;\t"
+SNIFF_SIZE = 64 * 1024
+CSV_CHUNK_SIZE = 2048
+# Excel files are zip archives (xlsx) or OLE2 compound files (xls)
+SPREADSHEET_SIGNATURES = (b"PK\x03\x04", b"\xd0\xcf\x11\xe0")
+# Faster than openpyxl, but optional
+EXCEL_ENGINE: Literal["calamine"] | None = (
+    "calamine" if find_spec("python_calamine") else None
+)
 
 
-def start_experiment_from_zero(original_time: pd.Series) -> pd.Series:  # type: ignore
+def time_as_seconds(
+    original_time: pd.Series,
+    time_unit: str = TIME_UNIT,
+) -> np.ndarray:  # type: ignore
+    """Convert time cells of any supported kind to seconds.
+
+    Supported are numbers in time_unit, Excel time cells, timedeltas,
+    strings convertible to Timedelta (e.g. HH:MM:SS, also beyond 24
+    hours) and date times. Excel shows durations of a day or more as
+    date times counting from its day zero, which may be mixed with
+    time cells for the first day.
+
+    Args:
+        original_time: The time cells.
+        time_unit: Unit of numeric times, one of SECONDS_PER_UNIT.
+
+    Return:
+        Seconds as float64, NaN for empty cells.
+    """
+    time = pd.Series(original_time, dtype="object").reset_index(drop=True)
+    kind = pd.api.types.infer_dtype(time, skipna=True)
+    try:
+        if kind in ("integer", "floating", "mixed-integer-float", "empty"):
+            return time.to_numpy(dtype="float64") * SECONDS_PER_UNIT[time_unit]
+        if kind in ("timedelta", "timedelta64", "string"):
+            elapsed = pd.to_timedelta(time)
+        elif kind in ("datetime", "datetime64"):
+            elapsed = pd.to_datetime(time) - EXCEL_DAY_ZERO
+        else:
+            return _mixed_time_as_seconds(time.to_numpy())
+    except (ValueError, TypeError) as e:
+        raise MTPAnalyzerException(
+            f"Failed converting '{TIME_COLUMN}' column to hours: {str(e)}"
+        )
+    return elapsed.dt.total_seconds().to_numpy(dtype="float64")
+
+
+def _mixed_time_as_seconds(cells: np.ndarray) -> np.ndarray:  # type: ignore
+    """Convert time cells of different types to seconds, by type.
+
+    Excel time cells (datetime.time) are split into their fields,
+    timedeltas are converted by numpy, date times are counted from
+    Excel's day zero and anything else, e.g. text, goes to
+    pd.to_timedelta.
+    """
+    # map calls the type builtin directly, without Python code per cell
+    types = np.fromiter(map(type, cells), dtype="object", count=len(cells))
+    is_time = types == datetime.time
+    is_timedelta = types == datetime.timedelta
+    is_datetime = np.zeros(len(cells), dtype=bool)
+    for datetime_type in DATETIME_TYPES:
+        is_datetime |= types == datetime_type
+    is_other = ~(is_time | is_timedelta | is_datetime)
+
+    seconds = np.empty(len(cells), dtype="float64")
+    fields = operator.attrgetter("hour", "minute", "second", "microsecond")
+    seconds[is_time] = np.array(
+        list(map(fields, cells[is_time])), dtype="float64"
+    ).reshape(-1, 4) @ np.array([3600.0, 60.0, 1.0, 1e-6])
+    seconds[is_timedelta] = cells[is_timedelta].astype(
+        "timedelta64[us]"
+    ) / np.timedelta64(1, "s")
+    seconds[is_datetime] = (
+        pd.to_datetime(cells[is_datetime]) - EXCEL_DAY_ZERO
+    ).total_seconds()
+    seconds[is_other] = pd.to_timedelta(cells[is_other]).total_seconds()
+    return seconds
+
+
+def start_experiment_from_zero(
+    original_time: pd.Series,
+    time_offset: float = TIME_OFFSET,
+    time_unit: str = TIME_UNIT,
+) -> pd.Series:
     """Adjust timeseries so that first value start from 0.5 hours.
 
-    Takes a Series of str timestamps convertible to Timedelta and
-    shifts it so that it starts at 30 minutes. Note that format will
-    go from HH:MM:SS to just hours with one decimal.
+    Takes a Series of timestamps (see time_as_seconds) and shifts it
+    so that it starts at time_offset hours, 30 minutes by default.
+    Note that format will go from e.g. HH:MM:SS to just hours.
 
     Args:
         original_time: The Series to shift.
+        time_offset: Hours the first timestamp is shifted to.
+        time_unit: Unit of numeric timestamps.
 
     Returns:
-        Original series shifted to start at 0.5 hours (in units of
-        hours with one decimal)
+        Original series shifted to start at time_offset hours (in units
+        of hours)
     """
-    new_time = pd.to_timedelta(original_time)
-    new_time = new_time - (new_time[0] - pd.Timedelta(minutes=30))
-    new_time_str = new_time.apply(format_time_as_hours)
-    return new_time_str
+    seconds = time_as_seconds(original_time, time_unit)
+    hours = (seconds - seconds[0] + time_offset * 3600) / 3600
+    return pd.Series(hours, index=original_time.index)
 
 
 def format_time_as_hours(time: pd.Timedelta) -> float:
@@ -36,76 +136,387 @@ def format_time_as_hours(time: pd.Timedelta) -> float:
     return hours  # f"{hours:.1f}"
 
 
-def load_mtp_data(path_to_raw_data: str) -> pd.DataFrame:
-    """Read data from path and clean and format it."""
-    try:
-        data = pd.read_excel(path_to_raw_data, dtype={TIME_COLUMN: str})
-    except ValueError as e:
-        raise MTPAnalyzerException(
-            f"Error attempting to read '{path_to_raw_data}' as Excel file: {str(e)}",
+def load_mtp_data(
+    path_to_raw_data: str,
+    cache: DataCache | None = None,
+    time_offset: float = TIME_OFFSET,
+    time_unit: str = TIME_UNIT,
+    wells: list[str] | None = None,
+    dtype: str = DEFAULT_DTYPE,
+) -> pd.DataFrame:
+    """Read data from path and clean and format it.
+
+    Args:
+        path_to_raw_data: Path to the Excel file with MTP data.
+        cache: Cache to reuse the data from if the file was read
+               before. If None, the file is always read.
+        time_offset: Hours the first timestamp is shifted to.
+        time_unit: Unit of numeric timestamps, see time_as_seconds.
+        wells: Only read the columns of these wells, e.g. from
+               select_wells. None reads all wells.
+        dtype: One of DTYPES, the type of the well values. Later steps
+               keep to it, except for fitting models.
+
+    Return:
+        The MTP data as dtype, one column per well and Time (in hours,
+        float64) as index.
+    """
+    if cache is not None:
+        return cache.load(
+            path_to_raw_data,
+            parse_mtp_data,
+            time_offset=time_offset,
+            time_unit=time_unit,
+            wells=wells,
+            dtype=dtype,
         )
-    logging.debug(f"Read '{path_to_raw_data}' successfully as Excel file.")
+    return parse_mtp_data(path_to_raw_data, time_offset, time_unit, wells, dtype)
+
+
+def parse_mtp_data(
+    path_to_raw_data: str,
+    time_offset: float = TIME_OFFSET,
+    time_unit: str = TIME_UNIT,
+    wells: list[str] | None = None,
+    dtype: str = DEFAULT_DTYPE,
+) -> pd.DataFrame:
+    """Read data from path and clean and format it.
 
-    data = data.drop(columns=COLUMNS_TO_REMOVE)
-    data = data.assign(
-        # Modify the existing Time column to work in formulas
-        Time=lambda x: start_experiment_from_zero(x[TIME_COLUMN]),
+    The file may be an Excel file or delimited text (CSV or TSV), which
+    is detected from its content. Temperature columns are skipped.
+    """
+    if dtype not in DTYPES:
+        raise MTPAnalyzerException(f"Data type must be one of {DTYPES}, not {dtype}")
+    selected_wells = None if wells is None else frozenset(wells)
+    text_format = sniff_text_format(path_to_raw_data)
+    if text_format is None:
+        time, values, columns = _read_excel(path_to_raw_data, selected_wells, dtype)
+        logging.debug(f"Read '{path_to_raw_data}' successfully as Excel file.")
+    else:
+        time, values, columns = _read_delimited_text(
+            path_to_raw_data, *text_format, selected_wells, dtype
+        )
+        logging.debug(f"Read '{path_to_raw_data}' successfully as delimited text.")
+    logging.debug(f"Converted well data to {dtype}")
+
+    # Modify the existing Time column to work in formulas
+    hours = start_experiment_from_zero(
+        pd.Series(time, dtype="object"), time_offset, time_unit
     )
     logging.debug("Reformatted 'Time' column of raw data as hours.")
-    data = data.set_index(TIME_COLUMN)
-    logging.debug("Set 'Time' as index column.")
-
-    try:
-        float_data = data.astype("float64")
-    except Exception:
-        raise MTPAnalyzerException("Failed converting well data to float64")
 
-    logging.debug("Converted well data to float64")
+    float_data = pd.DataFrame(
+        values,
+        index=pd.Index(hours.to_numpy(dtype="float64"), name=TIME_COLUMN),
+        columns=pd.Index(columns, dtype="object"),
+    )
+    logging.debug("Set 'Time' as index column.")
 
     logging.debug("Preprocessing completed successfully.")
 
     return float_data
 
 
-def load_sample_table(sample_table_path: str) -> dict[str, str]:
-    """Load the sample table as DataFrame from provided path."""
+def is_well_column(column: Any, wells: Collection[str] | None = None) -> bool:
+    """Whether a column of raw data holds values of a (selected) well."""
+    return (
+        column is not None
+        and column != TIME_COLUMN
+        and column not in COLUMNS_TO_REMOVE
+        and not str(column).startswith(TEMPERATURE_PREFIX)
+        and (wells is None or str(column) in wells)
+    )
+
+
+def sniff_text_format(path: str) -> tuple[str, str] | None:
+    """Detect whether a file is delimited text, and how.
+
+    Args:
+        path: Path to the file.
+
+    Return:
+        The delimiter and encoding of the file, or None if it's not
+        delimited text, e.g. an Excel file.
+    """
+    with open(path, "rb") as file:
+        sample = file.read(SNIFF_SIZE)
+    if not sample or sample.startswith(SPREADSHEET_SIGNATURES):
+        return None
+
+    # A multi-byte character may be cut off at the end of the sample
+    encoding = "utf-8-sig"
+    try:
+        text = codecs.getincrementaldecoder(encoding)().decode(sample)
+    except UnicodeDecodeError:
+        encoding = "latin-1"
+        text = sample.decode(encoding)
+    try:
+        dialect = csv.Sniffer().sniff(text, delimiters=DELIMITERS)
+    except csv.Error:
+        return None
+    return dialect.delimiter, encoding
+
+
+def _read_excel(
+    path: str,
+    wells: Collection[str] | None,
+    dtype: str,
+) -> tuple[list[Any], np.ndarray, list[str]]:  # type: ignore
+    """Read the time cells, well values and well names of an Excel file.
+
+    Uses the calamine engine if python-calamine is installed. Otherwise
+    rows are streamed from the read-only openpyxl workbook straight
+    into an array of dtype, skipping all but the time and well columns.
+    """
     try:
-        raw_data: pd.DataFrame = pd.read_excel(sample_table_path, index_col=0, header=0)
+        excel_file = pd.ExcelFile(path, engine=EXCEL_ENGINE)
     except ValueError as e:
         raise MTPAnalyzerException(
-            f"Error attempting to read '{sample_table_path}' as Excel file: {str(e)}",
+            f"Error attempting to read '{path}' as Excel file: {str(e)}",
         )
-    logging.debug(f"Read '{sample_table_path}' successfully as Excel file.")
 
-    well_mapping: dict[str, str] = {}
-    for row_index in raw_data.index.tolist():
-        for column_index in raw_data.columns.tolist():
-            well_index = f"{row_index}{column_index}"
-            well_mapping[well_index] = raw_data.at[row_index, column_index]
+    with excel_file:
+        if excel_file.engine == "openpyxl":  # type: ignore
+            return _stream_worksheet(excel_file.book.worksheets[0], wells, dtype)
 
-    logging.debug("Generated mapping dictionary for well indices and content of wells.")
+        data = excel_file.parse(
+            0,
+            usecols=lambda column: column == TIME_COLUMN
+            or is_well_column(column, wells),
+        )
+    if TIME_COLUMN not in data:
+        raise MTPAnalyzerException(f"No '{TIME_COLUMN}' column in MTP data")
+    time = data.pop(TIME_COLUMN).tolist()
+    try:
+        values = data.to_numpy(dtype=dtype)
+    except ValueError:
+        raise MTPAnalyzerException(f"Failed converting well data to {dtype}")
+    return time, values, [str(column) for column in data.columns]
+
+
+def _read_delimited_text(
+    path: str,
+    delimiter: str,
+    encoding: str,
+    wells: Collection[str] | None,
+    dtype: str,
+) -> tuple[list[Any], np.ndarray, list[str]]:  # type: ignore
+    """Read the time cells, well values and well names of a text file.
+
+    The file is read in chunks of CSV_CHUNK_SIZE rows into an array
+    allocated for the number of lines in the file, so the text is
+    never in memory as a whole.
+
+    Args:
+        path: Path to the file.
+        delimiter: Column delimiter, see sniff_text_format.
+        encoding: Encoding of the file.
+        wells: Wells to read, None for all.
+        dtype: Type of the well values.
+
+    Return:
+        The time cells, the well values as array of dtype with a row per
+        timepoint, and the well names.
+    """
+    with open(path, "rb") as file:
+        n_lines = sum(
+            chunk.count(b"\n") for chunk in iter(lambda: file.read(SNIFF_SIZE), b"")
+        )
+
+    chunks = pd.read_csv(
+        path,
+        sep=delimiter,
+        encoding=encoding,
+        usecols=lambda column: column == TIME_COLUMN or is_well_column(column, wells),
+        chunksize=CSV_CHUNK_SIZE,
+    )
+    time: list[Any] = []
+    values: np.ndarray | None = None  # type: ignore
+    with chunks:
+        for chunk in chunks:
+            if TIME_COLUMN not in chunk:
+                raise MTPAnalyzerException(f"No '{TIME_COLUMN}' column in MTP data")
+            time_chunk = chunk.pop(TIME_COLUMN)
+            if values is None:
+                columns = [str(column) for column in chunk.columns]
+                # The header is a line too, the last line may lack a newline
+                values = np.empty((max(n_lines, 1), len(columns)), dtype=dtype)
+
+            # Like empty rows in Excel, lines without any values are skipped
+            filled = chunk.notna().any(axis=1) | time_chunk.notna()
+            chunk, time_chunk = chunk[filled], time_chunk[filled]
+            start, stop = len(time), len(time) + len(chunk)
+            time.extend(time_chunk.tolist())
+            try:
+                values[start:stop] = chunk.to_numpy(dtype=dtype)
+            except ValueError:
+                raise MTPAnalyzerException(f"Failed converting well data to {dtype}")
+
+    if values is None:
+        raise MTPAnalyzerException(f"No '{TIME_COLUMN}' column in MTP data")
+    return time, values[: len(time)], columns
+
+
+def _stream_worksheet(
+    worksheet: Any,
+    wells: Collection[str] | None,
+    dtype: str,
+) -> tuple[list[Any], np.ndarray, list[str]]:  # type: ignore
+    """Read the time cells and well values of a read-only worksheet.
+
+    Args:
+        worksheet: Read-only openpyxl worksheet with a header row.
+        wells: Wells to read, None for all.
+        dtype: Type of the well values.
+
+    Return:
+        The time cells, the well values as array of dtype with a row per
+        timepoint, and the well names.
+    """
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None or TIME_COLUMN not in header:
+        raise MTPAnalyzerException(f"No '{TIME_COLUMN}' column in MTP data")
+
+    time_index = header.index(TIME_COLUMN)
+    well_indices = [
+        i for i, column in enumerate(header) if is_well_column(column, wells)
+    ]
+    wells = [str(header[i]) for i in well_indices]
+    n_columns = len(header)
+
+    # The dimensions of the sheet are a hint at the number of rows, the
+    # array grows if they are off
+    n_rows = max((worksheet.max_row or 0) - 1, 1)
+    values = np.empty((n_rows, len(well_indices)), dtype=dtype)
+    time: list[Any] = []
+    for row in rows:
+        if all(cell is None for cell in row):
+            continue
+        if len(row) < n_columns:
+            row = row + (None,) * (n_columns - len(row))
+        if len(time) == values.shape[0]:
+            values = np.resize(values, (2 * values.shape[0], values.shape[1]))
+        try:
+            values[len(time)] = [row[i] for i in well_indices]
+        except (TypeError, ValueError):
+            raise MTPAnalyzerException(f"Failed converting well data to {dtype}")
+        time.append(row[time_index])
+
+    return time, values[: len(time)], wells
 
+
+def load_plate_layout(sample_table_path: str) -> PlateLayout:
+    """Load the sample table as PlateLayout from provided path."""
+    text_format = sniff_text_format(sample_table_path)
+    if text_format is not None:
+        delimiter, encoding = text_format
+        raw_data = pd.read_csv(
+            sample_table_path,
+            sep=delimiter,
+            encoding=encoding,
+            index_col=0,
+            header=0,
+        )
+        logging.debug(f"Read '{sample_table_path}' successfully as delimited text.")
+    else:
+        try:
+            raw_data = pd.read_excel(sample_table_path, index_col=0, header=0)
+        except ValueError as e:
+            raise MTPAnalyzerException(
+                f"Error attempting to read '{sample_table_path}' as Excel file: "
+                f"{str(e)}",
+            )
+        logging.debug(f"Read '{sample_table_path}' successfully as Excel file.")
+
+    return PlateLayout.from_table(raw_data)
+
+
+def load_sample_table(sample_table_path: str) -> dict[str, str]:
+    """Load the sample table as mapping of well to sample."""
+    well_mapping = load_plate_layout(sample_table_path).to_mapping()
+    logging.debug("Generated mapping dictionary for well indices and content of wells.")
     return well_mapping
 
 
-def validate_mtp_columns(mtp_data: pd.DataFrame, well_mapping: dict[str, str]) -> None:
+def select_wells(
+    well_mapping: PlateLayout | dict[str, str],
+    wells: list[str] | None = None,
+    samples: list[str] | None = None,
+) -> list[str] | None:
+    """Get the wells to analyze from well and sample selectors.
+
+    Blank wells are always selected, as they're needed to remove the
+    noise from the others.
+
+    Args:
+        well_mapping: Layout of the plate, or mapping of well to sample.
+        wells: Wells like A1, or ranges of wells like A1:H6 that select
+               the rectangle with those corners. Entries may also be
+               comma separated lists of those.
+        samples: Sample names, also possibly comma separated.
+
+    Return:
+        The selected wells in the order of the Sample Table, or None if
+        there are no selectors.
+    """
+    if wells is None and samples is None:
+        return None
+
+    layout = as_plate_layout(well_mapping)
+    selected = layout.is_blank.copy()
+    for selector in ",".join(wells or []).split(","):
+        if not selector.strip():
+            continue
+        first, _, last = selector.partition(":")
+        (first_row, first_column), (last_row, last_column) = (
+            parse_well(first),
+            parse_well(last or first),
+        )
+        matched = (
+            (layout.rows >= min(first_row, last_row))
+            & (layout.rows <= max(first_row, last_row))
+            & (layout.columns >= min(first_column, last_column))
+            & (layout.columns <= max(first_column, last_column))
+        )
+        if not matched.any():
+            raise MTPAnalyzerException(f"No wells in Sample Table match '{selector}'")
+        selected |= matched
+
+    for sample in ",".join(samples or []).split(","):
+        if not sample.strip():
+            continue
+        matched = np.isin(
+            layout.codes, np.flatnonzero(layout.samples == sample.strip())
+        )
+        if not matched.any():
+            raise MTPAnalyzerException(f"No sample '{sample}' in Sample Table")
+        selected |= matched
+
+    logging.debug(f"Selected {selected.sum()} of {len(selected)} wells.")
+    return layout.wells[selected].tolist()  # type: ignore
+
+
+def validate_mtp_columns(
+    mtp_data: pd.DataFrame,
+    well_mapping: PlateLayout | dict[str, str],
+) -> None:
     """Validate that the sample table matches the MTP data columns."""
-    if len(mtp_data.columns) != len(well_mapping):
+    layout = as_plate_layout(well_mapping)
+    if len(mtp_data.columns) != len(layout.wells):
         logging.warning(
             "The number of wells in the sample table doesn't match the number of "
             "columns in the MTP data"
         )
 
-    unknown_mtp_columns_exist = False
-    for well_index in mtp_data:
-        if well_index not in well_mapping.keys():
-            logging.error(
-                f"Well index {well_index} in MTP data doesn't seem to exist in Sample "
-                "Table"
-            )
-            unknown_mtp_columns_exist = True
+    unknown_mtp_columns = mtp_data.columns[layout.positions(mtp_data.columns) < 0]
+    for well_index in unknown_mtp_columns:
+        logging.error(
+            f"Well index {well_index} in MTP data doesn't seem to exist in Sample "
+            "Table"
+        )
 
-    if unknown_mtp_columns_exist:
+    if len(unknown_mtp_columns):
         raise MTPAnalyzerException(
             "At least one column in MTP data was not found in Sample Table"
         )
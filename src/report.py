@@ -10,15 +10,21 @@ from exceptions import MTPAnalyzerException
 from plotting import create_all_plots
 
 EXPORT_DIR = "exports"
+FIT_EFFORT_COLUMNS = ["Fit status", "nfev", "nfev reduction"]
 
 
 def generate_report(
     cleaned_observed_data: pd.DataFrame,
     gompertz_metrics: pd.DataFrame,
     richards_metrics: pd.DataFrame,
+    replicate_summary: pd.DataFrame | None = None,
     dest_dir: str = EXPORT_DIR,
 ) -> None:
-    """Generate a HTML report with and model fit data for samples."""
+    """Generate a HTML report with and model fit data for samples.
+
+    If given, replicate_summary (see ReplicateStatistics.summary) adds
+    the spread of the replicates of each sample.
+    """
     if not gompertz_metrics.index.equals(richards_metrics.index):
         raise MTPAnalyzerException("Misaligned dataframes")
     if not cleaned_observed_data.columns.equals(gompertz_metrics.index):
@@ -29,6 +35,12 @@ def generate_report(
     env = Environment(loader=FileSystemLoader("."))
     template = env.get_template("src/report_template.html")
 
+    fit_effort_columns = [
+        column
+        for column in FIT_EFFORT_COLUMNS
+        if column in gompertz_metrics.columns and column in richards_metrics.columns
+    ]
+
     template_data: list[dict[str, Any]] = []
     for sample_name in gompertz_metrics.index:
         gompertz_table = gompertz_metrics.loc[
@@ -39,12 +51,29 @@ def generate_report(
             [sample_name],
             ["A_opt", "k_opt", "t0_opt", "A0_opt"],
         ].to_html(index=False)
+        fit_effort_table = None
+        if fit_effort_columns:
+            fit_effort_table = (
+                pd.concat(
+                    [
+                        gompertz_metrics.loc[[sample_name], fit_effort_columns],
+                        richards_metrics.loc[[sample_name], fit_effort_columns],
+                    ]
+                )
+                .set_axis(["Gompertz", "Richards"])
+                .to_html()
+            )
+        replicates_table = None
+        if replicate_summary is not None:
+            replicates_table = replicate_summary.loc[[sample_name]].to_html(index=False)
         template_data.append(
             {
                 "name": sample_name,
                 "plot": plots[sample_name],
                 "gompertz": gompertz_table,
                 "richards": richards_table,
+                "fit_effort": fit_effort_table,
+                "replicates": replicates_table,
             }
         )
 
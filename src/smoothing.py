@@ -0,0 +1,240 @@
+"""Smoothing of the time series of all wells at once.
+
+Every method takes a wells x timepoints array and smooths each row along
+time, without looping over the wells:
+
+- lag: weighted average of each value and the value before it.
+- ema: exponential moving average, a recursive filter.
+- savgol: Savitzky-Golay, a polynomial least squares fit in a moving
+  window, which comes down to a convolution.
+- loess: locally weighted polynomial regression in a moving window.
+  The weights only depend on the timepoints, so every smoothed value is
+  a fixed linear combination of the values in its window, computed once
+  and applied to all wells.
+"""
+
+import inspect
+from typing import Any, Callable
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter, savgol_filter  # type: ignore
+
+from exceptions import MTPAnalyzerException
+
+DEFAULT_METHOD = "lag"
+PREV_WEIGHT = 0.8
+CUR_WEIGHT = 0.2
+EMA_ALPHA = 0.2
+WINDOW = 7
+DEGREE = 2
+
+
+def lag_smoothing(
+    values: np.ndarray,  # type: ignore
+    t: np.ndarray,  # type: ignore
+    prev_weight: float = PREV_WEIGHT,
+    cur_weight: float = CUR_WEIGHT,
+) -> np.ndarray:  # type: ignore
+    """Average each value with the value before it.
+
+    Args:
+        values: Values, shape (wells, timepoints).
+        t: Timepoints, unused.
+        prev_weight: Weight of the previous value.
+        cur_weight: Weight of the current value.
+
+    Return:
+        The smoothed values. The first timepoint is left as it is.
+    """
+    smoothed = values.copy()
+    smoothed[:, 1:] *= cur_weight
+    smoothed[:, 1:] += prev_weight * values[:, :-1]
+    return smoothed
+
+
+def ema_smoothing(
+    values: np.ndarray,  # type: ignore
+    t: np.ndarray,  # type: ignore
+    alpha: float = EMA_ALPHA,
+) -> np.ndarray:  # type: ignore
+    """Exponential moving average, starting from the first value.
+
+    The filter is recursive, so a missing value would make every value
+    after it missing. Missing values are therefore filled with the last
+    value before them (or the first one after them, at the start) while
+    filtering, and are missing again in the result.
+
+    Args:
+        values: Values, shape (wells, timepoints).
+        t: Timepoints, unused.
+        alpha: Weight of the current value, between 0 and 1.
+
+    Return:
+        The smoothed values, y[i] = alpha * x[i] + (1 - alpha) * y[i - 1].
+    """
+    if not 0 < alpha <= 1:
+        raise MTPAnalyzerException(f"EMA alpha must be in (0, 1], not {alpha}")
+    if values.shape[1] == 0:
+        return values.copy()
+    missing = np.isnan(values)
+    filled = values
+    if np.any(missing):
+        positions = np.where(missing, 0, np.arange(values.shape[1]))
+        positions = np.maximum(
+            np.maximum.accumulate(positions, axis=1),
+            np.argmax(~missing, axis=1)[:, np.newaxis],
+        )
+        filled = np.take_along_axis(values, positions, axis=1)
+    # The initial state makes y[0] = x[0], up to rounding
+    initial = (1 - alpha) * filled[:, :1]
+    smoothed, _ = lfilter([alpha], [1, alpha - 1], filled, axis=1, zi=initial)
+    smoothed[:, 0] = filled[:, 0]
+    smoothed[missing] = np.nan
+    return smoothed.astype(values.dtype, copy=False)  # type: ignore
+
+
+def savgol_smoothing(
+    values: np.ndarray,  # type: ignore
+    t: np.ndarray,  # type: ignore
+    window: int = WINDOW,
+    degree: int = DEGREE,
+) -> np.ndarray:  # type: ignore
+    """Savitzky-Golay filter, assuming evenly spaced timepoints.
+
+    Args:
+        values: Values, shape (wells, timepoints).
+        t: Timepoints, unused.
+        window: Number of points in the window, odd.
+        degree: Degree of the polynomial, less than window.
+
+    Return:
+        The smoothed values. At the edges, the polynomial fitted to the
+        first or last window is used.
+    """
+    _check_window(values, window, degree)
+    smoothed = savgol_filter(values, window, degree, axis=1, mode="interp")
+    return smoothed.astype(values.dtype, copy=False)  # type: ignore
+
+
+def loess_weights(
+    t: np.ndarray,  # type: ignore
+    window: int = WINDOW,
+    degree: int = DEGREE,
+) -> np.ndarray:  # type: ignore
+    """Linear combination that gives each LOESS smoothed value.
+
+    The value at t[i] is estimated by a polynomial fitted with weighted
+    least squares to the window of points nearest to it. Weights are
+    tricube in the distance to t[i], falling to zero one point beyond
+    the farthest point in the window. Windows are centered on t[i],
+    except near the edges where they're the first or last window.
+
+    Args:
+        t: Timepoints, shape (timepoints,), increasing.
+        window: Number of points in each window.
+        degree: Degree of the local polynomials.
+
+    Return:
+        The weight of each value in the window of each timepoint, shape
+        (timepoints, window).
+    """
+    t = np.asarray(t, dtype="float64")
+    n_timepoints = len(t)
+    starts = np.clip(np.arange(n_timepoints) - window // 2, 0, n_timepoints - window)
+    offsets = sliding_window_view(t, window)[starts] - t[:, np.newaxis]
+    distance = np.abs(offsets)
+    bandwidth = distance.max(axis=1, keepdims=True) * (window + 1) / (window - 1)
+    weights = (1 - (distance / bandwidth) ** 3) ** 3
+
+    # Scale the offsets so the normal equations are well-conditioned
+    scaled_offsets = offsets / bandwidth
+    design = scaled_offsets[..., np.newaxis] ** np.arange(degree + 1)
+    weighted_design = design * weights[..., np.newaxis]
+    normal_matrix = np.swapaxes(weighted_design, 1, 2) @ design
+    # The estimate at t[i] is the constant term of its polynomial
+    unit = np.zeros((n_timepoints, degree + 1, 1))
+    unit[:, 0] = 1.0
+    coefficients = np.linalg.solve(normal_matrix, unit)
+    return (weighted_design @ coefficients)[..., 0]  # type: ignore
+
+
+def loess_smoothing(
+    values: np.ndarray,  # type: ignore
+    t: np.ndarray,  # type: ignore
+    window: int = WINDOW,
+    degree: int = DEGREE,
+) -> np.ndarray:  # type: ignore
+    """Locally weighted polynomial regression, see loess_weights.
+
+    Args:
+        values: Values, shape (wells, timepoints).
+        t: Timepoints, shape (timepoints,), increasing.
+        window: Number of points in each window.
+        degree: Degree of the local polynomials.
+
+    Return:
+        The smoothed values.
+    """
+    _check_window(values, window, degree)
+    weights = loess_weights(t, window, degree).astype(values.dtype)
+    # A view of every window of every well, without copying
+    windows = sliding_window_view(values, window, axis=1)
+    n_windows = windows.shape[1]
+    first = window // 2
+    last = first + n_windows
+
+    smoothed = np.empty_like(values)
+    # Timepoints in the middle each have their own window, those near
+    # the edges share the first or last one
+    smoothed[:, first:last] = np.einsum("wtk,tk->wt", windows, weights[first:last])
+    smoothed[:, :first] = windows[:, 0] @ weights[:first].T
+    smoothed[:, last:] = windows[:, -1] @ weights[last:].T
+    return smoothed
+
+
+def _check_window(
+    values: np.ndarray,  # type: ignore
+    window: int,
+    degree: int,
+) -> None:
+    if not max(degree, 1) < window <= values.shape[1]:
+        raise MTPAnalyzerException(
+            f"Smoothing window of {window} points must be larger than the degree "
+            f"({degree}) and at most the number of timepoints ({values.shape[1]})"
+        )
+
+
+SMOOTHING_METHODS: dict[str, Callable[..., np.ndarray]] = {  # type: ignore
+    "lag": lag_smoothing,
+    "ema": ema_smoothing,
+    "savgol": savgol_smoothing,
+    "loess": loess_smoothing,
+}
+
+
+def smooth(
+    values: np.ndarray,  # type: ignore
+    t: np.ndarray,  # type: ignore
+    method: str = DEFAULT_METHOD,
+    **options: Any,
+) -> np.ndarray:  # type: ignore
+    """Smooth the values of every well along time.
+
+    Args:
+        values: Values, shape (wells, timepoints).
+        t: Timepoints, shape (timepoints,).
+        method: One of SMOOTHING_METHODS.
+        options: Passed on to the method, e.g. window or alpha. Options
+                 the method doesn't take are ignored.
+
+    Return:
+        The smoothed values, a new array like values.
+    """
+    try:
+        smoothing = SMOOTHING_METHODS[method]
+    except KeyError:
+        raise MTPAnalyzerException(f"Unknown smoothing method '{method}'")
+    parameters = inspect.signature(smoothing).parameters
+    options = {name: value for name, value in options.items() if name in parameters}
+    return smoothing(values, t, **options)
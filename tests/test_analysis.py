@@ -1,13 +1,22 @@
 """Test data analysis functions."""
 
+import numpy as np
 import pandas as pd
+import pytest
 from pandas.testing import assert_frame_equal
 
 from analysis import (
+    calculate_derived_metrics,
     calculate_growth_rates,
+    calculate_specific_growth_rates,
+    estimate_initial_parameters,
     extract_growth_parameters,
     extract_maximum_growth_rates,
+    get_replicate_statistics,
+    get_replicates_average,
+    screen_no_growth,
 )
+from exceptions import MTPAnalyzerException
 
 
 def test_calculate_growth_rate():
@@ -33,6 +42,40 @@ def test_calculate_growth_rate():
     assert_frame_equal(actual_growth_rate_data, expected_growth_rate_data)
 
 
+def test_calculate_specific_growth_rates():
+    """Test that exponential growth has a constant specific growth rate."""
+    t = np.array([0.5, 1.0, 2.0, 2.5, 3.0, 4.5])
+    mtp_data = pd.DataFrame(
+        {"A1": 0.01 * np.exp(0.3 * t), "A2": np.exp(-0.1 * t)},
+        index=pd.Index(t, name="Time"),
+        dtype="float32",
+    )
+
+    growth_rates = calculate_specific_growth_rates(mtp_data, window=3)
+
+    assert (growth_rates.dtypes == "float32").all()
+    assert growth_rates.iloc[[0, -1]].isna().all(axis=None)
+    np.testing.assert_allclose(growth_rates["A1"].iloc[1:-1], 0.3, rtol=1e-5)
+    np.testing.assert_allclose(growth_rates["A2"].iloc[1:-1], -0.1, rtol=1e-5)
+    with pytest.raises(MTPAnalyzerException):
+        calculate_specific_growth_rates(mtp_data, window=7)
+
+
+def test_calculate_specific_growth_rates_long_run():
+    """Test that slopes stay accurate for 72 hours sampled every second."""
+    t = np.arange(0.0, 72 * 3600.0) / 3600.0
+    # Exponential growth at 0.3 per hour, then a plateau
+    log_values = np.log(0.01) + 0.3 * np.minimum(t, 20.0)
+    mtp_data = pd.DataFrame({"A1": np.exp(log_values)}, index=pd.Index(t, name="Time"))
+
+    growth_rates = calculate_specific_growth_rates(mtp_data, window=5)
+
+    growing = (t > 0.01) & (t < 19.99)
+    on_plateau = (t > 20.01) & (t < 71.99)
+    np.testing.assert_allclose(growth_rates["A1"][growing], 0.3, rtol=1e-9)
+    np.testing.assert_allclose(growth_rates["A1"][on_plateau], 0.0, atol=1e-9)
+
+
 def test_extract_maximum_growth_rate():
     """Test that you really get the ten largest growth grates."""
     input_growth_rate = pd.DataFrame(
@@ -114,6 +157,29 @@ def test_extract_maximum_growth_rate():
     assert_frame_equal(actual_max_growth_rate["timestamps"], expected_timestamps)
 
 
+def test_extract_maximum_growth_rate_top_k():
+    """Test that k largest values are taken, ties in time order."""
+    input_growth_rate = pd.DataFrame(
+        {"A1": [0.1, 0.3, 0.2, 0.3, 0.0], "A2": [0.5, 0.1, 0.1, 0.1, 0.4]},
+        index=[0.0, 0.5, 1.0, 1.5, 2.0],
+    )
+
+    actual_max_growth_rate = extract_maximum_growth_rates(input_growth_rate, k=3)
+
+    expected_growth_rates = pd.DataFrame({"A1": [0.3, 0.3, 0.2], "A2": [0.5, 0.4, 0.1]})
+    expected_timestamps = pd.DataFrame({"A1": [0.5, 1.5, 1.0], "A2": [0.0, 2.0, 0.5]})
+    assert_frame_equal(actual_max_growth_rate["growth_rates"], expected_growth_rates)
+    assert_frame_equal(actual_max_growth_rate["timestamps"], expected_timestamps)
+
+
+@pytest.mark.parametrize("k", [0, -1])
+def test_extract_maximum_growth_rate_invalid_k(k):
+    """Test that fewer than one largest value is rejected."""
+    input_growth_rate = pd.DataFrame({"A1": [0.1, 0.3]}, index=[0.0, 0.5])
+    with pytest.raises(MTPAnalyzerException):
+        extract_maximum_growth_rates(input_growth_rate, k=k)
+
+
 def test_get_growth_parameters():
     """Test that you get the expected growth parameters from good input."""
     input_growth_rates = {
@@ -154,3 +220,172 @@ def test_get_growth_parameters():
     )
 
     assert_frame_equal(actual_growth_parameters, expected_growth_parameters)
+
+
+def test_get_growth_parameters_with_growth_window():
+    """Test that the maximum growth rate is looked for in the window."""
+    input_growth_rates = {
+        "growth_rates": pd.DataFrame(
+            {"A1": [9.0, 4.0, 3.0, 1.0], "A2": [3.0, 5.0, 6.0, np.nan]}
+        ),
+        "timestamps": pd.DataFrame(
+            {"A1": [40.0, 50.0, 30.0, 10.0], "A2": [13.0, 82.0, 23.0, np.nan]}
+        ),
+    }
+    input_blank_data = pd.DataFrame({"A1": [1.0, 2.0], "A2": [3.0, 4.0]})
+
+    actual_growth_parameters = extract_growth_parameters(
+        input_growth_rates,
+        input_blank_data,
+        lag_time_threshold=30,
+        growth_window=(30, 50),
+    )
+
+    expected_growth_parameters = pd.DataFrame(
+        {
+            "L": [40.0, 82.0],
+            "k": [9.0, np.nan],
+            "t": [40.0, np.nan],
+            "A": [2.0, 4.0],
+        },
+        index=["A1", "A2"],
+    )
+    assert_frame_equal(actual_growth_parameters, expected_growth_parameters)
+    with pytest.raises(MTPAnalyzerException):
+        extract_growth_parameters(
+            input_growth_rates, input_blank_data, 15, growth_window=(48, 20)
+        )
+
+
+def test_estimate_initial_parameters():
+    """Test growth rate and plateau estimates on a logistic curve."""
+    t = np.arange(0.5, 48.5, 0.5)
+    input_data = pd.DataFrame(
+        {
+            "A1": 1.5 / (1 + 99 * np.exp(-0.5 * t)),
+            "A2": 0.8 / (1 + 39 * np.exp(-0.3 * t)),
+        },
+        index=t,
+    )
+
+    actual_estimates = estimate_initial_parameters(input_data)
+
+    assert list(actual_estimates.index) == ["A1", "A2"]
+    assert actual_estimates.at["A1", "N_0"] == input_data.iat[0, 0]
+    assert actual_estimates.at["A1", "A"] == pytest.approx(1.5, rel=0.01)
+    assert actual_estimates.at["A2", "A"] == pytest.approx(0.8, rel=0.01)
+    # Early on, the logistic curve grows exponentially at its rate
+    assert actual_estimates.at["A1", "mu"] == pytest.approx(0.5, rel=0.1)
+    assert actual_estimates.at["A2", "mu"] == pytest.approx(0.3, rel=0.1)
+    assert actual_estimates.at["A1", "t_mu"] < 5.0
+
+
+def test_get_replicates_average():
+    """Test that wells of a sample are averaged, skipping missing values."""
+    data = pd.DataFrame(
+        {
+            "A1": [1.0, 2.0],
+            "A2": [3.0, np.nan],
+            "A3": [5.0, 6.0],
+            "B1": [7.0, 8.0],
+        },
+        index=pd.Index([0.5, 1.0], name="Time"),
+    )
+    well_mapping = {"A1": "WT", "A2": "WT", "A3": "SPL1", "B1": "BLK"}
+    expected_data = pd.DataFrame(
+        {"SPL1": [5.0, 6.0], "WT": [2.0, 2.0]},
+        index=pd.Index([0.5, 1.0], name="Time"),
+    )
+
+    actual_data = get_replicates_average(data[["A1", "A2", "A3"]], well_mapping)
+
+    assert_frame_equal(actual_data, expected_data)
+
+
+def test_get_replicate_statistics():
+    """Test that replicate spread matches a groupby on sample names."""
+    data = pd.DataFrame(
+        {
+            "A1": [1.0, 2.0, 4.0],
+            "A2": [3.0, np.nan, 5.0],
+            "A3": [5.0, 6.0, 7.0],
+            "A4": [2.0, 2.5, 3.0],
+        },
+        index=pd.Index([0.5, 1.0, 1.5], name="Time"),
+    )
+    well_mapping = {"A1": "WT", "A2": "WT", "A3": "SPL1", "A4": "WT"}
+    groups = data.T.groupby(well_mapping)
+
+    statistics = get_replicate_statistics(data, well_mapping)
+
+    assert_frame_equal(statistics.mean, groups.mean().T)
+    assert_frame_equal(statistics.std, groups.std().T)
+    assert_frame_equal(statistics.n, groups.count().T, check_dtype=False)
+    assert_frame_equal(statistics.cv, groups.std().T / groups.mean().T)
+
+
+def test_calculate_derived_metrics():
+    """Test the metrics of exponential growth after a lag and a flat well."""
+    t = np.linspace(0.0, 10.0, 201)
+    data = pd.DataFrame(
+        {
+            "A1": 0.1 * np.exp(0.5 * np.maximum(t - 4.0, 0.0)),
+            "A2": np.full_like(t, 0.1),
+        },
+        index=pd.Index(t, name="Time"),
+    )
+
+    actual_metrics = calculate_derived_metrics(data, od_threshold=0.5, window=3)
+
+    assert list(actual_metrics.index) == ["A1", "A2"]
+    assert actual_metrics.at["A1", "lag_time"] == pytest.approx(4.0, abs=0.05)
+    assert actual_metrics.at["A1", "doubling_time"] == pytest.approx(np.log(2) / 0.5)
+    assert actual_metrics.at["A1", "time_to_threshold"] == pytest.approx(
+        4.0 + np.log(5) / 0.5, abs=1e-3
+    )
+    assert actual_metrics.at["A1", "AUC"] == pytest.approx(
+        0.4 + 0.2 * (np.exp(3.0) - 1), rel=1e-3
+    )
+    assert np.isnan(actual_metrics.at["A2", "lag_time"])
+    assert np.isnan(actual_metrics.at["A2", "doubling_time"])
+    assert np.isnan(actual_metrics.at["A2", "time_to_threshold"])
+    assert actual_metrics.at["A2", "AUC"] == pytest.approx(1.0)
+
+
+def test_screen_no_growth():
+    """Test that flat wells are screened out, relative to the blanks."""
+    t = np.arange(0.0, 24.0, 0.5)
+    noise = np.random.default_rng(0).normal(0.0, 0.005, size=(4, len(t)))
+    # The blanks drift up a little, which isn't noise
+    blank_data = pd.DataFrame(
+        (0.05 + 0.001 * t + noise[:2]).T,
+        index=pd.Index(t, name="Time"),
+        columns=["D8", "E8"],
+    )
+    data = pd.DataFrame(
+        {
+            "WT": 0.05 + 0.001 * t + 1.0 / (1 + np.exp(-(t - 12.0))) + noise[2],
+            "SPL1": 0.05 + 0.001 * t + noise[3],
+        },
+        index=pd.Index(t, name="Time"),
+    )
+
+    screen = screen_no_growth(data, blank_data)
+
+    assert screen["no_growth"].tolist() == [False, True]
+    assert screen.at["WT", "rise"] == pytest.approx(1.0, abs=0.05)
+    assert screen.at["WT", "SNR"] > 100
+    assert screen.at["SPL1", "SNR"] < 5
+    assert screen_no_growth(data, blank_data, min_snr=0.0)["no_growth"].tolist() == [
+        False,
+        False,
+    ]
+    assert screen_no_growth(data, blank_data, min_rise=2.0)["no_growth"].all()
+    # Averages of more replicates are less noisy
+    averaged_screen = screen_no_growth(
+        data, blank_data, n_replicates=pd.Series({"WT": 4, "SPL1": 4})
+    )
+    assert averaged_screen.at["WT", "SNR"] == pytest.approx(
+        screen.at["WT", "SNR"] * np.sqrt(1.5 / 0.75)
+    )
+    assert screen_no_growth(data, blank_data, min_slope=1.0)["no_growth"].all()
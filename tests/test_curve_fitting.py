@@ -0,0 +1,253 @@
+"""Tests for batched curve fitting."""
+
+import time
+
+import numpy as np
+from scipy.optimize import curve_fit  # type: ignore
+
+from curve_fitting import (
+    FIT_CONVERGED,
+    FIT_FAILED,
+    FIT_MAX_NFEV,
+    FIT_TIME_LIMIT,
+    bootstrap_confidence_intervals,
+    evaluate_model,
+    fit_batch,
+    fit_batch_parallel,
+    multi_start_fit,
+    parameter_standard_errors,
+    select_initial_guess,
+)
+
+
+def logistic_model(t, A, k, t0):
+    """Logistic curve used as a well-behaved test model."""
+    return A / (1 + np.exp(-k * (t - t0)))
+
+
+def logistic_jacobian(t, A, k, t0):
+    """Partial derivatives of logistic_model."""
+    fraction = 1 / (1 + np.exp(-k * (t - t0)))
+    d_fraction = A * fraction * (1 - fraction)
+    return np.stack(
+        np.broadcast_arrays(fraction, d_fraction * (t - t0), -d_fraction * k),
+        axis=-1,
+    )
+
+
+def test_evaluate_model():
+    """Test that each row of parameters gives one row of predictions."""
+    t = np.array([0.0, 1.0, 2.0])
+    params = np.array([[1.0, 1.0, 0.0], [2.0, 1.0, 0.0]])
+    prediction = evaluate_model(logistic_model, t, params)
+    assert prediction.shape == (2, 3)
+    np.testing.assert_allclose(prediction[1], 2 * prediction[0])
+
+
+def test_select_initial_guess():
+    """Test that the candidate closest to each well's data is picked."""
+    t = np.linspace(0.0, 10.0, 20)
+    true_params = np.array([[1.0, 1.0, 5.0], [2.0, 1.0, 5.0]])
+    observed = evaluate_model(logistic_model, t, true_params)
+    candidates = [
+        np.array([[1.1, 1.0, 5.0], [np.nan, np.nan, np.nan]]),
+        np.array([[3.0, 1.0, 5.0], [2.1, 1.0, 5.0]]),
+    ]
+    actual_guess = select_initial_guess(logistic_model, t, observed, candidates)
+    np.testing.assert_array_equal(actual_guess, [[1.1, 1.0, 5.0], [2.1, 1.0, 5.0]])
+
+
+def test_fit_batch_matches_individual_fits():
+    """Test that fitting all wells at once gives per-well optimum."""
+    t = np.linspace(0.0, 10.0, 40)
+    true_params = np.array([[1.0, 1.5, 4.0], [2.5, 0.8, 6.0], [0.7, 2.0, 3.0]])
+    rng = np.random.default_rng(0)
+    observed = evaluate_model(logistic_model, t, true_params)
+    observed += rng.normal(scale=0.01, size=observed.shape)
+    p0 = np.array([[1.0, 1.0, 5.0]] * 3)
+
+    result = fit_batch(logistic_model, t, observed, p0)
+
+    assert result.converged.all()
+    for well, N_data in enumerate(observed):
+        expected, _ = curve_fit(logistic_model, t, N_data, p0=p0[well])
+        np.testing.assert_allclose(result.params[well], expected, rtol=1e-4)
+
+
+def test_fit_batch_respects_bounds():
+    """Test that parameters never leave the provided bounds."""
+    t = np.linspace(0.0, 10.0, 20)
+    observed = evaluate_model(logistic_model, t, np.array([[1.0, 1.0, 5.0]]))
+    result = fit_batch(
+        logistic_model,
+        t,
+        observed,
+        np.array([[0.5, 0.5, 2.0]]),
+        bounds=([0.0, 0.0, 0.0], [0.8, np.inf, np.inf]),
+    )
+    assert result.params[0, 0] <= 0.8
+
+
+def test_fit_batch_stops_at_max_nfev():
+    """Test that wells without convergence are reported as such."""
+    t = np.linspace(0.0, 10.0, 20)
+    observed = evaluate_model(logistic_model, t, np.array([[1.0, 1.0, 5.0]]))
+    result = fit_batch(
+        logistic_model,
+        t,
+        observed,
+        np.array([[5.0, 0.1, 1.0]]),
+        max_nfev=5,
+        max_retries=0,
+    )
+    assert result.status[0] == FIT_MAX_NFEV
+    assert not result.converged[0]
+    assert result.nfev[0] <= 5 + 4
+
+
+def test_fit_batch_retries_with_escalated_budget():
+    """Test that a retry gives the well a larger evaluation budget."""
+    t = np.linspace(0.0, 10.0, 20)
+    observed = evaluate_model(logistic_model, t, np.array([[1.0, 1.0, 5.0]]))
+    p0 = np.array([[5.0, 0.1, 1.0]])
+
+    without_retry = fit_batch(logistic_model, t, observed, p0, max_nfev=5)
+    with_retry = fit_batch(logistic_model, t, observed, p0, max_nfev=5, max_retries=10)
+
+    assert with_retry.nfev[0] > without_retry.nfev[0]
+    assert with_retry.status[0] == FIT_CONVERGED
+
+
+def test_fit_batch_time_limit():
+    """Test that wells are given up once out of time."""
+    t = np.linspace(0.0, 10.0, 20)
+    observed = evaluate_model(logistic_model, t, np.array([[1.0, 1.0, 5.0]]))
+    result = fit_batch(
+        logistic_model, t, observed, np.array([[5.0, 0.1, 1.0]]), time_limit=0.0
+    )
+    assert result.status[0] == FIT_TIME_LIMIT
+
+
+def test_fit_batch_time_limit_per_well():
+    """Test that the time limit of a well doesn't grow with the batch."""
+
+    def slow_model(t, A, k, t0):
+        time.sleep(0.01)
+        return logistic_model(t, A, k, t0)
+
+    t = np.linspace(0.0, 10.0, 20)
+    observed = evaluate_model(logistic_model, t, np.array([[1.0, 1.0, 5.0]] * 8))
+    start = time.perf_counter()
+    result = fit_batch(
+        slow_model,
+        t,
+        observed,
+        np.array([[5.0, 0.1, 1.0]] * 8),
+        max_nfev=10**6,
+        time_limit=0.2,
+    )
+    # One iteration evaluates the model four times
+    assert time.perf_counter() - start < 0.2 + 2 * 4 * 0.01 + 0.1
+    np.testing.assert_array_equal(result.status, FIT_TIME_LIMIT)
+
+
+def test_fit_batch_failed_well_does_not_affect_others():
+    """Test that a well that can't be evaluated is flagged as failed."""
+    t = np.linspace(0.0, 10.0, 20)
+    observed = evaluate_model(logistic_model, t, np.array([[1.0, 1.0, 5.0]] * 2))
+    observed[1, 3] = np.nan
+    result = fit_batch(logistic_model, t, observed, np.array([[1.0, 1.0, 4.0]] * 2))
+    np.testing.assert_array_equal(result.status, [FIT_CONVERGED, FIT_FAILED])
+    np.testing.assert_allclose(result.params[0], [1.0, 1.0, 5.0], rtol=1e-6)
+
+
+def test_fit_batch_parallel_matches_serial():
+    """Test that wells fitted in worker processes come back in order."""
+    t = np.linspace(0.0, 10.0, 30)
+    true_params = np.column_stack(
+        [np.linspace(0.5, 2.5, 7), np.full(7, 1.2), np.linspace(3.0, 7.0, 7)]
+    )
+    observed = evaluate_model(logistic_model, t, true_params)
+    p0 = np.array([[1.0, 1.0, 5.0]] * 7)
+
+    serial = fit_batch(logistic_model, t, observed, p0)
+    parallel = fit_batch_parallel(logistic_model, t, observed, p0, jobs=2)
+
+    np.testing.assert_array_equal(parallel.params, serial.params)
+    np.testing.assert_array_equal(parallel.nfev, serial.nfev)
+    np.testing.assert_allclose(parallel.params, true_params, rtol=1e-6)
+
+
+def test_parameter_standard_errors_match_curve_fit():
+    """Test that standard errors follow from the curve_fit covariance."""
+    t = np.linspace(0.0, 10.0, 40)
+    rng = np.random.default_rng(0)
+    observed = logistic_model(t, 1.5, 1.2, 5.0) + rng.normal(scale=0.02, size=40)
+    expected_params, expected_cov = curve_fit(
+        logistic_model, t, observed, p0=[1.0, 1.0, 4.0]
+    )
+    sse = np.sum((logistic_model(t, *expected_params) - observed) ** 2)
+
+    actual_se = parameter_standard_errors(
+        logistic_jacobian, t, expected_params[None], np.array([sse])
+    )
+
+    np.testing.assert_allclose(actual_se[0], np.sqrt(np.diag(expected_cov)), rtol=1e-4)
+
+
+def test_parameter_standard_errors_nan_when_not_identifiable():
+    """Test that parameters the data can't determine get no error."""
+    t = np.linspace(0.0, 10.0, 40)
+    params = np.array([[1.5, 1.2, 5.0], [1.5, 0.0, 5.0], [np.nan] * 3])
+
+    actual_se = parameter_standard_errors(
+        logistic_jacobian, t, params, np.array([0.1, 0.1, np.nan])
+    )
+
+    assert np.isfinite(actual_se[0]).all()
+    # Without growth, the midpoint can be anywhere
+    assert np.isnan(actual_se[1, 2])
+    assert np.isnan(actual_se[2]).all()
+
+
+def test_bootstrap_confidence_intervals():
+    """Test that intervals contain the truth and are reproducible."""
+    t = np.linspace(0.0, 10.0, 40)
+    true_params = np.array([[1.5, 1.2, 5.0], [0.8, 2.0, 4.0]])
+    rng = np.random.default_rng(0)
+    observed = evaluate_model(logistic_model, t, true_params)
+    observed += rng.normal(scale=0.02, size=observed.shape)
+    params = fit_batch(logistic_model, t, observed, true_params).params
+
+    lower, upper = bootstrap_confidence_intervals(
+        logistic_model, t, observed, params, 100, jac=logistic_jacobian
+    )
+    parallel_lower, parallel_upper = bootstrap_confidence_intervals(
+        logistic_model, t, observed, params, 100, jobs=2, jac=logistic_jacobian
+    )
+
+    assert np.all((lower < params) & (params < upper))
+    assert np.all((lower < true_params) & (true_params < upper))
+    np.testing.assert_array_equal(parallel_lower, lower)
+    np.testing.assert_array_equal(parallel_upper, upper)
+
+
+def test_multi_start_fit_escapes_local_minimum():
+    """Test that only the poorly fitted well is refitted, until solved."""
+
+    def sine_model(t, A, w):
+        return A * np.sin(w * t)
+
+    t = np.linspace(0.0, 10.0, 60)
+    observed = evaluate_model(sine_model, t, np.array([[1.0, 2.0]] * 2))
+    p0 = np.array([[1.0, 1.9], [1.0, 1.5]])
+    first = fit_batch(sine_model, t, observed, p0)
+    assert first.sse[1] > 1.0
+
+    result = multi_start_fit(sine_model, t, observed, p0, first, 16, np.full(2, 1e-8))
+    exhaustive = multi_start_fit(sine_model, t, observed, p0, first, 16, np.zeros(2))
+
+    np.testing.assert_allclose(result.params, [[1.0, 2.0]] * 2, rtol=1e-6)
+    assert result.nfev[0] == first.nfev[0]
+    # Stopped once the well was solved instead of trying all starts
+    assert result.nfev[1] < exhaustive.nfev[1]
@@ -0,0 +1,71 @@
+"""Tests for the on-disk parsed data cache."""
+
+import os
+import tempfile
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from data_cache import DataCache
+from preprocessing import load_mtp_data, parse_mtp_data
+
+RAW_DATA_PATH = "tests/example_data/Raw data.xlsx"
+
+
+def test_make_key_depends_on_content_mtime_and_options():
+    """Test that the key changes with the file and parse options."""
+    with tempfile.TemporaryDirectory() as tempdir:
+        cache = DataCache(os.path.join(tempdir, "cache"))
+        path = os.path.join(tempdir, "data.csv")
+        with open(path, "w") as file:
+            file.write("Time,A1\n00:00:00,0.1\n")
+        os.utime(path, ns=(0, 0))
+
+        key = cache.make_key(path, {})
+
+        assert key == cache.make_key(path, {})
+        assert key != cache.make_key(path, {"offset": 0.5})
+        os.utime(path, ns=(1, 1))
+        assert key != cache.make_key(path, {})
+        with open(path, "w") as file:
+            file.write("Time,A1\n00:00:00,0.2\n")
+        os.utime(path, ns=(0, 0))
+        assert key != cache.make_key(path, {})
+
+
+def test_get_and_put():
+    """Test that stored data is returned as writable float64 frame."""
+    data = pd.DataFrame(
+        {"A1": [0.1, 0.2], "A2": [0.3, 0.4]},
+        index=pd.Index([0.5, 1.0], name="Time"),
+    )
+    with tempfile.TemporaryDirectory() as tempdir:
+        cache = DataCache(tempdir)
+        assert cache.get("abc") is None
+        cache.put("abc", data)
+
+        cached_data = cache.get("abc")
+
+        assert cached_data is not None
+        assert_frame_equal(cached_data, data)
+        cached_data.iloc[0, 0] = 1.0
+        assert_frame_equal(cache.get("abc"), data)
+
+
+def test_load_parses_only_on_miss():
+    """Test that loading the same file again comes from the cache."""
+    with tempfile.TemporaryDirectory() as tempdir:
+        cache = DataCache(tempdir)
+        expected_data = load_mtp_data(RAW_DATA_PATH)
+
+        first_data = cache.load(RAW_DATA_PATH, parse_mtp_data, time_offset=0.5)
+        n_entries = len(os.listdir(tempdir))
+
+        def fail_to_parse(path: str, **options: float) -> pd.DataFrame:
+            raise AssertionError("Cached data was parsed again")
+
+        second_data = cache.load(RAW_DATA_PATH, fail_to_parse, time_offset=0.5)
+
+        assert_frame_equal(first_data, expected_data)
+        assert_frame_equal(second_data, expected_data)
+        assert len(os.listdir(tempdir)) == n_entries
@@ -0,0 +1,131 @@
+"""Tests for the on-disk fit result cache."""
+
+import os
+import tempfile
+import types
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from fit_cache import FitCache
+from growth_model import (
+    gompertz_jacobian,
+    gompertz_model,
+    gompertz_model_metrics,
+    richards_model,
+)
+
+
+def test_make_key_depends_on_inputs():
+    """Test that any change of the fit inputs changes the key."""
+    t = np.array([0.5, 1.0, 1.5])
+    observed = np.array([0.1, 0.2, 0.4])
+    p0 = np.array([0.1, 1.0, 0.5])
+    bounds = ([0.0, 0.0, 0.0], [np.inf, np.inf, np.inf])
+
+    key = FitCache.make_key(gompertz_model, t, observed, p0, bounds)
+
+    assert key == FitCache.make_key(gompertz_model, t, observed.copy(), p0, bounds)
+    assert key != FitCache.make_key(richards_model, t, observed, p0, bounds)
+    assert key != FitCache.make_key(gompertz_model, t + 0.5, observed, p0, bounds)
+    assert key != FitCache.make_key(gompertz_model, t, observed * 2, p0, bounds)
+    assert key != FitCache.make_key(gompertz_model, t, observed, p0 * 2, bounds)
+    assert key != FitCache.make_key(gompertz_model, t, observed, p0, None)
+    assert key != FitCache.make_key(
+        gompertz_model, t, observed, p0, bounds, {"max_nfev": 100}
+    )
+    # A function option is the same in every run, wherever it's loaded
+    jacobian = types.FunctionType(
+        gompertz_jacobian.__code__, gompertz_jacobian.__globals__
+    )
+    assert FitCache.make_key(
+        gompertz_model, t, observed, p0, bounds, {"jac": gompertz_jacobian}
+    ) == FitCache.make_key(gompertz_model, t, observed, p0, bounds, {"jac": jacobian})
+
+
+def test_fit_batch_keys_on_selected_start():
+    """Test that a seed that changes where a well starts misses the cache."""
+    t = np.linspace(0.5, 10.0, 20)
+    observed = gompertz_model(t, 0.1, 1.5, 0.5)[np.newaxis, :]
+    p0 = np.array([[0.1, 1.0, 0.1]])
+    with tempfile.TemporaryDirectory() as tempdir:
+        cache = FitCache(tempdir)
+        cache.fit_batch(gompertz_model, t, observed, p0)
+        n_entries = len(os.listdir(tempdir))
+
+        cache.fit_batch(gompertz_model, t, observed, p0)
+        assert len(os.listdir(tempdir)) == n_entries
+
+        # The seed is closer to the data, so the well starts from it
+        seed = np.array([[0.1, 1.5, 0.5]])
+        cache.fit_batch(gompertz_model, t, observed, p0, seeds=[seed])
+        assert len(os.listdir(tempdir)) == n_entries + 1
+
+        cache.fit_batch(gompertz_model, t, observed, p0, max_nfev=50)
+        assert len(os.listdir(tempdir)) == n_entries + 2
+
+
+def test_get_and_put():
+    """Test that stored values are returned for the same key only."""
+    with tempfile.TemporaryDirectory() as tempdir:
+        cache = FitCache(tempdir)
+        assert cache.get("abc") is None
+        cache.put("abc", np.array([1.0, 2.0]))
+        np.testing.assert_array_equal(cache.get("abc"), [1.0, 2.0])
+        assert cache.get("def") is None
+
+
+def test_evict_least_recently_used():
+    """Test that the least recently used entries are evicted first."""
+    with tempfile.TemporaryDirectory() as tempdir:
+        cache = FitCache(tempdir)
+        for age, key in enumerate(["old", "used", "new"]):
+            cache.put(key, np.zeros(10))
+            os.utime(os.path.join(tempdir, f"{key}.npy"), (age, age))
+        cache.get("used")
+        entry_size = os.path.getsize(os.path.join(tempdir, "old.npy"))
+
+        cache.max_size = 2 * entry_size
+        cache.evict()
+
+        assert cache.get("old") is None
+        assert cache.get("used") is not None
+        assert cache.get("new") is not None
+
+
+def test_cached_metrics_equal_fitted_metrics():
+    """Test that a repeated run gets the same metrics from the cache."""
+    t = np.linspace(0.5, 10.0, 20)
+    input_mtp = pd.DataFrame(
+        {
+            "A1": gompertz_model(t, 0.1, 1.5, 0.5),
+            "A2": gompertz_model(t, 0.1, 0.8, 0.9),
+        },
+        index=t,
+    )
+    input_growth_param = pd.DataFrame(
+        {"L": [2.0, 2.0], "k": [1.0, 1.0], "t": [2.0, 2.0], "A": [1.0, 1.0]},
+        index=["A1", "A2"],
+    )
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        cache = FitCache(tempdir)
+        fitted = gompertz_model_metrics(input_mtp, input_growth_param, cache=cache)
+        # A result and a seed for the next run per well
+        assert len(os.listdir(tempdir)) == 4
+        seeds = cache.get_seeds(gompertz_model, ["A1", "A2", "A3"], 3)
+        np.testing.assert_array_equal(
+            seeds[:2], fitted[["N_0_opt", "N_inf_opt", "alpha_opt"]].to_numpy()
+        )
+        assert np.isnan(seeds[2]).all()
+        # The wells now start from their seeds, which is a different fit
+        seeded = gompertz_model_metrics(input_mtp, input_growth_param, cache=cache)
+        assert len(os.listdir(tempdir)) == 6
+        cached = gompertz_model_metrics(input_mtp, input_growth_param, cache=cache)
+        assert len(os.listdir(tempdir)) == 6
+
+    assert_frame_equal(cached, seeded)
+    assert_frame_equal(fitted, gompertz_model_metrics(input_mtp, input_growth_param))
+    params = ["N_0_opt", "N_inf_opt", "alpha_opt"]
+    assert_frame_equal(seeded[params], fitted[params], rtol=1e-6)
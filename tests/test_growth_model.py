@@ -1,17 +1,48 @@
 """Tests for growth model fitting."""
 
+import numpy as np
 import pandas as pd
+import pytest
 from pandas.testing import assert_frame_equal, assert_series_equal
 
+import growth_model
+from analysis import (
+    calculate_growth_rates,
+    estimate_initial_parameters,
+    extract_growth_parameters,
+    extract_maximum_growth_rates,
+)
+from exceptions import MTPAnalyzerException
 from growth_model import (
+    NO_GROWTH_STATUS,
     add_better_fit_column,
+    add_nfev_reduction_column,
     calculate_BIC,
+    fit_model_to_wells,
+    fitted_curves,
+    get_batch_performance_metrics,
     get_performance_metrics,
+    gompertz_jacobian,
     gompertz_model,
     gompertz_model_metrics,
+    richards_jacobian,
     richards_model,
     richards_model_metrics,
 )
+from noise_removal import preprocess_plate
+from preprocessing import load_mtp_data, load_plate_layout
+
+
+def numerical_jacobian(model, t, params, step=1e-6):
+    """Approximate partial derivatives with central differences."""
+    derivatives = []
+    for i in range(len(params)):
+        upper = list(params)
+        lower = list(params)
+        upper[i] += step
+        lower[i] -= step
+        derivatives.append((model(t, *upper) - model(t, *lower)) / (2 * step))
+    return np.stack(derivatives, axis=-1)
 
 
 def test_richards_model():
@@ -39,6 +70,34 @@ def test_gompertz_model():
     assert_series_equal(actual_population, expected_population)
 
 
+def test_gompertz_jacobian():
+    """Test analytic Gompertz derivatives against numerical ones."""
+    t = np.linspace(0.5, 48.0, 20)
+    params = [0.05, 1.3, 0.12]
+    actual_jacobian = gompertz_jacobian(t, *params)
+    assert actual_jacobian.shape == (20, 3)
+    np.testing.assert_allclose(
+        actual_jacobian,
+        numerical_jacobian(gompertz_model, t, params),
+        rtol=1e-5,
+        atol=1e-8,
+    )
+
+
+def test_richards_jacobian():
+    """Test analytic Richards derivatives against numerical ones."""
+    t = np.linspace(0.5, 48.0, 20)
+    params = [1.4, 0.3, 20.0, 0.05]
+    actual_jacobian = richards_jacobian(t, *params)
+    assert actual_jacobian.shape == (20, 4)
+    np.testing.assert_allclose(
+        actual_jacobian,
+        numerical_jacobian(richards_model, t, params),
+        rtol=1e-5,
+        atol=1e-8,
+    )
+
+
 def test_calculate_BIC():
     """Test that the BIC formula function gives the correct value."""
     input_n = 2.5
@@ -54,20 +113,36 @@ def test_get_performance_metrics():
     input_N_pred = pd.Series([1.1, 2.1, 3.2])
     input_N_data = pd.Series([1.0, 2.2, 3.2])
     input_n_parameters = 4
-    input_n = 3
     expected_performance_metrics = {
-        "R_2": 1.0027573529411764,
+        "R_2": 0.9917582417582418,
         "RMSE": 0.08164965809277268,
         "AIC": -3.736069016284432,
         "BIC": -2.123825528388286,
     }
 
     actual_performance_metrics = get_performance_metrics(
-        input_N_pred, input_N_data, input_n_parameters, input_n
+        input_N_pred, input_N_data, input_n_parameters
     )
     assert actual_performance_metrics == expected_performance_metrics
 
 
+def test_get_batch_performance_metrics():
+    """Test that every well gets the same metrics as when on its own."""
+    input_N_pred = np.array([[1.1, 2.1, 3.2], [0.5, 0.4, 0.1], [1.0, np.nan, 1.0]])
+    input_N_data = np.array([[1.0, 2.2, 3.2], [0.4, 0.4, 0.3], [1.0, 2.0, 1.0]])
+
+    actual_metrics = get_batch_performance_metrics(input_N_pred, input_N_data, 4)
+
+    for well in range(2):
+        expected_metrics = get_performance_metrics(
+            input_N_pred[well], input_N_data[well], 4
+        )
+        for name, value in expected_metrics.items():
+            assert actual_metrics[name][well] == pytest.approx(value)
+    assert actual_metrics["R_2"][0] == pytest.approx(1 - 0.02 / 2.426666666666667)
+    assert np.isnan(actual_metrics["R_2"][2])
+
+
 def test_get_optimal_parameters_gompertz():
     """Test that optimal parameters are right for Gompertz."""
     input_mtp = pd.DataFrame({"A1": [1.0, 2.0, 3.0, 4.0]})
@@ -84,12 +159,17 @@ def test_get_optimal_parameters_gompertz():
     expected_optimal_parameters = pd.DataFrame(
         {
             "N_0_opt": [1.0],
-            "N_inf_opt": [3.6964208716242193],
-            "alpha_opt": [0.94745358060056],
-            "R_2": [1.1453892518001116],
-            "RMSE": [0.7383831622202789],
-            "AIC": [9.118838251569304],
-            "BIC": [13.084052156086795],
+            "N_inf_opt": [3.696452944935443],
+            "alpha_opt": [0.9474389475922967],
+            "R_2": [0.563832244710901],
+            "RMSE": [0.7383831621262692],
+            "AIC": [9.118838250550757],
+            "BIC": [13.08405215506825],
+            "Fit status": ["Converged"],
+            "nfev": [26],
+            "N_0_opt_se": [np.nan],
+            "N_inf_opt_se": [14.930849],
+            "alpha_opt_se": [11.404678],
         },
         index=["A1"],
     )
@@ -98,33 +178,158 @@ def test_get_optimal_parameters_gompertz():
 
 
 def test_get_optimal_parameters_richards():
-    """Test that optimal parameters are right for Richards."""
-    input_mtp = pd.DataFrame({"A1": [0.5, 4.0, 3.3, 1.7]})
-    input_mtp.index = pd.Series([1.0, 2.0, 3.0, 4.0])
+    """Test that optimal parameters are right for Richards.
+
+    Only the product Q * exp(k * t0) is identifiable in the Richards
+    model, so t0 and A0 are checked through the predicted curve.
+    """
+    input_mtp = pd.DataFrame(
+        {"A1": [0.01, 0.028, 0.075, 0.2, 0.507, 1.079, 1.645, 1.905]}
+    )
+    input_mtp.index = pd.Series([1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0])
     input_growth_param = pd.DataFrame(
         {
             "L": 2.0,
-            "k": 2.0,
-            "t": 2.0,
-            "A": 3.0,
+            "k": 1.0,
+            "t": 3.5,
+            "A": 2.2,
         },
         index=["A1"],
     )
-    expected_optimal_parameters = pd.DataFrame(
+    actual_optimal_parameters = richards_model_metrics(input_mtp, input_growth_param)
+    assert list(actual_optimal_parameters.columns) == [
+        "A_opt",
+        "k_opt",
+        "t0_opt",
+        "A0_opt",
+        "R_2",
+        "RMSE",
+        "AIC",
+        "BIC",
+        "Fit status",
+        "nfev",
+        "A_opt_se",
+        "k_opt_se",
+        "t0_opt_se",
+        "A0_opt_se",
+    ]
+    assert actual_optimal_parameters.at["A1", "A_opt"] == pytest.approx(2.0, rel=1e-3)
+    assert actual_optimal_parameters.at["A1", "k_opt"] == pytest.approx(1.5, rel=1e-3)
+    assert actual_optimal_parameters.at["A1", "RMSE"] < 0.001
+
+    well_parameters = actual_optimal_parameters.loc["A1"]
+    predicted = richards_model(
+        input_mtp.index.to_numpy(),
+        well_parameters["A_opt"],
+        well_parameters["k_opt"],
+        well_parameters["t0_opt"],
+        well_parameters["A0_opt"],
+    )
+    np.testing.assert_allclose(predicted, input_mtp["A1"], atol=0.001)
+
+
+def test_multi_start_skips_wells_fitted_well():
+    """Test that multi-start fitting leaves good fits alone."""
+    input_mtp = pd.DataFrame(
+        {"A1": [0.01, 0.028, 0.075, 0.2, 0.507, 1.079, 1.645, 1.905]}
+    )
+    input_mtp.index = pd.Series([1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0])
+    input_growth_param = pd.DataFrame(
+        {"L": 2.0, "k": 1.0, "t": 3.5, "A": 2.2}, index=["A1"]
+    )
+
+    single_start = richards_model_metrics(input_mtp, input_growth_param)
+    multi_start = richards_model_metrics(input_mtp, input_growth_param, n_starts=8)
+
+    assert_frame_equal(multi_start, single_start)
+
+
+def test_multi_start_perturbs_selected_start(monkeypatch):
+    """Test that multi-start fits perturb the start chosen from the seeds."""
+    t = np.linspace(0.5, 10.0, 20)
+    input_mtp = pd.DataFrame({"A1": gompertz_model(t, 0.1, 1.5, 0.5)}, index=t)
+    p0 = np.array([[5.0, 0.1, 5.0]])
+    seed = np.array([[0.1, 1.4, 0.6]])
+    starts = []
+    original = growth_model.multi_start_fit
+
+    def multi_start_fit(model, t, observed, p0, *args, **kwargs):
+        starts.append(p0)
+        return original(model, t, observed, p0, *args, **kwargs)
+
+    monkeypatch.setattr(growth_model, "multi_start_fit", multi_start_fit)
+    fit_model_to_wells(
+        gompertz_model,
+        gompertz_jacobian,
+        input_mtp,
+        p0,
+        ["N_0_opt", "N_inf_opt", "alpha_opt"],
+        seeds=[seed],
+        n_starts=1,
+    )
+
+    np.testing.assert_array_equal(starts[0], seed)
+
+
+def test_richards_warm_start_from_estimates_and_gompertz():
+    """Test Richards fits seeded from initial estimates and Gompertz."""
+    t = np.linspace(0.5, 48.0, 96)
+    input_mtp = pd.DataFrame(
         {
-            "A_opt": [2.374999996564483],
-            "k_opt": [-4.174579638237476],
-            "t0_opt": [196.41366289792106],
-            "A0_opt": [124.14914730524701],
-            "R_2": [1.5716746411483253],
-            "RMSE": [1.366336342193971],
-            "AIC": [16.04224108443251],
-            "BIC": [19.393749350069893],
+            "A1": richards_model(t, 1.2, 0.4, 12.0, 0.05),
+            "A2": richards_model(t, 0.8, 0.25, 20.0, 0.02),
         },
-        index=["A1"],
+        index=t,
     )
-    actual_optimal_parameters = richards_model_metrics(input_mtp, input_growth_param)
-    assert_frame_equal(actual_optimal_parameters, expected_optimal_parameters)
+    initial_estimates = estimate_initial_parameters(input_mtp)
+    gompertz_metrics = gompertz_model_metrics(
+        input_mtp, None, initial_estimates=initial_estimates
+    )
+
+    actual_metrics = richards_model_metrics(
+        input_mtp,
+        None,
+        initial_estimates=initial_estimates,
+        gompertz_metrics=gompertz_metrics,
+    )
+
+    assert (actual_metrics["Fit status"] == "Converged").all()
+    np.testing.assert_allclose(actual_metrics["A_opt"], [1.2, 0.8], rtol=1e-6)
+    np.testing.assert_allclose(actual_metrics["k_opt"], [0.4, 0.25], rtol=1e-6)
+
+
+def test_add_nfev_reduction_column():
+    """Test that saved evaluations are relative to the baseline."""
+    df = pd.DataFrame({"nfev": [10, 20]})
+    actual_df = add_nfev_reduction_column(df, pd.Series([15, 12]))
+    assert list(actual_df["nfev reduction"]) == [5, -8]
+
+    actual_df = add_nfev_reduction_column(df, pd.Series([15, np.nan]))
+    assert actual_df.at[0, "nfev reduction"] == 5
+    assert np.isnan(actual_df.at[1, "nfev reduction"])
+
+
+def test_failed_well_gets_nan_parameters():
+    """Test that a well that can't be fitted doesn't stop the others."""
+    t = np.linspace(0.5, 10.0, 20)
+    input_mtp = pd.DataFrame(
+        {
+            "A1": gompertz_model(t, 0.1, 1.5, 0.5),
+            "A2": np.full(20, np.nan),
+        },
+        index=t,
+    )
+    input_growth_param = pd.DataFrame(
+        {"L": [2.0, 2.0], "k": [1.0, 1.0], "t": [2.0, 2.0], "A": [1.0, 1.0]},
+        index=["A1", "A2"],
+    )
+
+    actual_metrics = gompertz_model_metrics(input_mtp, input_growth_param)
+
+    assert actual_metrics.at["A1", "Fit status"] == "Converged"
+    assert actual_metrics.at["A1", "N_inf_opt"] == pytest.approx(1.5)
+    assert actual_metrics.at["A2", "Fit status"] == "Failed"
+    assert actual_metrics.loc["A2", ["N_0_opt", "N_inf_opt", "R_2"]].isna().all()
 
 
 def test_add_better_fit_column():
@@ -136,3 +341,87 @@ def test_add_better_fit_column():
         {"BIC": [3, 4, 5], "Goodness of fit": ["Yes", "Equal", "No"]}
     )
     assert_frame_equal(actual_df, expected_df)
+
+
+def test_float32_drift():
+    """Test that holding the data as float32 barely changes the results."""
+    plate_layout = load_plate_layout("tests/example_data/Sample Table.xlsx")
+    results = {}
+    for dtype in ("float64", "float32"):
+        mtp_data = load_mtp_data("tests/example_data/Raw data.xlsx", dtype=dtype)
+        average_of_replicates = preprocess_plate(mtp_data, plate_layout)
+        growth_rates = calculate_growth_rates(average_of_replicates)
+        growth_parameters = extract_growth_parameters(
+            extract_maximum_growth_rates(growth_rates),
+            average_of_replicates,
+            lag_time_threshold=15.0,
+        )
+        metrics = gompertz_model_metrics(average_of_replicates, growth_parameters)
+        results[dtype] = average_of_replicates, growth_rates, growth_parameters, metrics
+
+    float64_results, float32_results = results["float64"], results["float32"]
+    for frame in float32_results[:2]:
+        assert (frame.dtypes == "float32").all()
+    for expected, actual in zip(float64_results[:2], float32_results[:2]):
+        assert_frame_equal(actual, expected, check_dtype=False, rtol=0, atol=1e-5)
+    for expected, actual in zip(float64_results[2:], float32_results[2:]):
+        assert_frame_equal(actual, expected, check_dtype=False, rtol=1e-4)
+
+
+def test_fitted_curves():
+    """Test that the fitted models of all wells are evaluated at once."""
+    t = pd.Index([0.0, 10.0, 20.0], name="Time")
+    metrics = pd.DataFrame(
+        {
+            "A_opt": [1.5, np.nan],
+            "k_opt": [0.3, 0.3],
+            "t0_opt": [10.0, 10.0],
+            "A0_opt": [0.1, 0.1],
+        },
+        index=["WT", "SPL1"],
+    )
+
+    curves = fitted_curves(metrics, t, "richards")
+
+    assert list(curves.columns) == ["WT", "SPL1"]
+    np.testing.assert_allclose(
+        curves["WT"], richards_model(t.to_numpy(), 1.5, 0.3, 10.0, 0.1)
+    )
+    assert curves["SPL1"].isna().all()
+    with pytest.raises(MTPAnalyzerException):
+        fitted_curves(metrics, t, "logistic")
+
+
+@pytest.mark.parametrize("wt_grows", [True, False])
+def test_no_growth_wells_are_not_fitted(wt_grows):
+    """Test that wells without growth get a status instead of a fit."""
+    t = np.arange(0.0, 48.0, 0.5)
+    data = pd.DataFrame(
+        {
+            "WT": 0.1 + 1.2 / (1 + np.exp(-0.4 * (t - 20.0))),
+            "SPL1": np.full_like(t, 0.1),
+        },
+        index=pd.Index(t, name="Time"),
+    )
+    estimates = estimate_initial_parameters(data)
+    no_growth = pd.Series({"SPL1": True, "WT": not wt_grows})
+
+    gompertz_metrics = gompertz_model_metrics(
+        data, None, initial_estimates=estimates, no_growth=no_growth
+    )
+    richards_metrics = richards_model_metrics(
+        data,
+        None,
+        initial_estimates=estimates,
+        gompertz_metrics=gompertz_metrics,
+        no_growth=no_growth,
+    )
+
+    for metrics in (gompertz_metrics, richards_metrics):
+        assert list(metrics.index) == ["WT", "SPL1"]
+        assert metrics.at["SPL1", "Fit status"] == NO_GROWTH_STATUS
+        assert metrics.at["SPL1", "nfev"] == 0
+        assert np.isnan(metrics.at["SPL1", "BIC"])
+        if wt_grows:
+            assert metrics.at["WT", "Fit status"] == "Converged"
+            assert metrics.at["WT", "nfev"] > 0
@@ -1,15 +1,23 @@
 """Tests related to noise removal based on blank wells."""
 
+import numpy as np
 import pandas as pd
 from pandas.testing import assert_frame_equal
 
+from analysis import get_replicates_average
 from noise_removal import (
     apply_loess_smoothing,
+    apply_smoothing,
     normalize,
     normalize_blanked_data,
+    preprocess_plate,
     remove_noise,
     separate_blanks,
 )
+from preprocessing import load_mtp_data, load_sample_table
+
+EXAMPLE_MTP_DATA_PATH = "tests/example_data/Raw data.xlsx"
+EXAMPLE_SAMPLE_TABLE_PATH = "tests/example_data/Sample Table.xlsx"
 
 
 def test_separate_blanks():
@@ -68,8 +76,10 @@ def test_loess_smoothing():
             "A2": [5.0, 6.0, 28.0, 100.0, 160.0],
         }
     )
+    original_data = input_data.copy()
     actual_smoothed_data = apply_loess_smoothing(input_data)
     assert_frame_equal(actual_smoothed_data, expected_smoothed_data)
+    assert_frame_equal(input_data, original_data)
 
 
 def test_remove_noise():
@@ -114,3 +124,60 @@ def test_normalize_blanked_data():
     )
     actual_renormalized_data = normalize_blanked_data(input_data)
     assert_frame_equal(actual_renormalized_data, expected_renormalized_data)
+
+
+def test_preprocess_plate():
+    """Test that the fused steps give the same data as in turn."""
+    mtp_data = load_mtp_data(EXAMPLE_MTP_DATA_PATH)
+    mtp_data.iloc[3:6, 2] = np.nan
+    well_mapping = load_sample_table(EXAMPLE_SAMPLE_TABLE_PATH)
+
+    data = apply_loess_smoothing(normalize(mtp_data))
+    filled_wells, empty_wells = separate_blanks(data, well_mapping)
+    blanked_data = normalize_blanked_data(remove_noise(filled_wells, empty_wells))
+    expected_data = get_replicates_average(blanked_data, well_mapping)
+
+    # Small blocks, so the wells are processed in several of them
+    actual_data = preprocess_plate(mtp_data, well_mapping, block_size=5)
+
+    assert_frame_equal(actual_data, expected_data, rtol=1e-12)
+
+
+def test_preprocess_plate_with_smoothing_method():
+    """Test that the smoothing method and its options are used."""
+    mtp_data = load_mtp_data(EXAMPLE_MTP_DATA_PATH)
+    well_mapping = load_sample_table(EXAMPLE_SAMPLE_TABLE_PATH)
+
+    data = apply_smoothing(normalize(mtp_data), "loess", window=5)
+    filled_wells, empty_wells = separate_blanks(data, well_mapping)
+    blanked_data = normalize_blanked_data(remove_noise(filled_wells, empty_wells))
+    expected_data = get_replicates_average(blanked_data, well_mapping)
+
+    actual_data = preprocess_plate(
+        mtp_data, well_mapping, smoothing="loess", smoothing_options={"window": 5}
+    )
+
+    assert_frame_equal(actual_data, expected_data, rtol=1e-12)
+
+
+def test_preprocess_plate_with_nearest_blanks():
+    """Test that each well is blanked with the blanks nearest to it."""
+    mtp_data = load_mtp_data(EXAMPLE_MTP_DATA_PATH)
+    well_mapping = load_sample_table(EXAMPLE_SAMPLE_TABLE_PATH)
+
+    # The blanks are D8, E8 and F8, so the nearest one is in the same row
+    # for rows D to F, and D8 for the rows above
+    data = apply_loess_smoothing(normalize(mtp_data))
+    filled_wells, _ = separate_blanks(data, well_mapping)
+    blanked_data = filled_wells.apply(lambda s: s - data[f"{max(s.name[0], 'D')}8"])
+    expected_data = get_replicates_average(
+        normalize_blanked_data(blanked_data), well_mapping
+    )
+
+    actual_data = preprocess_plate(mtp_data, well_mapping, nearest_blanks=1)
+    all_blanks_data = preprocess_plate(mtp_data, well_mapping, nearest_blanks=3)
+
+    assert_frame_equal(actual_data, expected_data, rtol=1e-12)
+    assert_frame_equal(
+        all_blanks_data, preprocess_plate(mtp_data, well_mapping), rtol=1e-12
+    )
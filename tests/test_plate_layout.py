@@ -0,0 +1,152 @@
+"""Tests for the array-backed plate layout."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from exceptions import MTPAnalyzerException
+from plate_layout import PlateLayout, ReplicateStatistics, aggregate_by_code, parse_well
+
+
+def test_parse_well():
+    """Test that rows beyond Z continue with two letters."""
+    assert parse_well("A1") == (1, 1)
+    assert parse_well("h12") == (8, 12)
+    assert parse_well("AF48") == (32, 48)
+    with pytest.raises(MTPAnalyzerException):
+        parse_well("1A")
+
+
+def test_from_table():
+    """Test that wells are in row-major order with coded samples."""
+    table = pd.DataFrame(
+        [["WT", "BLK", "SPL1"], ["SPL1", "WT", "BLK"]],
+        index=["A", "B"],
+        columns=[1, 2, 3],
+    )
+
+    layout = PlateLayout.from_table(table)
+
+    assert layout.wells.tolist() == ["A1", "A2", "A3", "B1", "B2", "B3"]
+    np.testing.assert_array_equal(layout.rows, [1, 1, 1, 2, 2, 2])
+    np.testing.assert_array_equal(layout.columns, [1, 2, 3, 1, 2, 3])
+    assert layout.samples.tolist() == ["BLK", "SPL1", "WT"]
+    np.testing.assert_array_equal(layout.codes, [2, 0, 1, 1, 2, 0])
+    np.testing.assert_array_equal(
+        layout.is_blank, [False, True, False, False, False, True]
+    )
+    assert layout.n_wells == 96
+    assert layout.to_mapping() == {
+        "A1": "WT",
+        "A2": "BLK",
+        "A3": "SPL1",
+        "B1": "SPL1",
+        "B2": "WT",
+        "B3": "BLK",
+    }
+
+
+@pytest.mark.parametrize(
+    "last_well, n_wells",
+    [("H12", 96), ("H13", 384), ("P24", 384), ("Q1", 1536), ("AF48", 1536)],
+)
+def test_plate_format(last_well, n_wells):
+    """Test that the smallest plate that fits all wells is picked."""
+    layout = PlateLayout.from_mapping({"A1": "WT", last_well: "BLK"})
+
+    assert layout.n_wells == n_wells
+
+
+def test_from_mapping_normalizes_wells():
+    """Test that wells are read like parse_well reads them."""
+    layout = PlateLayout.from_mapping({" a1": "WT", "h12 ": "BLK", "ab3": "SPL1"})
+
+    assert layout.wells.tolist() == ["A1", "H12", "AB3"]
+    np.testing.assert_array_equal(layout.rows, [1, 8, 28])
+    np.testing.assert_array_equal(layout.columns, [1, 12, 3])
+    assert layout.n_wells == 1536
+
+
+def test_plate_format_too_large():
+    """Test that wells beyond a 1536-well plate raise an exception."""
+    with pytest.raises(MTPAnalyzerException):
+        PlateLayout.from_mapping({"A49": "WT"})
+
+
+def test_select():
+    """Test that selecting wells keeps their samples and order."""
+    layout = PlateLayout.from_mapping({"A1": "WT", "A2": "BLK", "B1": "SPL1"})
+
+    selected = layout.select(["B1", "A2"])
+
+    assert selected.to_mapping() == {"B1": "SPL1", "A2": "BLK"}
+    np.testing.assert_array_equal(selected.is_blank, [False, True])
+    np.testing.assert_array_equal(selected.positions(["A2", "A1"]), [1, -1])
+    with pytest.raises(MTPAnalyzerException, match="C1"):
+        layout.select(["C1"])
+
+
+def test_nearest_blank_weights():
+    """Test that each well averages its nearest blanks."""
+    layout = PlateLayout.from_mapping(
+        {"A1": "BLK", "A2": "WT", "A3": "WT", "A4": "BLK", "B4": "BLK"}
+    )
+
+    weights = layout.nearest_blank_weights(2)
+
+    assert weights is layout.nearest_blank_weights(2)
+    np.testing.assert_array_equal(
+        weights.toarray(),
+        [
+            [0.5, 0.5, 0.0],
+            [0.5, 0.5, 0.0],
+            [0.0, 0.5, 0.5],
+            [0.0, 0.5, 0.5],
+            [0.0, 0.5, 0.5],
+        ],
+    )
+    with pytest.raises(MTPAnalyzerException):
+        layout.nearest_blank_weights(4)
+
+
+def test_aggregate_by_code():
+    """Test that the statistics of each code match those of pandas."""
+    values = np.array(
+        [
+            [1.0, 2.0, 4.0],
+            [3.0, np.nan, 5.0],
+            [5.0, 6.0, 9.0],
+            [7.0, 8.0, 1.0],
+            [2.0, 2.5, 3.0],
+        ]
+    )
+    codes = np.array([2, 2, 0, -1, 2])
+    groups = pd.DataFrame(values[codes >= 0]).groupby(codes[codes >= 0])
+
+    unique_codes, means, stds, counts = aggregate_by_code(values, codes)
+
+    np.testing.assert_array_equal(unique_codes, [0, 2])
+    np.testing.assert_allclose(means, groups.mean())
+    np.testing.assert_allclose(stds, groups.std())
+    np.testing.assert_array_equal(counts, groups.count())
+
+
+def test_replicate_statistics():
+    """Test that statistics are labelled by sample and summarized."""
+    values = np.array([[1.0, 2.0], [3.0, 6.0], [5.0, 7.0]])
+    index = pd.Index([0.5, 1.0], name="Time")
+
+    statistics = ReplicateStatistics.from_codes(
+        values, np.array([1, 1, 0]), np.array(["SPL1", "WT"], dtype="object"), index
+    )
+
+    assert list(statistics.mean.columns) == ["SPL1", "WT"]
+    assert statistics.mean.index.equals(index)
+    np.testing.assert_allclose(statistics.mean["WT"], [2.0, 4.0])
+    np.testing.assert_allclose(statistics.std["WT"], [np.sqrt(2), np.sqrt(8)])
+    np.testing.assert_allclose(statistics.cv["WT"], [np.sqrt(2) / 2, np.sqrt(2) / 2])
+    assert statistics.n["SPL1"].tolist() == [1, 1]
+    assert statistics.std["SPL1"].isna().all()
+    summary = statistics.summary()
+    assert summary.at["WT", "Replicates"] == 2
+    assert summary.at["WT", "Median CV"] == pytest.approx(np.sqrt(2) / 2)
@@ -1,7 +1,11 @@
 """Tests for preprocessing functionality."""
 
+import datetime
 import os
+import tempfile
 
+import numpy as np
+import openpyxl  # type: ignore
 import pandas as pd
 import pytest
 
@@ -10,6 +14,8 @@ from preprocessing import (
     format_time_as_hours,
     load_mtp_data,
     load_sample_table,
+    select_wells,
+    start_experiment_from_zero,
     validate_mtp_columns,
 )
 
@@ -30,6 +36,81 @@ def test_load_mtp_data():
     assert actual_data.iat[2, 2] == 97
 
 
+def test_load_mtp_data_as_float32():
+    """Test that the well values can be read as float32."""
+    actual_data = load_mtp_data(EXAMPLE_MTP_DATA_PATH, dtype="float32")
+    expected_data = load_mtp_data(EXAMPLE_MTP_DATA_PATH)
+
+    assert (actual_data.dtypes == "float32").all()
+    assert actual_data.index.dtype == "float64"
+    pd.testing.assert_frame_equal(actual_data, expected_data, check_dtype=False)
+
+
+def test_load_mtp_data_with_wells():
+    """Test that only the given wells are read."""
+    actual_data = load_mtp_data(EXAMPLE_MTP_DATA_PATH, wells=["C3", "A1"])
+    expected_data = load_mtp_data(EXAMPLE_MTP_DATA_PATH)[["A1", "C3"]]
+
+    pd.testing.assert_frame_equal(actual_data, expected_data)
+
+
+def write_workbook(path: str, rows: list[list[object]]) -> None:
+    """Write rows to the first sheet of a new workbook."""
+    workbook = openpyxl.Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    workbook.save(path)
+
+
+def test_load_mtp_data_streams_rows():
+    """Test that rows are read like pandas reads them."""
+    rows = [
+        ["Time", "T° Fluo50_k:450,530", "A1", "A2"],
+        [datetime.time(0, 10), 28.0, 1.0, 2.0],
+        [datetime.time(0, 40), 28.1, 3.0, None],
+        [datetime.time(1, 10), 28.2, 5.0],
+        [None, None, None, None],
+    ]
+    with tempfile.TemporaryDirectory() as tempdir:
+        path = os.path.join(tempdir, "data.xlsx")
+        write_workbook(path, rows)
+
+        actual_data = load_mtp_data(path)
+
+    expected_data = pd.DataFrame(
+        {"A1": [1.0, 3.0, 5.0], "A2": [2.0, np.nan, np.nan]},
+        index=pd.Index([0.5, 1.0, 1.5], name="Time"),
+    )
+    pd.testing.assert_frame_equal(actual_data, expected_data)
+
+
+def test_load_mtp_data_from_delimited_text():
+    """Test that CSV and TSV exports give the same data as Excel."""
+    expected_data = load_mtp_data(EXAMPLE_MTP_DATA_PATH)
+    raw_data = pd.read_excel(EXAMPLE_MTP_DATA_PATH, dtype={"Time": str})
+    with tempfile.TemporaryDirectory() as tempdir:
+        csv_path = os.path.join(tempdir, "data.csv")
+        tsv_path = os.path.join(tempdir, "data.txt")
+        raw_data.to_csv(csv_path, index=False)
+        raw_data.to_csv(tsv_path, index=False, sep="\t", encoding="latin-1")
+
+        for path in (csv_path, tsv_path):
+            pd.testing.assert_frame_equal(load_mtp_data(path), expected_data)
+
+
+def test_load_mtp_data_with_non_numeric_well_data():
+    """Test that text in well data is reported."""
+    rows = [["Time", "A1"], [datetime.time(0, 30), "OVRFLW"]]
+    with tempfile.TemporaryDirectory() as tempdir:
+        path = os.path.join(tempdir, "data.xlsx")
+        write_workbook(path, rows)
+
+        with pytest.raises(MTPAnalyzerException) as exception_info:
+            load_mtp_data(path)
+
+    assert "Failed converting well data to float64" in str(exception_info.value)
+
+
 def test_load_mtp_data_with_non_excel_file():
     """Test loading MTP data when fed non-Excel file."""
     with pytest.raises(MTPAnalyzerException) as exception_info:
@@ -38,6 +119,17 @@ def test_load_mtp_data_with_non_excel_file():
     assert "no-data.txt' as Excel file: Excel file format" in str(exception_info.value)
 
 
+def test_load_sample_table_from_csv():
+    """Test that a CSV sample table gives the same mapping as Excel."""
+    expected_well_mapping = load_sample_table(EXAMPLE_SAMPLE_TABLE_PATH)
+    raw_data = pd.read_excel(EXAMPLE_SAMPLE_TABLE_PATH, index_col=0)
+    with tempfile.TemporaryDirectory() as tempdir:
+        path = os.path.join(tempdir, "samples.csv")
+        raw_data.to_csv(path)
+
+        assert load_sample_table(path) == expected_well_mapping
+
+
 def test_load_sample_table_with_non_excel_file():
     """Test loading MTP data when fed non-Excel file."""
     with pytest.raises(MTPAnalyzerException) as exception_info:
@@ -57,6 +149,50 @@ def test_format_time_as_hours():
         assert format_time_as_hours(timedelta_input) == expected_output
 
 
+def test_start_experiment_from_zero():
+    """Test that all supported kinds of time cells give hours."""
+    test_cases = [
+        (["00:10:00", "00:40:00", "24:40:00"], {}),
+        (
+            [
+                datetime.time(0, 10),
+                datetime.time(0, 40),
+                datetime.datetime(1900, 1, 1, 0, 40),
+            ],
+            {},
+        ),
+        (
+            [
+                datetime.time(0, 10),
+                datetime.time(0, 40),
+                datetime.timedelta(hours=24, minutes=40),
+            ],
+            {},
+        ),
+        (
+            [
+                datetime.timedelta(minutes=10),
+                datetime.timedelta(minutes=40),
+                datetime.timedelta(hours=24, minutes=40),
+            ],
+            {},
+        ),
+        ([600, 2400, 88800], {}),
+        ([10.0, 40.0, 1480.0], {"time_unit": "min"}),
+    ]
+    for original_time, options in test_cases:
+        actual_hours = start_experiment_from_zero(pd.Series(original_time), **options)
+        assert list(actual_hours) == [0.5, 1.0, 25.0]
+
+
+def test_start_experiment_from_zero_with_offset():
+    """Test that the first timepoint can be shifted to any offset."""
+    actual_hours = start_experiment_from_zero(
+        pd.Series(["01:00:00", "01:30:00"]), time_offset=0.0
+    )
+    assert list(actual_hours) == [0.0, 0.5]
+
+
 def test_load_sample_table():
     """Test that well mapping looks as expected when loaded normally."""
     actual_well_mapping = load_sample_table(EXAMPLE_SAMPLE_TABLE_PATH)
@@ -159,3 +295,49 @@ def test_validate_mtp_columns_exception_on_missing_label(caplog):
 
     assert "Well index B1 in MTP data doesn't seem to exist in Sample" in caplog.text
     assert "one column in MTP data was not found in Sample Table" in str(e.value)
+
+
+def test_select_wells():
+    """Test that ranges and samples select wells, with the blanks."""
+    well_mapping = load_sample_table(EXAMPLE_SAMPLE_TABLE_PATH)
+    blanks = ["D8", "E8", "F8"]
+
+    assert select_wells(well_mapping) is None
+    assert select_wells(well_mapping, wells=["B2:A1", "C1"]) == [
+        "A1",
+        "A2",
+        "B1",
+        "B2",
+        "C1",
+        *blanks,
+    ]
+    assert select_wells(well_mapping, samples=["SPL1,SPL2"]) == [
+        "A1",
+        "B1",
+        "C1",
+        "D1",
+        "D8",
+        "E1",
+        "E8",
+        "F1",
+        "F8",
+    ]
+    assert select_wells(well_mapping, wells=["a1"], samples=["SPL3"]) == [
+        "A1",
+        "A2",
+        "B2",
+        "C2",
+        *blanks,
+    ]
+
+
+def test_select_wells_with_unknown_selector():
+    """Test that selecting nothing raises an exception."""
+    well_mapping = load_sample_table(EXAMPLE_SAMPLE_TABLE_PATH)
+
+    with pytest.raises(MTPAnalyzerException, match="G1"):
+        select_wells(well_mapping, wells=["G1:H2"])
+    with pytest.raises(MTPAnalyzerException, match="SPL99"):
+        select_wells(well_mapping, samples=["SPL99"])
+    with pytest.raises(MTPAnalyzerException, match="not a well"):
+        select_wells(well_mapping, wells=["1A"])
@@ -63,3 +63,88 @@ def test_generate_report():
         assert "<td>4.511152</td>" in html_page
         assert 'alt="A1 plot"' in html_page
         assert "fvjz179sT27dtj69atcejQoTz9RPlz" in html_page
+
+
+def test_generate_report_with_fit_effort():
+    """Test that fit effort is reported when the metrics include it."""
+    input_observed_data = pd.DataFrame(
+        {"A1": [4.5, 19.5, 29.2, 90.3, 50.5, 72.2]},
+        index=[0.5, 1.0, 1.5, 2.0, 2.5, 3.0],
+    )
+    input_gompertz_metrics = pd.DataFrame(
+        {
+            "N_0_opt": [4.511152],
+            "N_inf_opt": [1.397241],
+            "alpha_opt": [0.031169],
+            "Fit status": ["Converged"],
+            "nfev": [21],
+            "nfev reduction": [8],
+        },
+        index=["A1"],
+    )
+    input_richards_metrics = pd.DataFrame(
+        {
+            "A_opt": [1.607220],
+            "k_opt": [0.110140],
+            "t0_opt": [13.314109],
+            "A0_opt": [0.244298],
+            "Fit status": ["Max evaluations reached"],
+            "nfev": [2003],
+            "nfev reduction": [-4],
+        },
+        index=["A1"],
+    )
+    with tempfile.TemporaryDirectory() as tempdir:
+        generate_report(
+            input_observed_data,
+            input_gompertz_metrics,
+            input_richards_metrics,
+            dest_dir=tempdir,
+        )
+        with open(os.path.join(tempdir, "report.html")) as f:
+            html_page = f.read()
+
+    assert "Fit effort" in html_page
+    assert "<td>Max evaluations reached</td>" in html_page
+    assert "<td>2003</td>" in html_page
+    assert "<td>-4</td>" in html_page
+    assert "Replicates" not in html_page
+
+
+def test_generate_report_with_replicates():
+    """Test that the spread of the replicates is reported when given."""
+    input_observed_data = pd.DataFrame(
+        {"A1": [4.5, 19.5, 29.2, 90.3, 50.5, 72.2]},
+        index=[0.5, 1.0, 1.5, 2.0, 2.5, 3.0],
+    )
+    input_gompertz_metrics = pd.DataFrame(
+        {"N_0_opt": [4.511152], "N_inf_opt": [1.397241], "alpha_opt": [0.031169]},
+        index=["A1"],
+    )
+    input_richards_metrics = pd.DataFrame(
+        {
+            "A_opt": [1.607220],
+            "k_opt": [0.110140],
+            "t0_opt": [13.314109],
+            "A0_opt": [0.244298],
+        },
+        index=["A1"],
+    )
+    input_replicate_summary = pd.DataFrame(
+        {"Replicates": [3], "Median SD": [0.012345], "Median CV": [0.054321]},
+        index=["A1"],
+    )
+    with tempfile.TemporaryDirectory() as tempdir:
+        generate_report(
+            input_observed_data,
+            input_gompertz_metrics,
+            input_richards_metrics,
+            input_replicate_summary,
+            dest_dir=tempdir,
+        )
+        with open(os.path.join(tempdir, "report.html")) as f:
+            html_page = f.read()
+
+    assert "Replicates" in html_page
+    assert "<td>0.012345</td>" in html_page
+    assert "<td>0.054321</td>" in html_page
@@ -0,0 +1,80 @@
+"""Tests for smoothing the time series of all wells."""
+
+import numpy as np
+import pytest
+
+from exceptions import MTPAnalyzerException
+from smoothing import (
+    ema_smoothing,
+    lag_smoothing,
+    loess_smoothing,
+    savgol_smoothing,
+    smooth,
+)
+
+
+def test_lag_smoothing():
+    """Test that each value is averaged with the one before it."""
+    values = np.array([[5.0, 10.0, 100.0, 100.0, 200.0]])
+
+    smoothed = lag_smoothing(values, np.arange(5.0))
+
+    np.testing.assert_array_equal(smoothed, [[5.0, 6.0, 28.0, 100.0, 120.0]])
+    np.testing.assert_array_equal(values, [[5.0, 10.0, 100.0, 100.0, 200.0]])
+
+
+def test_ema_smoothing():
+    """Test that the moving average follows its recursion."""
+    values = np.array([[1.0, 3.0, 2.0, 6.0], [0.0, 0.0, 4.0, 0.0]])
+
+    smoothed = ema_smoothing(values, np.arange(4.0), alpha=0.5)
+
+    np.testing.assert_allclose(smoothed, [[1.0, 2.0, 2.0, 4.0], [0.0, 0.0, 2.0, 1.0]])
+
+
+def test_ema_smoothing_missing_values():
+    """Test that missing values don't make the rest of a well missing."""
+    values = np.array([[1.0, np.nan, 3.0, 5.0], [np.nan, 2.0, 4.0, np.nan]])
+
+    smoothed = ema_smoothing(values, np.arange(4.0), alpha=0.5)
+
+    np.testing.assert_allclose(
+        smoothed, [[1.0, np.nan, 2.0, 3.5], [np.nan, 2.0, 3.0, np.nan]]
+    )
+
+
+@pytest.mark.parametrize("smoothing", [savgol_smoothing, loess_smoothing])
+def test_polynomials_are_unchanged(smoothing):
+    """Test that polynomials of at most the degree aren't smoothed."""
+    t = np.arange(0.0, 20.0, 0.5)
+    values = np.array([3 + 0 * t, 1 - 2 * t, 0.5 * t**2 - t])
+
+    smoothed = smoothing(values, t, window=7, degree=2)
+
+    np.testing.assert_allclose(smoothed, values, atol=1e-9)
+
+
+def test_loess_smoothing_with_uneven_timepoints():
+    """Test that LOESS takes the spacing of timepoints into account."""
+    t = np.cumsum(np.random.default_rng(0).uniform(0.1, 1.0, 50))
+    values = np.array([2 * t + 1, np.sin(t / 5)])
+
+    smoothed = loess_smoothing(values, t, window=9, degree=1)
+
+    np.testing.assert_allclose(smoothed[0], values[0])
+    assert np.abs(smoothed[1] - values[1]).max() < 0.1
+
+
+def test_smooth():
+    """Test that options the method doesn't take are ignored."""
+    values = np.array([[5.0, 10.0, 100.0, 100.0, 200.0]])
+
+    smoothed = smooth(
+        values, np.arange(5.0), "lag", window=3, prev_weight=0.5, cur_weight=0.5
+    )
+
+    np.testing.assert_array_equal(smoothed, [[5.0, 7.5, 55.0, 100.0, 150.0]])
+    with pytest.raises(MTPAnalyzerException, match="window"):
+        smooth(values, np.arange(5.0), "loess", window=9)
+    with pytest.raises(MTPAnalyzerException, match="Unknown"):
+        smooth(values, np.arange(5.0), "median")